@@ -0,0 +1,135 @@
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.pipeline import engines
+from utils.profile import Profile
+from benchmarks.runner import parse_size
+
+
+# ---------------------------------------------------------------
+# adversarial inputs: documents built to make backtracking regexes
+# slow (delimiters that are never closed, long lines without a
+# newline, runs of blank lines in a list...). each document is
+# converted at growing sizes, and the check fails if a conversion
+# is slower than a fixed budget per megabyte, or if doubling the
+# size of a document more than `max_ratio` times its conversion
+# time (a linear conversion doubles it, a quadratic one makes it 4
+# times longer).
+#
+# usage: python -m benchmarks.adversarial --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+default_sizes = "64K,128K,256K,512K,1M"
+max_ratio = 3  # maximum time ratio between a document and a document half its size
+min_time = 0.02  # conversions faster than this are too noisy to compute a ratio
+
+
+def repeat(text: str, size: int):
+    """
+    :param text: a piece of markdown
+    :param size: the target size, in characters
+    :return: the text repeated to reach the target size
+    """
+    return text * max(size // len(text), 1)
+
+
+adversarial = {
+    # code blocks: `MDCode.block_code()`, `MDCleaner.prepare_markdown()`
+    "unclosed_fence": lambda n: "```python\n" + repeat("x = 1\n", n),
+    "fences": lambda n: repeat("``` ``` `` ```\n", n),
+    "listings": lambda n: repeat("\\begin{listing}\n", n),
+    "lstlistings": lambda n: "\\end{lstlisting}\n" + repeat("\\begin{lstlisting} a\n", n),
+    # lists: `MDList`
+    "list_no_newline": lambda n: "- " + "a" * n,
+    "list_blank_lines": lambda n: "- a\n" + repeat("   \n", n) + "- b\n",
+    "olist_blank_lines": lambda n: "1. a\n" + repeat(" \t \n", n) + "2. b\n",
+    "list_one_item": lambda n: "- " + repeat("a\n", n),
+    "list_items": lambda n: repeat("- a\n", n),
+    "olist_items": lambda n: repeat("1. a\n", n),
+    "nested_items": lambda n: repeat("- a\n  - b\n    1. c\n", n),
+    "digits": lambda n: repeat("1" * 1000 + "\n", n),
+    "dashes": lambda n: "-" * n + "\n",
+    "indents": lambda n: repeat(" " * 1000 + "\n", n),
+    # footnotes: `MDReference.footnote()`
+    "footnote_line": lambda n: "[^1]: " + repeat("a ", n),
+    "footnote_lines": lambda n: "a[^1]\n\n[^1]: a\n" + repeat("b\n", n),
+    "footnote_chain": lambda n: "a[^1]\n\n" + repeat("[^1]:", n),
+    "footnote_empty": lambda n: repeat("[^1]:\n", n),
+    "footnote_open": lambda n: repeat("[^" + "1" * 100 + "\n", n),
+    # runs of spaces: `MDCleaner.clean_spaces()`
+    "spaces": lambda n: "a" + " " * n + "a\n",
+    "blank_lines": lambda n: "# a\n" + repeat(" \n", n) + "b\n",
+}
+
+
+def convert(data: str, engine: str, repeat: int):
+    """
+    convert a document and time each stage of the engine
+    :param data: the markdown document
+    :param engine: the name of the conversion engine
+    :param repeat: the number of runs; the fastest one is kept
+    :return: the total time and the time of each stage (see `Profile`)
+    """
+    best = None
+    for _ in range(repeat):
+        profile = Profile()
+        start = time.perf_counter()
+        engines[engine](data, profile=profile)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = elapsed, {k: v["time"] for k, v in profile.stages.items()}
+    return best
+
+
+@click.command("adversarial")
+@click.option("-s", "--sizes", "sizes", default=default_sizes,
+              help=f"the sizes of the documents, separated by commas. defaults to `{default_sizes}`")
+@click.option("-l", "--limit", "limit", default=5.0, type=float,
+              help="the maximum conversion time of a megabyte of adversarial input, in seconds. defaults to 5")
+@click.option("-r", "--repeat", "repeat", default=3, type=int,
+              help="the number of runs of each conversion; the fastest is kept. defaults to 3")
+@click.option("-e", "--engine", "names", default=",".join(engines),
+              help=f"the engines to check, separated by commas. defaults to all: `{','.join(engines)}`")
+def main(sizes, limit, repeat, names):
+    """
+    check that adversarial markdown documents are converted in linear time.
+    """
+    sizes = sorted(parse_size(s) for s in sizes.split(","))
+    names = [n.strip() for n in names.split(",")]
+    failed = []
+    for name, build in adversarial.items():
+        for engine in names:
+            previous = None
+            for size in sizes:
+                data = build(size)
+                elapsed, stages = convert(data, engine, repeat)
+                slowest = max(stages, key=stages.get)
+                budget = limit * max(len(data) / 2 ** 20, 0.1)
+                ratio = elapsed / previous if previous is not None and previous >= min_time else None
+                click.echo(f"{name:<20}{engine:<8}{len(data) / 2 ** 10:>8.0f} KB{elapsed:>10.3f}s"
+                           + (f"{ratio:>7.2f}x" if ratio is not None else " " * 8) + f"  slowest: {slowest}")
+                if elapsed > budget:
+                    failed.append(f"{name} ({engine}, {len(data)} chars): {elapsed:.2f}s, over the budget "
+                                  + f"of {budget:.2f}s. slowest stage: {slowest}")
+                    break  # the larger sizes would only take longer
+                if ratio is not None and ratio > max_ratio:
+                    failed.append(f"{name} ({engine}, {len(data)} chars): {ratio:.2f} times slower than "
+                                  + f"at half the size. slowest stage: {slowest}")
+                previous = elapsed
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo(f"FINISHED - {len(adversarial)} adversarial documents converted in linear time")
+
+
+if __name__ == "__main__":
+    main()
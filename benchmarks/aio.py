@@ -0,0 +1,121 @@
+import tempfile
+import pathlib
+import asyncio
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.aio import convert_many, pool, close
+from utils.api import Converter
+from benchmarks.runner import parse_size
+from benchmarks.generators import generate
+
+
+# ---------------------------------------------------------------
+# asyncio API (`utils/aio.py`): many documents, half of them
+# strings and half of them files, are converted by `convert_many()`
+# while a ticker measures how late the event loop wakes it up.
+# the check fails if:
+# - a result differs from the synchronous conversion, or isn't
+#   written to its output file
+# - the ordered results aren't in the order of the input
+# - the event loop is blocked for longer than a budget.
+#
+# usage: python -m benchmarks.aio --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+async def ticker(lags: list, stop: asyncio.Event, period=0.001):
+    """
+    measure the latency of the event loop
+    :param lags: the list to add the delay of each wake-up to, in seconds
+    :param stop: the event that stops the ticker
+    :param period: the time between two wake-ups, in seconds
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - start - period)
+
+
+async def run(inputs: list, concurrency: int, ordered: bool):
+    """
+    convert the documents while the ticker runs
+    :param inputs: the documents (see `convert_many()`)
+    :param concurrency: the maximum number of documents in flight
+    :param ordered: yield the results in the order of the input
+    :return: the results, the time of the conversion in seconds and the delays of the event loop
+    """
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.ensure_future(ticker(lags, stop))
+    start = time.perf_counter()
+    results = [result async for result in convert_many(inputs, concurrency, ordered)]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return results, elapsed, lags
+
+
+@click.command("aio")
+@click.option("-g", "--generator", "name", default="mixed",
+              help="the generator of the documents (see `generators.py`). defaults to `mixed`")
+@click.option("-s", "--size", "size", default="50K", help="the size of each document. defaults to `50K`")
+@click.option("-n", "--documents", "count", default=200, type=int,
+              help="the number of documents. defaults to 200")
+@click.option("-c", "--concurrency", "concurrency", default=0, type=int,
+              help="the maximum number of documents in flight. defaults to the number of processors")
+@click.option("-b", "--budget", "budget", default=50.0, type=float,
+              help="the maximum delay of the event loop, in milliseconds. defaults to 50")
+def main(name, size, count, concurrency, budget):
+    """
+    check that `convert_many()` converts concurrently without blocking the event loop.
+    """
+    failed = []
+    texts = [generate(name, parse_size(size), seed) for seed in range(count)]
+    expected = [Converter().convert(text) for text in texts]
+    pool().submit(len, "").result()  # start the workers before the measures
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = []
+        for i, text in enumerate(texts):
+            if i % 2:
+                inputs.append(text)
+            else:
+                inpath = pathlib.Path(tmp, f"{i}.md")
+                inpath.write_text(text)
+                inputs.append((inpath, os.path.join(tmp, f"{i}.tex")))
+
+        for ordered in (False, True):
+            results, elapsed, lags = asyncio.run(run(inputs, concurrency, ordered))
+            mode = "ordered" if ordered else "as completed"
+            lag = max(lags, default=0) * 1000
+            click.echo(f"{mode}: {count} documents of {len(texts[0]) / 1024:.1f} KB in {elapsed:.2f} s "
+                       + f"({count / elapsed:.0f} documents/s), event loop delayed by {lag:.2f} ms at most")
+            if ordered and [result.index for result in results] != list(range(count)):
+                failed.append("the ordered results are not in the order of the input")
+            if sorted(result.index for result in results) != list(range(count)):
+                failed.append(f"{mode}: {len(results)} results for {count} documents")
+            for result in results:
+                if result.error is not None or result.tex != expected[result.index]:
+                    failed.append(f"{mode}: document {result.index} is not converted as by `Converter`")
+                elif isinstance(inputs[result.index], tuple) \
+                        and pathlib.Path(inputs[result.index][1]).read_text() != result.tex:
+                    failed.append(f"{mode}: document {result.index} is not written to its output file")
+            if lag > budget:
+                failed.append(f"{mode}: the event loop is delayed by {lag:.2f} ms, over the budget of {budget:.2f} ms")
+    close()
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the conversions don't block the event loop")
+
+
+if __name__ == "__main__":
+    main()
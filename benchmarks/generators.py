@@ -0,0 +1,173 @@
+import random
+
+from utils.minted import languages
+
+
+# ---------------------------------------------------------------
+# seeded generators of synthetic markdown, one per construct
+# handled by the converters. each generator takes a random
+# generator and a target size in characters, and returns a
+# valid markdown document of about that size: the same seed
+# always gives the same document.
+# ---------------------------------------------------------------
+
+
+supported = sorted(languages)  # in a fixed order, so that a seed always gives the same document
+words = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+         + "labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco").split()
+
+
+def sentence(rnd: random.Random, n=12):
+    """
+    :param rnd: the random generator
+    :param n: the maximum number of words
+    :return: a line of random words, without markup
+    """
+    return " ".join(rnd.choice(words) for _ in range(rnd.randint(3, n)))
+
+
+def build(rnd: random.Random, size: int, block):
+    """
+    build a document by joining blocks separated by empty lines
+    :param rnd: the random generator
+    :param size: the target size of the document
+    :param block: a function building a block from the random generator and its index
+    :return: the document
+    """
+    out = []
+    length = 0
+    i = 0
+    while length < size:
+        text = block(rnd, i) + "\n\n"
+        out.append(text)
+        length += len(text)
+        i += 1
+    return "".join(out)
+
+
+def lists(rnd: random.Random, size: int):
+    """
+    nested ordered and unordered lists (`MDList`). the indentation is always valid:
+    a multiple of the indentation of the list, and one level more at most.
+    """
+    def block(rnd, i):
+        indent = rnd.choice([2, 4])
+        token = rnd.choice(["-", "1."])
+        level = 0
+        items = []
+        for j in range(rnd.randint(2, 30)):
+            level = rnd.randint(0, min(level + 1, 5)) if j else 0
+            items.append(" " * indent * level + f"{token} {sentence(rnd)}")
+        return "\n".join(items)
+    return build(rnd, size, block)
+
+
+def code(rnd: random.Random, size: int):
+    """
+    fenced code blocks (`MDCode`), in languages supported by minted or not,
+    with markdown and TeX special characters inside.
+    """
+    unsupported = ["", "nosuchlanguage", "mermaid", "jsonc"]
+
+    def block(rnd, i):
+        language = rnd.choice(supported) if rnd.random() < 0.7 else rnd.choice(unsupported)
+        lines = [rnd.choice(["    ", ""]) + rnd.choice([
+            sentence(rnd), "x = {'a': 1, \"b\": [2, 3]}  # comment", "# not a header", "- not a list",
+            "**not bold** and `not code` [^1] & 50% $5 _ ~ ^", "\\begin{document} {braces} \\\\",
+        ]) for _ in range(rnd.randint(1, 20))]
+        return f"{sentence(rnd)}\n\n```{language}\n" + "\n".join(lines) + "\n```"
+    return build(rnd, size, block)
+
+
+def footnotes(rnd: random.Random, size: int):
+    """
+    paragraphs full of footnote pointers (`MDReference`), each footnote
+    being defined after the paragraph that points to it.
+    """
+    counter = iter(range(rnd.randrange(10 ** 6) * 1000 + 1, 10 ** 10))  # unique keys, even in `mixed`
+
+    def block(rnd, i):
+        keys = [next(counter) for _ in range(rnd.randint(1, 5))]
+        text = " ".join(f"{sentence(rnd)}[^{k}]" for k in keys)
+        notes = "\n".join(f"[^{k}]: {sentence(rnd, 20)}" for k in keys)
+        return f"{text}\n\n{notes}"
+    return build(rnd, size, block)
+
+
+def quotes(rnd: random.Random, size: int):
+    """
+    inline quotes, nested or not, and block quotes (`MDQuote`)
+    """
+    def block(rnd, i):
+        if rnd.random() < 0.2:
+            return "\n".join(f"> {sentence(rnd)}" for _ in range(rnd.randint(1, 5)))
+        parts = []
+        for _ in range(rnd.randint(2, 8)):
+            inner = sentence(rnd, 6)
+            if rnd.random() < 0.3:
+                inner = f"{inner} '{sentence(rnd, 4)}' {rnd.choice(words)}"
+            parts.append(f'{sentence(rnd, 6)} "{inner}"')
+        return " ".join(parts) + "."
+    return build(rnd, size, block)
+
+
+def headers(rnd: random.Random, size: int):
+    """
+    headers of all levels (`MDHeader`), with little text between them
+    """
+    def block(rnd, i):
+        out = f"{'#' * rnd.randint(1, 6)} {sentence(rnd, 6)}"
+        if rnd.random() < 0.5:
+            out += "\n" + sentence(rnd)
+        return out
+    return build(rnd, size, block)
+
+
+def inline(rnd: random.Random, size: int):
+    """
+    paragraphs dense with inline markup (`MDSimple`): bold, italics, code,
+    links, images, rules and line breaks
+    """
+    def markup(rnd):
+        text = sentence(rnd, 4)
+        return rnd.choice([
+            f"**{text}**", f"*{text}*", f"`{text}`", f"[{text}](https://example.com/{rnd.randint(0, 999)})",
+            f"![{text}](image{rnd.randint(0, 99)}.png)", f"{text}<br>{text}", text,
+        ])
+
+    def block(rnd, i):
+        if rnd.random() < 0.05:
+            return "---"
+        return " ".join(markup(rnd) for _ in range(rnd.randint(3, 15)))
+    return build(rnd, size, block)
+
+
+def mixed(rnd: random.Random, size: int):
+    """
+    a mix of all the other generators, block by block
+    """
+    def block(rnd, i):
+        generator = rnd.choice([lists, code, footnotes, quotes, headers, inline])
+        return generator(rnd, 1).rstrip("\n")
+    return build(rnd, size, block)
+
+
+generators = {
+    "lists": lists,
+    "code": code,
+    "footnotes": footnotes,
+    "quotes": quotes,
+    "headers": headers,
+    "inline": inline,
+    "mixed": mixed,
+}
+
+
+def generate(name: str, size: int, seed=0):
+    """
+    :param name: the name of the generator
+    :param size: the target size of the document, in characters
+    :param seed: the seed of the random generator
+    :return: the generated markdown document
+    """
+    return generators[name](random.Random(f"{name}-{seed}"), size)
@@ -0,0 +1,128 @@
+import hashlib
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.api import Converter
+from utils.pipeline import engines, footprint
+from utils.profile import Profile
+from utils.stream import MDStream, chunk_size
+from utils.mapped import MDMapped
+from benchmarks.runner import parse_size
+from benchmarks.generators import generators, generate
+
+
+# ---------------------------------------------------------------
+# memory of the conversion, measured with `tracemalloc` as with
+# `md2tex --memory-report`. the check fails if:
+# - the peak of a document converted at once is above the estimate
+#   of `footprint()`, which `--max-memory` relies on. documents
+#   with 2 and 4 bytes characters are measured too
+# - a document converted in chunks, as `--max-memory` does, isn't
+#   converted as when it is converted at once
+# - the peak of the chunked conversion of a document without
+#   footnotes grows with the size of the document.
+# - one of the `edges` documents, split at every line where a chunk
+#   can end, isn't converted as when it is converted at once.
+#
+# usage: python -m benchmarks.memory --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+# documents whose footnotes were found at other boundaries by the chunked
+# conversion than by the conversion at once (see `MDStream.footnotes()`)
+edges = {
+    "unclosed fence in a footnote": "##### [^3] x\n\n[^3]: [^2]\n```",
+    "list after a footnote": "x [^1]\n\n[^1]: a\n- b\n- c\n\ny [^2]\n\n[^2]: d\n1. e\n",
+    "footnote in a list item": "x [^1]\n\n- [^1]: a\n  b\n",
+}
+
+
+def whole(text: str, engine: str):
+    """
+    convert a document at once
+    :param text: the markdown document
+    :param engine: the name of the conversion engine
+    :return: the digest of the TeX and the peak of memory of the conversion, in bytes
+    """
+    profile = Profile(memory=True)
+    tex = Converter(engine=engine).convert(text, profile=profile)
+    return hashlib.sha1(tex.encode()).hexdigest(), profile.peak
+
+
+def chunked(data: bytes, engine: str, size=chunk_size):
+    """
+    convert a document in chunks, like `md2tex --mmap` does, without keeping the TeX
+    :param data: the markdown document, encoded in UTF-8
+    :param engine: the name of the conversion engine
+    :param size: the minimum size of a chunk, in bytes
+    :return: the digest of the TeX and the peak of memory of the conversion, in bytes
+    """
+    profile = Profile(memory=True)
+    profile.start()
+    spans = list(MDMapped.chunks(data, size))
+    footnotes, found = MDMapped.index(data, spans, engine)
+    stream = MDStream(engine, footnotes=footnotes, profile=profile)
+    digest = hashlib.sha1()
+    for (start, end), notes in zip(spans, found):
+        digest.update(stream.feed(data[start:end].decode(), notes).encode())
+    digest.update(stream.close().encode())
+    profile.document("-", 0, len(data))
+    return digest.hexdigest(), profile.peak
+
+
+@click.command("memory")
+@click.option("-s", "--size", "size", default="512K", help="the size of the documents. defaults to `512K`")
+@click.option("-g", "--growth", "growth", default=4, type=int,
+              help="the documents converted in chunks are also converted at this many times their size, "
+                   + "to check that the peak doesn't grow. defaults to 4")
+@click.option("-f", "--flat", "flat", default="lists,code,quotes,inline",
+              help="the generators of the documents that are split in chunks and have no footnotes, whose "
+                   + "chunked peak must not grow. defaults to `lists,code,quotes,inline`")
+def main(size, growth, flat):
+    """
+    check the memory estimates of `--max-memory` and the memory of the chunked conversion.
+    """
+    failed = []
+    size = parse_size(size)
+    documents = {name: generate(name, size, 1) for name in generators}
+    documents["mixed (2 bytes)"] = documents["mixed"] + "ĉ"
+    documents["mixed (4 bytes)"] = documents["mixed"] + "\U0001F600"
+
+    click.echo(f"{'document':<20}{'engine':<8}{'peak (MB)':>12}{'estimate (MB)':>16}{'chunked (MB)':>15}")
+    for engine in engines:
+        for name, text in documents.items():
+            data = text.encode()
+            tex, peak = whole(text, engine)
+            estimate = footprint(data, engine)
+            chunk, low = chunked(data, engine)
+            click.echo(f"{name:<20}{engine:<8}{peak / 2 ** 20:>12.2f}{estimate / 2 ** 20:>16.2f}{low / 2 ** 20:>15.2f}")
+            if peak > estimate:
+                failed.append(f"{name}, {engine}: the peak of {peak / 2 ** 20:.2f} MB is above the estimate "
+                              + f"of {estimate / 2 ** 20:.2f} MB (see `footprints`)")
+            if chunk != tex:
+                failed.append(f"{name}, {engine}: the chunked conversion differs from the conversion at once")
+            if name in flat.split(","):
+                _, high = chunked(generate(name, size * growth, 1).encode(), engine)
+                click.echo(f"{'':<28}{f'chunked, x{growth}:':>28}{high / 2 ** 20:>15.2f}")
+                if high > low * 1.5 + 2 ** 16:
+                    failed.append(f"{name}, {engine}: the chunked peak grows from {low / 2 ** 20:.2f} MB to "
+                                  + f"{high / 2 ** 20:.2f} MB when the document is {growth} times bigger")
+        for name, text in edges.items():
+            if chunked(text.encode(), engine, 1)[0] != whole(text, engine)[0]:
+                failed.append(f"{name}, {engine}: the conversion split at every possible chunk boundary differs "
+                              + "from the conversion at once")
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the memory is within the estimates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import platform
+import datetime
+import math
+import json
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils import __version__
+from utils.pipeline import engines
+from utils.profile import Profile
+from utils.stream import MDStream
+from utils.mapped import MDMapped
+from benchmarks.generators import generators, generate
+
+
+# ---------------------------------------------------------------
+# benchmark of every stage of the conversion pipelines, on the
+# documents of `generators.py`, for growing input sizes. the
+# results are written as json, with the scaling exponent of each
+# stage: the `k` of `time ~ size ** k`, fitted on the sizes where
+# the stage takes more than a millisecond. a stage with `k`
+# clearly above 1 is superlinear.
+#
+# usage: python -m benchmarks.runner --help
+# ---------------------------------------------------------------
+
+
+default_sizes = "10K,100K,1M,10M,100M"
+superlinear = 1.2  # scaling exponent above which a stage is reported as superlinear
+
+
+def parse_size(size: str):
+    """
+    :param size: a size, with an optional `K` or `M` suffix: `10K`, `1M`...
+    :return: the size, in characters
+    """
+    units = {"K": 2 ** 10, "M": 2 ** 20}
+    size = size.strip().upper()
+    if size[-1:] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def stage(times: dict, name: str, fn, *args):
+    """
+    run a stage of a pipeline and time it
+    :param times: the dict to add the time of the stage to
+    :param name: the name of the stage
+    :param fn: the function running the stage
+    :param args: the arguments of the function
+    :return: the output of the function
+    """
+    start = time.perf_counter()
+    out = fn(*args)
+    times[name] = time.perf_counter() - start
+    return out
+
+
+def stages(data: str, engine: str):
+    """
+    run an engine and time each of its stages (see `Profile`)
+    :param data: the markdown document
+    :param engine: the name of the conversion engine
+    :return: the time of each stage
+    """
+    profile = Profile()
+    engines[engine](data, profile=profile)
+    return {k: v["time"] for k, v in profile.stages.items()}
+
+
+def stream(data: str, engine: str):
+    """
+    convert a document like `md2tex --stream` does, from its lines
+    :param data: the markdown document
+    :param engine: the name of the conversion engine
+    :return: the TeX
+    """
+    lines = data.splitlines(keepends=True)
+    converter = MDStream(engine, footnotes=MDStream.index(lines, engine))
+    out = [converter.feed(chunk) for chunk in MDStream.chunks(lines)]
+    out.append(converter.close())
+    return "".join(out)
+
+
+def mapped(data: bytes, engine: str):
+    """
+    convert a document like `md2tex --mmap` does, from its bytes
+    :param data: the markdown document, encoded in UTF-8
+    :param engine: the name of the conversion engine
+    :return: the TeX, encoded in UTF-8
+    """
+    spans = list(MDMapped.chunks(data))
+    footnotes, found = MDMapped.index(data, spans, engine)
+    converter = MDStream(engine, footnotes=footnotes)
+    out = [converter.feed(data[start:end].decode(), notes).encode() for (start, end), notes in zip(spans, found)]
+    out.append(converter.close().encode())
+    return b"".join(out)
+
+
+def measure(data: str, repeat: int):
+    """
+    time all the stages and all the pipelines on a document
+    :param data: the markdown document
+    :param repeat: the number of runs; the best time of each stage is kept
+    :return: a dict mapping `pipeline.stage` to its time in seconds
+    """
+    best = {}
+    for _ in range(repeat):
+        times = {}
+        for engine in engines:
+            times.update({f"{engine}.{k}": v for k, v in stages(data, engine).items()})
+            stage(times, f"{engine}.total", engines[engine], data)
+            stage(times, f"{engine}.stream", stream, data, engine)
+            stage(times, f"{engine}.mapped", mapped, data.encode(), engine)
+        for k, v in times.items():
+            best[k] = min(best.get(k, v), v)
+    return best
+
+
+def exponent(points: list):
+    """
+    fit `time = a * size ** k` on the measures of a stage
+    :param points: a list of `(size, time)`
+    :return: `k`, or None if there are less than 2 measures above a millisecond
+    """
+    points = [(math.log(s), math.log(t)) for s, t in points if t >= 1e-3]
+    if len(points) < 2:
+        return None
+    mx = sum(x for x, y in points) / len(points)
+    my = sum(y for x, y in points) / len(points)
+    var = sum((x - mx) ** 2 for x, y in points)
+    if var == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in points) / var
+
+
+@click.command("benchmark")
+@click.option("-g", "--generators", "names", default=",".join(generators),
+              help=f"the generators to use, separated by commas. defaults to all: `{','.join(generators)}`")
+@click.option("-s", "--sizes", "sizes", default=default_sizes,
+              help=f"the sizes of the documents, separated by commas. defaults to `{default_sizes}`")
+@click.option("-r", "--repeat", "repeat", default=3, type=int,
+              help="the number of runs on documents of 1M or less; the best time is kept. defaults to 3")
+@click.option("-b", "--budget", "budget", default=120.0, type=float,
+              help="the larger sizes of a generator are skipped once a pipeline takes more than this "
+                   + "number of seconds. defaults to 120")
+@click.option("--seed", "seed", default=0, type=int, help="the seed of the generators. defaults to 0")
+@click.option("-o", "--output", "output", default="benchmark.json",
+              help="the json file to write the results to. defaults to `benchmark.json`")
+def main(names, sizes, repeat, budget, seed, output):
+    """
+    time every stage of the conversion pipelines on synthetic documents
+    of growing sizes, and write the results and scaling exponents as json.
+    """
+    names = [n.strip() for n in names.split(",")]
+    sizes = sorted(parse_size(s) for s in sizes.split(","))
+    unknown = [n for n in names if n not in generators]
+    if unknown:
+        raise click.BadParameter(f"unknown generators: {', '.join(unknown)}", param_hint="--generators")
+
+    results = []
+    scaling = {}
+    for name in names:
+        points = {}  # stage: [(size, time)]
+        for size in sizes:
+            data = generate(name, size, seed)
+            times = measure(data, repeat if size <= 2 ** 20 else 1)
+            results.append({"generator": name, "size": size, "chars": len(data), "times": times})
+            for k, v in times.items():
+                points.setdefault(k, []).append((len(data), v))
+            click.echo(f"{name} {len(data) / 2 ** 20:8.2f} MB  "
+                       + "  ".join(f"{k} {v:.3f}s" for k, v in times.items() if k.endswith(".total")))
+            if max(times.values()) > budget:
+                click.echo(f"{name}: over the budget of {budget}s, the larger sizes are skipped")
+                break
+        scaling[name] = {k: exponent(v) for k, v in points.items()}
+
+    with open(output, mode="w") as fh:
+        json.dump({
+            "md2tex": __version__,
+            "python": platform.python_version(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "seed": seed,
+            "results": results,
+            "scaling": scaling,
+        }, fh, indent=2)
+
+    for name, exponents in scaling.items():
+        for k, v in exponents.items():
+            if v is not None and v > superlinear:
+                click.echo(f"SUPERLINEAR - {name}: {k} scales as size ** {v:.2f}")
+    click.echo(f"FINISHED - results written to `{output}`")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import tempfile
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.command import md2tex_sections
+from utils.api import Converter
+from benchmarks.runner import parse_size
+from benchmarks.generators import generate
+
+
+# ---------------------------------------------------------------
+# parallel conversion of a single file, as with `md2tex
+# --parallel-sections`: a large document is converted at once on
+# one process, then in sections on several processes, and the
+# speedup is printed. the check fails if:
+# - the TeX converted in sections differs from the TeX converted
+#   at once
+# - the speedup is below a minimum, if one is given. the speedup
+#   can't be higher than the number of processors.
+#
+# usage: python -m benchmarks.sections --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+def timeit(fn, *args):
+    """
+    :param fn: the function to time
+    :param args: the arguments of the function
+    :return: the time spent running the function, in seconds
+    """
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def whole(inpath: str, outpath: str, converter: Converter):
+    """
+    convert a file at once and write its TeX
+    :param inpath: the path to the markdown file
+    :param outpath: the path to write the TeX to
+    :param converter: the converter
+    """
+    with open(inpath, mode="r") as fh:
+        tex = converter.convert(fh.read())
+    with open(outpath, mode="w") as fh:
+        fh.write(tex)
+
+
+@click.command("sections")
+@click.option("-s", "--size", "size", default="16M", help="the size of the document. defaults to `16M`")
+@click.option("-g", "--generator", "name", default="mixed",
+              help="the generator of the document (see `generators.py`). defaults to `mixed`")
+@click.option("-j", "--jobs", "jobs", default=0, type=int,
+              help="the number of processes. defaults to 0: all processors")
+@click.option("-m", "--min-speedup", "min_speedup", default=None, type=float,
+              help="the minimum speedup of the conversion in sections. defaults to no minimum")
+@click.option("-e", "--engine", "engine", default="regex,tree",
+              help="the engines to check, separated by commas. defaults to all: `regex,tree`")
+def main(size, name, jobs, min_speedup, engine):
+    """
+    check that the conversion in sections gives the same TeX faster.
+    """
+    failed = []
+    jobs = jobs or os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        inpath = os.path.join(tmp, "document.md")
+        with open(inpath, mode="w") as fh:
+            fh.write(generate(name, parse_size(size), 1))
+        click.echo(f"document: {name}, {os.path.getsize(inpath) / 2 ** 20:.1f} MB, {jobs} process(es)")
+        for engine in engine.split(","):
+            converter = Converter(engine=engine)
+            paths = os.path.join(tmp, "whole.tex"), os.path.join(tmp, "sections.tex")
+            t_whole = timeit(whole, inpath, paths[0], converter)
+            t_sections = timeit(md2tex_sections, inpath, paths[1], converter, jobs)
+            speedup = t_whole / t_sections
+            click.echo(f"{engine:<8}at once {t_whole:.3f}s, in sections {t_sections:.3f}s (x{speedup:.2f}, "
+                       + f"{speedup / jobs * 100:.0f}% of the processes)")
+            with open(paths[0], mode="r") as fh:
+                tex = fh.read()
+            with open(paths[1], mode="r") as fh:
+                if fh.read() != tex:
+                    failed.append(f"{engine}: the TeX converted in sections differs from the TeX converted at once")
+            if min_speedup is not None and speedup < min_speedup:
+                failed.append(f"{engine}: the speedup of x{speedup:.2f} is below x{min_speedup:.2f}")
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the TeX converted in sections is the same")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import http.client
+import threading
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.server import ConversionServer, WorkerPool
+from benchmarks.runner import parse_size
+from benchmarks.generators import generate
+
+
+# ---------------------------------------------------------------
+# latency of the conversion server (`md2tex serve`): a server is
+# started on a free port, and clients send it the same document
+# over keep-alive connections. the latency percentiles are printed
+# and the check fails if the 99th percentile is over a budget.
+#
+# usage: python -m benchmarks.serve --help
+# exits with 1 if the budget is exceeded or if a request fails.
+# ---------------------------------------------------------------
+
+
+def client(port: int, data: bytes, count: int, latencies: list, errors: list):
+    """
+    send conversion requests on a keep-alive connection
+    :param port: the port of the server
+    :param data: the markdown document
+    :param count: the number of requests
+    :param latencies: the list to add the time of each request to, in seconds
+    :param errors: the list to add the http status of the failed requests to
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request("POST", "/convert", body=data, headers={"Content-Type": "text/markdown"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+
+def percentile(values: list, p: float):
+    """
+    :param values: the sorted values
+    :param p: the percentile, between 0 and 100
+    :return: the value at that percentile
+    """
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+@click.command("serve")
+@click.option("-g", "--generator", "name", default="mixed",
+              help="the generator of the document (see `generators.py`). defaults to `mixed`")
+@click.option("-s", "--size", "size", default="10K", help="the size of the document. defaults to `10K`")
+@click.option("-n", "--requests", "count", default=2000, type=int,
+              help="the number of requests. defaults to 2000")
+@click.option("-c", "--clients", "clients", default=0, type=int,
+              help="the number of concurrent clients. defaults to the number of workers: more clients "
+                   + "measure the time spent waiting for a worker")
+@click.option("-j", "--workers", "workers", default=0, type=int,
+              help="the number of worker processes of the server. defaults to one per processor")
+@click.option("-b", "--budget", "budget", default=20.0, type=float,
+              help="the maximum 99th percentile of the latency, in milliseconds. defaults to 20")
+def main(name, size, count, clients, workers, budget):
+    """
+    measure the latency of the conversion server.
+    """
+    data = generate(name, parse_size(size)).encode("utf-8")
+    pool = WorkerPool(workers, queue_size=clients or os.cpu_count() or 1, timeout=10)
+    clients = clients or len(pool.workers)
+    server = ConversionServer(("127.0.0.1", 0), pool, ConversionServer.templates_dir())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client(server.server_port, data, 20, [], [])  # warm up the connections and the converters
+        latencies, errors = [], []
+        threads = [threading.Thread(target=client, args=(server.server_port, data, count // clients, latencies, errors))
+                   for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.close()
+
+    latencies = sorted(latencies)
+    click.echo(f"{len(latencies)} requests of {len(data) / 1024:.1f} KB, {clients} clients, "
+               + f"{len(pool.workers)} workers: {len(latencies) / elapsed:.0f} requests/s")
+    click.echo("  ".join(f"p{p} {percentile(latencies, p) * 1000:.2f} ms" for p in (50, 90, 99, 99.9)))
+    p99 = percentile(latencies, 99) * 1000
+    if errors:
+        click.echo(f"FAILED - {len(errors)} requests failed: http status {', '.join(map(str, set(errors)))}", err=True)
+    if p99 > budget:
+        click.echo(f"FAILED - the 99th percentile is {p99:.2f} ms, over the budget of {budget:.2f} ms", err=True)
+    if errors or p99 > budget:
+        sys.exit(1)
+    click.echo("FINISHED - the latency is within the budget")
+
+
+if __name__ == "__main__":
+    main()
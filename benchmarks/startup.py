@@ -0,0 +1,93 @@
+import subprocess
+import tempfile
+import shutil
+import sys
+import os
+
+import click
+
+
+# ---------------------------------------------------------------
+# startup time of the command: `md2tex` is run once per file by
+# scripts and hooks, so loading it must stay cheap. the command is
+# loaded with `python -X importtime`, which prints the time spent
+# importing each module, and the check fails if:
+# - loading `md2tex.py` takes more than a budget, not counting
+#   `click` (the import of click itself isn't ours to reduce).
+#   it is loaded from a copy without bytecode, with `-B`, so that
+#   the time includes compiling it, as when the `.pyc` files can't
+#   be written: the check doesn't depend on the state of the tree
+# - `--help` or `--version` import one of the `heavy` modules,
+#   which are only needed to convert files.
+#
+# usage: python -m benchmarks.startup --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+heavy = [
+    "utils.api", "utils.pipeline", "utils.converters", "utils.tree", "utils.stream", "utils.watch",
+    "utils.cache", "utils.profile", "utils.server", "utils.sections", "concurrent.futures", "multiprocessing",
+    "utils.highlight", "utils.assets", "utils.compiler", "pygments", "PIL", "http.server", "cProfile", "json",
+]
+
+
+def importtime(*args, cwd=root):
+    """
+    run the command in a new interpreter with `-X importtime`
+    :param args: the arguments of the command. if there are none, `md2tex.py` is only imported
+    :param cwd: the directory of `md2tex.py`
+    :return: a dict mapping each imported module to its cumulative import time, in microseconds
+    """
+    code = "from md2tex import md2tex; md2tex()" if args else "import md2tex"
+    process = subprocess.run([sys.executable, "-B", "-X", "importtime", "-c", code, *args],
+                             cwd=cwd, capture_output=True, text=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:"):
+            own, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():  # not the header
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+@click.command("startup")
+@click.option("-b", "--budget", "budget", default=15.0, type=float,
+              help="the maximum time to import `md2tex.py` without its bytecode, not counting click, "
+                   + "in milliseconds. defaults to 15")
+@click.option("-r", "--repeat", "repeat", default=5, type=int,
+              help="the number of imports; the fastest is kept. defaults to 5")
+def main(budget, repeat):
+    """
+    check that the startup of `md2tex` stays cheap.
+    """
+    failed = []
+    best = None
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(os.path.join(root, "md2tex.py"), directory)
+        shutil.copytree(os.path.join(root, "utils"), os.path.join(directory, "utils"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        for _ in range(repeat):
+            times = importtime(cwd=directory)
+            own = (times["md2tex"] - times.get("click", 0)) / 1000
+            best = own if best is None else min(best, own)
+    click.echo(f"md2tex.py imported in {best:.1f} ms without click (budget: {budget:.1f} ms)")
+    if best > budget:
+        failed.append(f"md2tex.py is imported in {best:.1f} ms, over the budget of {budget:.1f} ms")
+
+    for args in [("--help",), ("--version",)]:
+        loaded = [m for m in heavy if m in importtime(*args)]
+        click.echo(f"md2tex {' '.join(args)}: {', '.join(loaded) or 'no heavy module'} imported")
+        if loaded:
+            failed.append(f"md2tex {' '.join(args)} imports {', '.join(loaded)}")
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the startup is within the budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import re
+import os
+import sys
+import time
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.converters import MDSimple, MDHeader, MDCleaner
+from benchmarks.runner import parse_size
+
+
+# ---------------------------------------------------------------
+# benchmark of the compiled substitution plans of `MDSimple`
+# and `MDHeader` against the original loops over their dicts,
+# and of the fused escaping and space cleaning of `MDCleaner`
+# against their original sequences of replacements.
+# the input is the README, repeated to reach the target size.
+# the check fails if a rewritten step doesn't give the same output
+# as its original sequence.
+#
+# usage: python -m benchmarks.substitution --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+# `MDSimple.simple_sub` before its regexes were rewritten to begin with a literal
+original_simple_sub = {
+    r"(?<!\*)\*{2}(?!\*)(.+?)(?<!\*)\*{2}(?!\*)": r"\\textbf{\1}",
+    r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)": r"\\textit{\1}",
+    r"(?<!`)`(?!`)(.+?)(?<!`)`(?!`)": r"\\texttt{\1}",
+    r"(?<!!)\[(.*?)\]\((.*?)\)": r"\\href{\2}{\1}",
+    r"!\[(.*?)\]\((.*?)\)": MDSimple.simple_sub[r"!\[(.*?)\]\((.*?)\)"],
+    r"-{3,}": r"\\par\\noindent\\rule{\\linewidth}{0.4pt}",
+    r"<br/?>": "\n\n",
+}
+
+
+def original_escape(string: str):
+    """
+    the reference escaping of `MDCleaner.prepare_markdown()`: one replacement per character
+    :param string: the string to escape
+    :return: the escaped string
+    """
+    string = string.replace(r"{", r"\{")
+    string = string.replace(r"}", r"\}")
+    string = re.sub(r"\\(?![\{\}])", r"\\textbackslash{}", string, flags=re.M)
+    string = string.replace(r">", r"\textgreater{}")
+    string = string.replace(r"#", r"\#")
+    string = string.replace("$", r"\$")
+    string = string.replace("%", r"\%")
+    string = string.replace(r"$", r"\&")
+    string = string.replace(r"~", r"\~")
+    string = string.replace("_", r"\_")
+    string = re.sub(r"\^", r"\\^", string, flags=re.M)
+    return string
+
+
+def original_clean_spaces(string: str):
+    """
+    the reference implementation of `MDCleaner.clean_spaces()`: one `re.sub` per rule
+    :param string: the string to clean
+    :return: the cleaned string
+    """
+    string = re.sub(r"((?<!^ ) )+", " ", string, flags=re.M)
+    string = re.sub(r"{\s+", r"{", string, flags=re.M)
+    string = re.sub(r"(?<!\s)\s+}", r"}", string, flags=re.M)
+    string = re.sub(r"\n{2,}", r"\n\n", string, flags=re.M)
+    string = re.sub(r"(\\begin\{.*?)\n{2,}", r"\1\n", string, flags=re.M)
+    string = re.sub(r"(?<!\n)\n{2,}(\\end\{)", r"\n\1", string, flags=re.M)
+    return string
+
+
+def loop(string: str, substitute: dict):
+    """
+    the reference implementation: one `re.sub` per entry of a substitution dict
+    :param string: the string to process
+    :param substitute: a dict mapping regexes to their replacement
+    :return: the processed string
+    """
+    for k, v in substitute.items():
+        string = re.sub(k, v, string, flags=re.M)
+    return string
+
+
+def timeit(fn, *args, repeat=3):
+    """
+    run a function several times
+    :param fn: the function to time
+    :param args: the arguments of the function
+    :param repeat: the number of runs
+    :return: the output of the function and the best time, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+
+@click.command("substitution")
+@click.option("-s", "--size", "size", default="4M", help="the size of the input. defaults to `4M`")
+def main(size):
+    """
+    check that the rewritten substitutions give the same output faster.
+    """
+    failed = []
+    with open(os.path.join(os.path.dirname(__file__), os.pardir, "README.md"), mode="r") as fh:
+        readme = fh.read()
+    data = readme * (parse_size(size) // len(readme) + 1)
+    click.echo(f"input: {len(data) / 2 ** 20:.1f} MB")
+
+    ref, t_ref = timeit(original_escape, data)
+    out, t_fused = timeit(MDCleaner.escape, data)
+    if out != ref:
+        failed.append("the escaping of MDCleaner doesn't match the reference")
+    click.echo(f"MDCleaner escaping: 11 passes -> 1 pass, {t_ref:.3f}s -> {t_fused:.3f}s (x{t_ref / t_fused:.2f})")
+
+    data, codedict = MDCleaner.prepare_markdown(data)  # escape the markdown like the pipeline does
+
+    tex = MDHeader.convert(MDSimple.convert(data), False, "article")
+    ref, t_ref = timeit(original_clean_spaces, tex)
+    out, t_fused = timeit(MDCleaner.clean_spaces, tex)
+    if out != ref:
+        failed.append("the space cleaning of MDCleaner doesn't match the reference")
+    click.echo(f"MDCleaner spaces: 6 passes -> 2 passes, {t_ref:.3f}s -> {t_fused:.3f}s (x{t_ref / t_fused:.2f})")
+
+    plan = MDSimple.plan()
+    ref, t_ref = timeit(loop, data, original_simple_sub)
+    out, t_plan = timeit(plan.apply, data)
+    if out != ref:
+        failed.append("the MDSimple plan doesn't match the reference")
+    npasses = sum(any(t in data for t in triggers) for triggers, pattern, repl in plan.passes)
+    click.echo(f"MDSimple: {len(original_simple_sub)} passes -> {npasses} passes, "
+               + f"{t_ref:.3f}s -> {t_plan:.3f}s (x{t_ref / t_plan:.2f})")
+
+    for unnumbered, document_class, substitute in [
+        (False, "article", MDHeader.article_numbered),
+        (True, "article", MDHeader.article_unnumbered),
+        (False, "book", MDHeader.book_numbered),
+        (True, "book", MDHeader.book_unnumbered),
+    ]:
+        ref, t_ref = timeit(loop, data, substitute)
+        out, t_plan = timeit(MDHeader.convert, data, unnumbered, document_class)
+        name = f"{document_class}, {'unnumbered' if unnumbered else 'numbered'}"
+        if out != ref:
+            failed.append(f"the MDHeader plan ({name}) doesn't match the reference")
+        click.echo(f"MDHeader ({name}): {len(substitute)} passes -> 1 pass, "
+                   + f"{t_ref:.3f}s -> {t_plan:.3f}s (x{t_ref / t_plan:.2f})")
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the rewritten substitutions give the same output")
+
+
+if __name__ == "__main__":
+    main()
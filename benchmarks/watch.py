@@ -0,0 +1,130 @@
+import random
+import time
+import sys
+import os
+
+import click
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from utils.errors_warnings import ParsingException
+from utils.pipeline import engines
+from utils.stream import MDStream
+from utils.watch import MDIncremental
+from benchmarks.runner import parse_size
+from benchmarks.generators import generate, sentence
+
+
+# ---------------------------------------------------------------
+# incremental conversion, as with `md2tex --watch`: a document is
+# edited again and again, each version is converted by an
+# `MDIncremental` and at once, and the times are printed. the
+# edits are seeded, and those that move chunk boundaries are the
+# most frequent: empty lines, headers, footnotes and code fences.
+# the check fails if:
+# - the chunks of a version split incrementally differ from the
+#   chunks of that version split from its beginning. the TeX
+#   rarely depends on where the chunks end, so the split is
+#   checked too
+# - the TeX of a version converted incrementally differs from the
+#   TeX of that version converted at once, or the conversions
+#   don't raise the same error (an unclosed code block can make
+#   the rest of the document invalid)
+# - the mean time of an incremental conversion is above a maximum,
+#   if one is given.
+#
+# usage: python -m benchmarks.watch --help
+# exits with 1 if a check fails.
+# ---------------------------------------------------------------
+
+
+edits = {
+    "insert a line": lambda rnd, line: sentence(rnd) + "\n" + line,
+    "delete a line": lambda rnd, line: "",
+    "edit a line": lambda rnd, line: line[:len(line) // 2] + sentence(rnd, 3) + line[len(line) // 2:],
+    "insert an empty line": lambda rnd, line: "\n" + line,
+    "join two blocks": lambda rnd, line: line if line.strip() else "",
+    "make a header": lambda rnd, line: "# " + line,
+    "insert a footnote": lambda rnd, line: f"[^{rnd.randint(1, 50)}]: {sentence(rnd)}\n" + line,
+    "insert a pointer": lambda rnd, line: f"[^{rnd.randint(1, 50)}] " + line,
+    "open a code block": lambda rnd, line: "```\n" + line,
+}
+
+
+def run(fn, *args):
+    """
+    :param fn: the conversion
+    :param args: the arguments of the conversion
+    :return: the TeX, or the type of the error raised by the conversion
+    """
+    try:
+        return fn(*args)
+    except ParsingException as e:
+        return type(e)
+
+
+def edit(rnd: random.Random, text: str):
+    """
+    edit a random line of a document
+    :param rnd: the random generator
+    :param text: the document
+    :return: the name of the edit and the edited document
+    """
+    name = rnd.choice(sorted(edits))
+    start = text.rfind("\n", 0, rnd.randrange(len(text) + 1)) + 1
+    end = text.find("\n", start) + 1 or len(text)
+    return name, text[:start] + edits[name](rnd, text[start:end]) + text[end:]
+
+
+@click.command("watch")
+@click.option("-s", "--size", "size", default="1M", help="the size of the document. defaults to `1M`")
+@click.option("-g", "--generator", "name", default="mixed",
+              help="the generator of the document (see `generators.py`). defaults to `mixed`")
+@click.option("-n", "--edits", "count", default=50, type=int,
+              help="the number of edits to replay. defaults to 50")
+@click.option("-m", "--max-time", "max_time", default=None, type=float,
+              help="the maximum mean time of an incremental conversion, in milliseconds. defaults to no maximum")
+@click.option("-c", "--chunk-size", "chunk_size", default=64, type=int,
+              help="the minimum size of a chunk, in characters: small chunks put more chunk boundaries "
+                   + "around the edits. defaults to 64")
+@click.option("-e", "--engine", "engine", default="regex,tree",
+              help="the engines to check, separated by commas. defaults to all: `regex,tree`")
+@click.option("--seed", "seed", default=1, type=int, help="the seed of the document and the edits. defaults to 1")
+def main(size, name, count, max_time, chunk_size, engine, seed):
+    """
+    check that the incremental conversion of successive versions gives the TeX of each version.
+    """
+    failed = []
+    for engine in engine.split(","):
+        rnd = random.Random(seed)
+        text = generate(name, parse_size(size), seed)
+        incremental = MDIncremental(engine, size=chunk_size)
+        run(incremental.convert, text)
+        t_whole, t_incremental = 0, 0
+        for i in range(count):
+            kind, text = edit(rnd, text)
+            start = time.perf_counter()
+            tex = run(incremental.convert, text)
+            t_incremental += time.perf_counter() - start
+            start = time.perf_counter()
+            whole = run(engines[engine], text)
+            t_whole += time.perf_counter() - start
+            if incremental.chunks != list(MDStream.chunks(MDIncremental.lines(text, 0), chunk_size)):
+                failed.append(f"{engine}: edit {i + 1} ({kind}) isn't split as the whole document")
+            if tex != whole:
+                failed.append(f"{engine}: edit {i + 1} ({kind}) isn't converted as the whole document")
+        click.echo(f"{engine:<8}{count} edits of a {len(text) / 2 ** 20:.1f} MB document: at once "
+                   + f"{t_whole / count * 1000:.1f} ms, incrementally {t_incremental / count * 1000:.1f} ms")
+        if max_time is not None and t_incremental / count * 1000 > max_time:
+            failed.append(f"{engine}: the mean incremental conversion takes "
+                          + f"{t_incremental / count * 1000:.1f} ms, above {max_time:.1f} ms")
+
+    for message in failed:
+        click.echo(f"FAILED - {message}", err=True)
+    if failed:
+        sys.exit(1)
+    click.echo("FINISHED - the chunks and the TeX converted incrementally are the same")
+
+
+if __name__ == "__main__":
+    main()
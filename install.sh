@@ -1,4 +1,4 @@
 python3 -m venv env
 source env/bin/activate
 pip install -r requirements.txt
-pip install --editable .
+pip install --editable ".[highlight]"  # pygments, for `--highlight`
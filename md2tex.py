@@ -1,16 +1,47 @@
-from ntpath import basename
 import click
-import re
+import glob
+import sys
 import os
 
-from utils.converters import MDSimple, MDQuote, MDList, MDCode, MDCleaner, MDReference, MDHeader
-from utils.errors_warnings import InputException, Warnings
+from utils import __version__
+from utils.errors_warnings import InputException, ParsingException
 
 
-@click.command("md2tex")
-@click.argument("inpath")
+# ---------------------------------------------------------------
+# the command is run once per file by scripts and hooks, so its
+# startup time matters: only `click` and the modules needed to
+# build the command are imported here. the conversions and the
+# `serve` command are in `utils/command.py`, and the converters,
+# the cache, the multiprocessing pool and the profilers are
+# imported by the functions that use them, so `--help` and
+# `--version` neither load nor compile them (see
+# `benchmarks/startup.py`).
+# ---------------------------------------------------------------
+
+
+class MD2TeXCommand(click.Command):
+    """
+    the `md2tex` command, which also runs its subcommands: `md2tex serve ...`
+    runs the `serve` command. there is no ambiguity with the input paths:
+    a markdown file must end with `.md`.
+    """
+    def main(self, args=None, prog_name=None, **extra):
+        args = sys.argv[1:] if args is None else list(args)
+        if args and args[0] == "serve":
+            from utils.command import serve
+
+            prog_name = f"{prog_name or self.name} {args[0]}"
+            return serve.main(args[1:], prog_name, **extra)
+        return super().main(args, prog_name, **extra)
+
+
+@click.command("md2tex", cls=MD2TeXCommand, epilog="run `md2tex serve --help` for the conversion server.")
+@click.version_option(__version__, "-V", "--version", prog_name="md2tex")
+@click.argument("inpaths", nargs=-1, required=True)
 @click.option("-o", "--output-path", "outpath", default=None,
-              help="optional. a custom output path. defaults to `output/{input_file_name}.md`.")
+              help="optional. a custom output path. defaults to `output/{input_file_name}.md`. "
+                   + "when several files are converted, the output directory, in which the tree "
+                   + "of the input files is reproduced. defaults to `output/`.")
 @click.option("-c", "--complete-tex-file", "tex", is_flag=True, default=False,
               help="optional. if provided, a complete TeX file will be created from a template (with "
               + "preamble and tables of content). if not provided, only the contents of the markdown "
@@ -32,23 +63,138 @@ from utils.errors_warnings import InputException, Warnings
 @click.option("-d", "--document-class", "document_class", default="article",
               help="optional. sets the class of the TeX document. possible values "
                    + "are: `book`|`article`. defaults to `article`")
+@click.option("-e", "--engine", "engine", default="regex",
+              help="optional. the conversion engine. possible values are: `regex`|`tree`. "
+                   + "`regex` runs a series of regex passes over the whole document; `tree` "
+                   + "scans the document once to build a tree of blocks and translates each block. "
+                   + "defaults to `regex`")
+@click.option("-s", "--stream", "stream", is_flag=True, default=False,
+              help="optional. if provided, the Markdown is read, converted and written in chunks "
+                   + "instead of as a whole, so that large files can be converted with little memory. "
+                   + "use `-` as the input path to read from stdin and `-o -` to write to stdout. "
+                   + "defaults to `False`.")
+@click.option("-m", "--mmap", "mapped", is_flag=True, default=False,
+              help="optional. if provided, the Markdown file is memory-mapped and converted in chunks "
+                   + "like with `--stream`: the chunks are found in the bytes of the file and each chunk "
+                   + "is only decoded when it is converted. the file must be UTF-8. stdin is read with "
+                   + "`--stream`. defaults to `False`.")
+@click.option("--max-memory", "max_memory", default=None, type=int,
+              help="optional. a memory budget for the conversion of each file, in MB. a file whose conversion "
+                   + "at once is estimated to need more memory is converted in chunks from a memory map of the "
+                   + "file, like with `--mmap` (stdin, whose size isn't known, is read with `--stream`). "
+                   + "the memory of the chunked modes grows with the largest chunk and with the footnotes "
+                   + "of the file, which are kept in memory, and not with the size of the file. "
+                   + "defaults to no budget.")
+@click.option("-b", "--book", "book", default=None,
+              help="optional. build a book named `BOOK` whose chapters are the input files, in order. "
+                   + "an input file that doesn't end with `.md` is read as a manifest listing the chapter "
+                   + "files, one per line. each chapter is converted to its own TeX file in the output "
+                   + "directory with the `book` document class, and `BOOK.tex` is built from the TeX "
+                   + "template (`-t`) to `\\include` them. the chapters that haven't changed since the last "
+                   + "build are not converted again. defaults to no book.")
+@click.option("-j", "--jobs", "jobs", default=1, type=int,
+              help="optional. the number of processes used to convert several files. "
+                   + "0 uses all processors. defaults to 1.")
+@click.option("--parallel-sections", "parallel_sections", is_flag=True, default=False,
+              help="optional. if provided, a single Markdown file is split in sections, at the same "
+                   + "boundaries as the chunks of `--mmap`, which are converted on `-j` processes "
+                   + "(`-j 0` uses all processors) and joined back in order. the TeX is the same as "
+                   + "with `--stream`. the file must be UTF-8; stdin is read with `--stream`. in a batch, "
+                   + "the files are converted in parallel instead. defaults to `False`.")
+@click.option("--cache-dir", "cache_dir", default=None,
+              help="optional. a directory to cache the converted files in: a file that has already been "
+                   + "converted with the same options and template isn't converted again. "
+                   + "not used with `--stream`. defaults to no cache.")
+@click.option("--cache-size", "cache_size", default=256, type=int,
+              help="optional. the maximum size of the cache directory, in MB. the least recently used "
+                   + "files are deleted first. with `--highlight`, a quarter of it holds the coloured "
+                   + "blocks. defaults to 256.")
+@click.option("--highlight", "highlight", is_flag=True, default=False,
+              help="optional. if provided, the blocks of code are coloured with pygments during the conversion, "
+                   + "in `fancyvrb` `Verbatim` environments, instead of by `minted` during the TeX compilation: "
+                   + "the TeX is compiled without `-shell-escape`. with `-c`, the template loads `fancyvrb` "
+                   + "and `xcolor` instead of `minted`. the coloured blocks are cached in the `highlight` "
+                   + "directory of `--cache-dir`, if given. needs pygments. defaults to `False`.")
+@click.option("--highlight-style", "highlight_style", default="emacs",
+              help="optional. the pygments style of `--highlight`. defaults to `emacs`, as in the template.")
+@click.option("--images", "images", default=None,
+              help="optional. an assets directory: the images of the converted files are downscaled to "
+                   + "`--image-dpi` at the width of the page and recompressed, on `-j` processes, and the "
+                   + "TeX includes these copies. an image is processed once, even if several paths or files "
+                   + "include it, and isn't processed again by the next runs. needs Pillow. "
+                   + "defaults to the original images.")
+@click.option("--image-dpi", "image_dpi", default=150, type=int,
+              help="optional. the resolution of the images of `--images`, in dots per inch. defaults to 150.")
+@click.option("--image-width", "image_width", default=16.0, type=float,
+              help="optional. the width of the images of `--images` on the page, in cm. defaults to 16, the "
+                   + "width of the text of the template.")
+@click.option("--compile", "compile_pdf", is_flag=True, default=False,
+              help="optional. if provided, the complete TeX files (`-c` or `-b`) are compiled to PDF with "
+                   + "`--tex-engine`, in parallel on `-j` processes for a batch. a file is only compiled if "
+                   + "it, its template or the files it includes (images, chapters...) changed since its last "
+                   + "compilation, and the engine is run again only while the `.aux` and `.toc` files "
+                   + "change. defaults to `False`.")
+@click.option("--tex-engine", "tex_engine", default="xelatex",
+              help="optional. the TeX engine of `--compile`, installed on the machine. defaults to `xelatex`.")
+@click.option("-w", "--watch", "watch", is_flag=True, default=False,
+              help="optional. if provided, the input file (and the template, with `-c`) is watched, "
+                   + "and the output is written again each time it changes. only the parts of the "
+                   + "file that have changed are converted again. stop with Ctrl+C. defaults to `False`.")
+@click.option("--profile", "profile_table", is_flag=True, default=False,
+              help="optional. if provided, the time, input and output size and number of elements "
+                   + "translated of each stage of the conversion are printed at the end, added up for "
+                   + "all the files, followed by the slowest files. defaults to `False`.")
+@click.option("--profile-json", "profile_json", default=None,
+              help="optional. a json file to write the profile of the conversion to (see `--profile`).")
+@click.option("--memory-report", "memory_report", is_flag=True, default=False,
+              help="optional. if provided, the peak of memory allocated by each stage of the conversion and "
+                   + "the memory it leaves allocated are recorded with `tracemalloc` and printed with the "
+                   + "profile (see `--profile`), with the peak of each file. the conversion is slower while "
+                   + "the memory is traced. defaults to `False`.")
+@click.option("--cprofile", "cprofile", default=None,
+              help="optional. a `.prof` file to write a `cProfile` profile of the whole run to. "
+                   + "the files are then converted in a single process.")
 def md2tex(
-        inpath: str,
+        inpaths: tuple,
         outpath=None,
         tex=False,
         template="utils/template.tex",
         french_quote=False,
         unnumbered=False,
-        document_class="article"
+        document_class="article",
+        engine="regex",
+        stream=False,
+        mapped=False,
+        max_memory=None,
+        book=None,
+        jobs=1,
+        parallel_sections=False,
+        cache_dir=None,
+        cache_size=256,
+        highlight=False,
+        highlight_style="emacs",
+        images=None,
+        image_dpi=150,
+        image_width=16.0,
+        compile_pdf=False,
+        tex_engine="xelatex",
+        watch=False,
+        profile_table=False,
+        profile_json=None,
+        memory_report=False,
+        cprofile=None
 ):
     """
-    convert a Markdown file to a TeX file.
+    convert Markdown files to TeX files. several paths, directories (all the `*.md` files
+    they contain) and glob patterns can be given: the files are converted in a batch and
+    a summary is printed at the end.
 
     \b
     parameters (see options if you are in `--help` mode):
     -----------------------------------------------------
-    :param inpath: the path to the *.md file to convert to tex
-    :param outpath: the path to save the file to
+    :param inpaths: the paths to the *.md files to convert to tex, or `-` to read from stdin
+    :param outpath: the path to save the file to, or `-` to write to stdout. for a batch,
+                    the directory to save the files to.
     :param tex: a flag indicating wether to create a full tex file,
                 with preamble and table of contents
     :param template: a custom TeX template to use for the conversion, in order
@@ -63,70 +209,109 @@ def md2tex(
                      the headers are numbered by default.
     :param make_out_dirs: wether or not to create non-existant output directories
     :param document_class: the document class of the tex document. defaults to `article`
+    :param engine: the conversion engine: `regex` (the reference backend) or `tree`
+    :param stream: wether to read, convert and write the file in chunks
+    :param mapped: wether to memory-map the file and convert it in chunks
+    :param max_memory: the memory budget of the conversion of a file, in MB. the files that would need
+                       more are converted in chunks. if None, the files are converted at once
+    :param book: the name of the book to build from the input files, or None
+    :param jobs: the number of processes to convert a batch of files, or the sections of a single file, with.
+                 0 uses all processors
+    :param parallel_sections: wether to convert the sections of a single file on several processes
+    :param cache_dir: the directory of the conversion cache. if None, no cache is used
+    :param cache_size: the maximum size of the cache directory, in MB, shared with the coloured blocks
+    :param highlight: wether to colour the code with pygments during the conversion, instead of with `minted`
+    :param highlight_style: the pygments style to colour the code with
+    :param images: the assets directory to write the processed images to. if None, the images are included as is
+    :param image_dpi: the resolution of the processed images, in dots per inch
+    :param image_width: the width of the processed images on the page, in cm
+    :param compile_pdf: wether to compile the TeX files to PDF, when they changed since their last compilation
+    :param tex_engine: the TeX engine to compile the TeX files with
+    :param watch: wether to convert the file again each time it changes
+    :param profile_table: wether to print the profile of the stages of the conversion
+    :param profile_json: the path to write the profile of the stages of the conversion to, as json
+    :param memory_report: wether to record and print the memory allocated by the stages of the conversion
+    :param cprofile: the path to write a `cProfile` profile of the run to
     :return: data, a string representation of the .md file converted to .tex
+             (None in `stream` mode, for a batch or a book: the TeX isn't kept in memory)
     """
-    # ==================== PROCESS THE ARGUMENTS ==================== #
-    if not re.search(r"\.md$", inpath):
-        raise InputException("not_md", inpath)
-    if not os.path.isfile(inpath):
-        raise InputException("not_inpath", inpath)
-    if outpath is None:
-        outpath = "output/" + re.sub(r'\..+?$', '.tex', basename(inpath))  # build default outpath
-    elif "/" in outpath and "\\" in outpath:
-        raise InputException("outpath_slashes", outpath)  # gnu-linux escapes backslashes so this shouldn't be called
-    elif os.path.isdir(outpath):  # if the output path is a dir and not a file, save the file to that dir
-        outpath = f"{outpath}/{basename(inpath)}"
-    if not re.search(r"\.tex$", outpath):
-        # add a .tex extension if it doesn't exist or if a different extension was
-        # provided by the user
-        Warnings("outpath_extension", outpath)
-        outpath = re.sub(r"$", ".tex", outpath)
-    if not re.search("^(book|article)$", document_class):
-        InputException("document_class", document_class)
-
-    # build output directory
-    if not os.path.exists("./output"):
-        os.makedirs("./output")
-
-    # open file and read contents
-    with open(inpath, mode="r") as fh:
-        data = fh.read()
+    from utils.api import Converter
+    from utils.profile import Profile
+    from utils.command import md2tex_file, md2tex_batch, md2tex_book
 
-    # ==================== CONVERT THE FILE ==================== #
-    # complex replacements
-    data = MDCode.block_code(data)  # the contents of code blocks must be interpreted verbatim;
-    #                                 this function comes first so that they won't be changed
-    #                                 by `prepare_markdown()`
-    data, codedict = MDCleaner.prepare_markdown(data)  # escape special chars + remove code envs from the pipeline
-    data = MDQuote.inline_quote(data, french_quote)
-    data = MDQuote.block_quote(data)
-    data = MDList.unordered_l(data)
-    data = MDList.ordered_l(data)
-    data = MDReference.footnote(data)
-    data = MDHeader.convert(data, unnumbered, document_class)
-
-    # "simple" replacements. simple_sub contains regexes as keys
-    # and values, facilitating the regex replacement
-    data = MDSimple.convert(data)
-    data = MDCleaner.clean_tex(data, codedict)  # clean the tex file + reinject the escaped code blocks
-
-    # ==================== BUILD + WRITE OUTPUT TO FILE ==================== #
-    if tex is True:  # create full tex file.
-        try:
-            with open(template, mode="r") as fh:
-                tex_template = fh.read()
-                if "@@BODYTOKEN@@" not in tex_template:
-                    raise InputException("template_no_token", template)
-                else:
-                    data = tex_template.replace("@@BODYTOKEN@@", data)
-                    data = data.replace("@@DOCUMENTCLASSTOKEN@@", document_class)
-        except FileNotFoundError:
-            raise InputException("not_template", template)
+    profile = None
+    if profile_table or profile_json is not None or memory_report:
+        profile = Profile(memory=memory_report)
+    profiler = None
+    if cprofile is not None:
+        import cProfile
+        jobs = 1  # the worker processes would not be profiled
+        profiler = cProfile.Profile()
+        profiler.enable()
     try:
-        with open(outpath, mode="w") as fh:
-            fh.write(data)
-    except FileNotFoundError:
-        raise InputException("not_outpath", outpath)
-
-    click.echo(f"FINISHED - file conversion completed and saved to `{outpath}`")
-    return data
+        if jobs < 0:
+            raise InputException("jobs", str(jobs))
+        if max_memory is not None and max_memory <= 0:
+            raise InputException("max_memory", str(max_memory))
+        budget = None if max_memory is None else max_memory * 2 ** 20
+        if book is not None:
+            for option, given in (("--watch", watch), ("--parallel-sections", parallel_sections)):
+                if given is True:
+                    raise InputException("book_option", option)
+        # the coloured blocks of `--highlight` are cached in the same directory: they get a quarter of its size
+        highlight_size = cache_size * 2 ** 20 // 4 if highlight is True else 0
+        cache = None
+        if cache_dir is not None:
+            from utils.cache import ConversionCache
+            cache = ConversionCache(directory=cache_dir, max_bytes=cache_size * 2 ** 20 - highlight_size)
+        highlighter = None
+        if highlight is True:
+            from utils.highlight import Highlighter
+            directory = None if cache_dir is None else os.path.join(cache_dir, "highlight")
+            highlighter = Highlighter(highlight_style, directory, highlight_size)
+        single = book is None and len(inpaths) == 1 and not os.path.isdir(inpaths[0]) \
+            and not glob.has_magic(inpaths[0])
+        assets = None
+        if images is not None:
+            from utils.assets import MDAssets
+            # in a batch, the files are already converted in parallel
+            assets = MDAssets(images, image_dpi, image_width, jobs if single else 1)
+        compiler = None
+        if compile_pdf is True:
+            if tex is not True and book is None:
+                raise InputException("compile_partial", " ".join(inpaths))
+            if outpath == "-" or (outpath is None and "-" in inpaths):
+                raise InputException("compile_stdout", "-")
+            from utils.compiler import Compiler
+            compiler = Compiler(tex_engine)
+        stream = "mmap" if mapped is True else stream
+        if book is not None:
+            converter = Converter(french_quote, unnumbered, "book", engine, None, cache, highlighter)
+            return md2tex_book(inpaths, outpath, book, template, (converter, stream, profile, budget, assets), jobs,
+                               compiler)
+        converter = Converter(french_quote, unnumbered, document_class, engine,
+                              template if tex is True else None, cache, highlighter)
+        if watch is True:
+            if len(inpaths) != 1 or inpaths[0] == "-" or os.path.isdir(inpaths[0]):
+                raise InputException("watch", " ".join(inpaths))
+            return md2tex_file(inpaths[0], outpath, converter, stream, watch=True,
+                               template=template if tex is True else None, assets=assets, compiler=compiler)
+        if single:
+            stream = "sections" if parallel_sections is True else stream
+            return md2tex_file(inpaths[0], outpath, converter, stream, profile=profile, budget=budget, jobs=jobs,
+                               assets=assets, compiler=compiler)
+        md2tex_batch(inpaths, outpath, (converter, stream, profile, budget, assets), jobs, compiler)
+    except (InputException, ParsingException) as e:
+        click.echo(e, err=True)
+        sys.exit(1)
+    finally:
+        # ==================== WRITE THE PROFILES ==================== #
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile)
+        if profile_table is True or memory_report is True:
+            click.echo(profile.table(), err=True)
+        if profile_json is not None:
+            import json
+            with open(profile_json, mode="w") as fh:
+                json.dump(profile.json(), fh, indent=2)
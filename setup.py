@@ -8,9 +8,10 @@ setup(
     summary="a python CLI to convert markdown to latex",
     description="a simple and customizable markdown to (la)tex command line interface conversion tool ",
     home_page="https://github.com/paulhectork/md2tex",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),  # the checks aren't installed
     include_package_data=True,
     install_requires=["click==8.1.3"],
+    extras_require={"highlight": ["pygments"], "images": ["pillow"]},  # `--highlight`, `--images`
     entry_points={
         "console_scripts": [
             "md2tex=md2tex:md2tex"
@@ -0,0 +1,25 @@
+import os
+
+__version__ = "0.1.0"
+
+fingerprints = {}  # names of modules: the hash of their sources, computed when first used
+
+
+def fingerprint(*names):
+    """
+    hash the sources of modules of `utils`, so that the keys of the caches change with the
+    code that built their entries, and not only with `__version__`, which isn't bumped when
+    the output changes: an upgraded converter never serves what an older one stored on disk.
+    :param names: the file names of the modules (`assets.py`...). if none are given, all of them
+    :return: the hash, a hex digest
+    """
+    if names not in fingerprints:
+        import hashlib
+        root = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256(__version__.encode())
+        for name in names or sorted(n for n in os.listdir(root) if n.endswith(".py")):
+            digest.update(name.encode())
+            with open(os.path.join(root, name), mode="rb") as fh:
+                digest.update(hashlib.sha256(fh.read()).digest())
+        fingerprints[names] = digest.hexdigest()
+    return fingerprints[names]
@@ -0,0 +1,234 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple
+import multiprocessing
+import asyncio
+import os
+
+from .api import Converter
+from .errors_warnings import InputException, ParsingException
+
+
+# ---------------------------------------------------------------
+# asyncio API: convert markdown documents from coroutines without
+# blocking the event loop. the files are read and written on the
+# default thread pool of the loop and the conversions, which only
+# use the processor, run on a pool of processes. `convert_many()`
+# keeps a bounded number of documents in flight: the documents are
+# taken from the input as the conversions finish, so the input
+# can be a stream of any length.
+#
+# the worker processes are spawned (not forked from a process that
+# runs threads): scripts using this module must start their event
+# loop under `if __name__ == "__main__":`.
+# ---------------------------------------------------------------
+
+
+context = multiprocessing.get_context("spawn")
+sample = "# warm up\n\n- a *list* `item`\n\n1. with a footnote[^1]\n\n[^1]: note\n\n```python\nx = 1\n```\n"
+converters = {}  # the converters of a worker process, by options
+shared = None  # the process pool shared by the conversions, started by the first one
+
+Result = namedtuple("Result", ["index", "source", "tex", "diagnostics", "error"])
+Result.__doc__ = """
+the conversion of a document by `convert_many()`
+:param index: the position of the document in the input
+:param source: the document: its markdown or the path to its file
+:param tex: the string representation of the TeX file, or None if the conversion failed
+:param diagnostics: the problems found in the markdown, as `(warning key, value)` tuples (see `Warnings`)
+:param error: the exception that stopped the conversion, or None
+"""
+
+
+def warm():
+    """
+    import the engines and compile their regexes when a worker process starts
+    """
+    for engine in ("regex", "tree"):
+        Converter(engine=engine).convert(sample)
+
+
+def task(options: tuple, text: str):
+    """
+    convert a markdown string in a worker process. a converter is built once for each set of options
+    :param options: `(french_quote, unnumbered, document_class, engine, template path)`
+    :param text: the string representation of the markdown file
+    :return: the TeX and the diagnostics
+    """
+    if options not in converters:
+        converters[options] = Converter(*options)
+    diagnostics = []
+    return converters[options].convert(text, diagnostics), diagnostics
+
+
+def pool(workers=0):
+    """
+    :param workers: the number of worker processes if the pool isn't started yet. 0 uses all processors
+    :return: the process pool shared by the conversions
+    """
+    global shared
+    if shared is None:
+        shared = ProcessPoolExecutor(workers or None, mp_context=context, initializer=warm)
+    return shared
+
+
+def close():
+    """
+    stop the worker processes of the shared pool. the next conversion starts a new pool
+    """
+    global shared
+    if shared is not None:
+        shared.shutdown()
+        shared = None
+
+
+def read(path):
+    """
+    :param path: the path to a markdown file
+    :return: the contents of the file
+    """
+    with open(path, mode="r") as fh:
+        return fh.read()
+
+
+def write(path, tex: str):
+    """
+    :param path: the path to write the TeX to
+    :param tex: the string representation of the TeX file
+    """
+    with open(path, mode="w") as fh:
+        fh.write(tex)
+
+
+async def run(source, outpath, options: tuple, executor):
+    """
+    read, convert and write a document without blocking the event loop
+    :param source: the markdown string, or the path to a markdown file as an `os.PathLike` (`pathlib.Path`)
+    :param outpath: the path to write the TeX to, or None
+    :param options: the options of the converter (see `task()`)
+    :param executor: the process pool to convert on
+    :return: the TeX and the diagnostics
+    """
+    loop = asyncio.get_running_loop()
+    text = await loop.run_in_executor(None, read, source) if isinstance(source, os.PathLike) else source
+    tex, diagnostics = await loop.run_in_executor(executor, task, options, text)
+    if outpath is not None:
+        await loop.run_in_executor(None, write, outpath, tex)
+    return tex, diagnostics
+
+
+async def validate(options: tuple):
+    """
+    raise an `InputException` for invalid options before any document is converted
+    :param options: the options of the converter (see `task()`)
+    """
+    await asyncio.get_running_loop().run_in_executor(None, Converter, *options)
+
+
+async def convert_async(source, outpath=None, *, french_quote=False, unnumbered=False, document_class="article",
+                        template=None, engine="regex", diagnostics=None, executor=None):
+    """
+    convert a markdown document on a worker process
+    :param source: the markdown string, or the path to a markdown file as an `os.PathLike` (`pathlib.Path`)
+    :param outpath: the path to write the TeX to. if None, the TeX is only returned
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param template: the path to a TeX template, to build a complete TeX document (see `Converter`)
+    :param engine: the conversion engine (see `pipeline.py`)
+    :param diagnostics: if a list is provided, the problems found in the markdown are appended to it
+    :param executor: the process pool to convert on. defaults to the shared pool (see `pool()`)
+    :return: the string representation of the TeX file
+    """
+    options = (french_quote, unnumbered, document_class, engine, template)
+    await validate(options)
+    tex, found = await run(source, outpath, options, executor or pool())
+    if diagnostics is not None:
+        diagnostics.extend(found)
+    return tex
+
+
+async def documents(source):
+    """
+    :param source: an iterable or an asynchronous iterable
+    :return: its items, as an asynchronous iterator
+    """
+    if hasattr(source, "__aiter__"):
+        async for document in source:
+            yield document
+    else:
+        for document in source:
+            yield document
+
+
+async def convert_one(index: int, document, options: tuple, executor):
+    """
+    :param index: the position of the document in the input
+    :param document: a document of `convert_many()`
+    :param options: the options of the converter (see `task()`)
+    :param executor: the process pool to convert on
+    :return: the `Result` of the conversion. errors caused by the document are returned, not raised
+    """
+    source, outpath = document if isinstance(document, tuple) else (document, None)
+    try:
+        tex, diagnostics = await run(source, outpath, options, executor)
+        return Result(index, source, tex, diagnostics, None)
+    except (InputException, ParsingException, OSError, UnicodeError) as e:
+        return Result(index, source, None, [], e)
+
+
+async def convert_many(source, concurrency=0, ordered=False, *, french_quote=False, unnumbered=False,
+                       document_class="article", template=None, engine="regex", executor=None):
+    """
+    convert many markdown documents concurrently, and yield their `Result` as they are converted.
+    at most `concurrency` documents are read, converted or waiting to be yielded at once: the next
+    documents are only taken from `source` when the results are consumed.
+
+    >>> async for result in convert_many(pathlib.Path("docs").glob("*.md"), concurrency=8):
+    ...     print(result.index, result.source, result.error)
+
+    :param source: an iterable or an asynchronous iterable of documents. a document is a markdown string,
+                   the path to a markdown file as an `os.PathLike` (`pathlib.Path`), or a tuple
+                   `(markdown string or path, path to write the TeX to)`
+    :param concurrency: the maximum number of documents in flight. 0 uses the number of processors
+    :param ordered: yield the results in the order of the input. if False, each result is yielded
+                    as soon as its document is converted, so a slow document doesn't hold up the others
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param template: the path to a TeX template, to build complete TeX documents (see `Converter`)
+    :param engine: the conversion engine (see `pipeline.py`)
+    :param executor: the process pool to convert on. defaults to the shared pool (see `pool()`)
+    :return: an asynchronous iterator of `Result`. the options are validated before the first
+             document is taken, and an `InputException` is raised if they are invalid
+    """
+    options = (french_quote, unnumbered, document_class, engine, template)
+    await validate(options)
+    executor = executor or pool()
+    concurrency = concurrency or os.cpu_count() or 1
+    pending = []  # the conversions in flight, in the order of the input
+    inputs = documents(source)
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    document = await inputs.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.append(asyncio.ensure_future(convert_one(index, document, options, executor)))
+                index += 1
+            if not pending:
+                return
+            if ordered:
+                yield await pending.pop(0)
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in sorted(done, key=pending.index):
+                    pending.remove(future)
+                    yield future.result()
+    finally:
+        # the caller stopped iterating: the documents that aren't converted yet are dropped
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,138 @@
+import time
+import os
+
+from .converters import MDSimple, MDHeader
+from .pipeline import engines
+from .errors_warnings import InputException
+
+
+# ---------------------------------------------------------------
+# library API: convert markdown strings to TeX in the current
+# process, without the CLI. nothing is read from or written to
+# the disk except the template, nothing is printed and errors are
+# raised as exceptions (`InputException`, `ParsingException`).
+# ---------------------------------------------------------------
+
+
+default_template = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template.tex")
+
+
+class Converter:
+    """
+    a converter with its options, its template and its regexes
+    prepared once, to convert many markdown strings.
+
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param engine: the conversion engine (see `pipeline.py`)
+    :param template: the path to a TeX template containing a `@@BODYTOKEN@@`
+                     (`default_template`...), to build complete TeX documents.
+                     if None, only the body of the document is built.
+    :param cache: a `ConversionCache` to store the converted documents in. if None,
+                  the documents are always converted.
+    :param highlighter: a `Highlighter` to colour the code with at conversion time (see `highlight.py`).
+                        if None, the code is coloured by `minted` when the TeX is compiled.
+    """
+    def __init__(self, french_quote=False, unnumbered=False, document_class="article", engine="regex",
+                 template=None, cache=None, highlighter=None):
+        if document_class not in ("article", "book"):
+            raise InputException("document_class", document_class)
+        if engine not in engines:
+            raise InputException("engine", engine)
+        self.french_quote = french_quote
+        self.unnumbered = unnumbered
+        self.document_class = document_class
+        self.engine = engine
+        self.highlighter = highlighter
+        self.head, self.foot = Converter.template(template, document_class, highlighter) if template else ("", "")
+        self.cache = cache
+        # compile the regexes now rather than during the first conversion
+        MDSimple.plan()
+        MDHeader.plan(unnumbered, document_class)
+
+    @staticmethod
+    def template(path: str, document_class="article", highlighter=None):
+        """
+        read a TeX template and split it around the `@@BODYTOKEN@@`
+        :param path: the path to the template
+        :param document_class: the class of the tex document, to replace `@@DOCUMENTCLASSTOKEN@@`
+        :param highlighter: the `Highlighter` of the conversion. if given, the template loads
+                            the packages of the highlighted code instead of `minted`
+        :return: the TeX to write before and after the converted body
+        """
+        try:
+            with open(path, mode="r") as fh:
+                tex_template = fh.read()
+        except FileNotFoundError:
+            raise InputException("not_template", path)
+        if "@@BODYTOKEN@@" not in tex_template:
+            raise InputException("template_no_token", path)
+        tex_template = tex_template.replace("@@DOCUMENTCLASSTOKEN@@", document_class)
+        head, foot = tex_template.split("@@BODYTOKEN@@", 1)
+        if highlighter is not None:
+            head = highlighter.preamble(head)
+        return head, foot
+
+    @property
+    def options(self):
+        """
+        :return: the options of the engines (see `pipeline.py`)
+        """
+        return self.french_quote, self.unnumbered, self.document_class
+
+    @property
+    def signature(self):
+        """
+        :return: the engine and the options that change the TeX, to build cache keys (see `ConversionCache.key()`)
+        """
+        style = None if self.highlighter is None else self.highlighter.style
+        return self.engine, self.french_quote, self.unnumbered, self.document_class, style
+
+    def convert(self, text: str, diagnostics=None, profile=None, name="-"):
+        """
+        convert a markdown string to TeX
+        :param text: the string representation of the markdown file
+        :param diagnostics: if a list is provided, the problems found in the markdown are appended to it
+                            as `(warning key, value)` tuples (see `Warnings`)
+        :param profile: a `Profile` to record the stages of the conversion and the document in
+        :param name: the name of the document in the profile
+        :return: the string representation of the TeX file
+        """
+        start = time.perf_counter()
+        if profile is not None:
+            profile.start()
+        if self.cache is None:
+            tex = engines[self.engine](text, *self.options, diagnostics, profile=profile, highlighter=self.highlighter)
+        else:
+            # the template is part of the key but only the body is stored
+            key = self.cache.key(text, self.signature, (self.head, self.foot))
+            entry = self.cache.get(key)
+            if entry is None:
+                found = []
+                entry = engines[self.engine](text, *self.options, found, profile=profile,
+                                             highlighter=self.highlighter), found
+                self.cache.put(key, *entry)
+            if diagnostics is not None:
+                diagnostics.extend(entry[1])
+            tex = entry[0]
+        if profile is not None:
+            profile.document(name, time.perf_counter() - start, len(text))
+        return self.head + tex + self.foot
+
+
+def convert(text: str, *, french_quote=False, unnumbered=False, document_class="article", template=None,
+            engine="regex", cache=None):
+    """
+    convert a markdown string to TeX. to convert several strings
+    with the same options, reuse a `Converter` instead.
+    :param text: the string representation of the markdown file
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param template: the path to a TeX template, to build a complete TeX document (see `Converter`)
+    :param engine: the conversion engine (see `pipeline.py`)
+    :param cache: a `ConversionCache` to store the converted document in
+    :return: the string representation of the TeX file
+    """
+    return Converter(french_quote, unnumbered, document_class, engine, template, cache).convert(text)
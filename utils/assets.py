@@ -0,0 +1,209 @@
+from bisect import bisect_right
+import importlib.util
+import hashlib
+import shutil
+import json
+import os
+import re
+
+from . import fingerprint
+from .converters import escapes
+from .errors_warnings import InputException
+from .scanners import LineScanner, listing_open_re, listing_close_re
+
+
+# ---------------------------------------------------------------
+# image assets: the images included by a converted document (the
+# `\includegraphics` of `MDSimple`) are copied to an assets
+# directory, downscaled to the resolution they are printed at and
+# recompressed, and the TeX points to these copies instead of the
+# original files. large screenshots are what slows the compilation
+# of the TeX down and what makes the PDF big.
+#
+# an asset is named after a hash of the content of the image and
+# of the settings it was processed with: the same image included
+# by several paths or several documents is processed once, and an
+# image that was already processed with the same settings is only
+# looked up. the images are processed on a pool of processes with
+# Pillow, which is only imported when the images are processed.
+# ---------------------------------------------------------------
+
+
+image_re = re.compile(r"(\\includegraphics\[width=\\linewidth\]\{)"
+                      r"((?:\\textbackslash\{\}|\\textgreater\{\}|\\.|[^{}\\\n])+)(\})")  # see `MDSimple`
+unescapes = {v: k for k, v in escapes.items()}  # see `MDCleaner.escape()`
+unescape_re = re.compile("|".join(re.escape(v) for v in sorted(unescapes, key=len, reverse=True)))
+raster = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".gif": "GIF", ".bmp": "BMP", ".tif": "TIFF",
+          ".tiff": "TIFF", ".webp": "WEBP"}  # the formats that are resized. the others are only copied
+jpeg_quality = 85
+page_width = 16.0  # the width of the text of the default template, in cm: an a4 page with margins of 2.5cm
+
+
+class MDAssets:
+    """
+    process the images of converted documents and point the TeX to the processed copies.
+
+    :param directory: the assets directory, where the processed images are written
+    :param dpi: the resolution of the images, in dots per inch of the printed page
+    :param width: the width of the images on the page, in cm
+    :param jobs: the number of processes to resize the images with. 0 uses all processors
+    """
+    def __init__(self, directory="assets", dpi=150, width=page_width, jobs=1):
+        if importlib.util.find_spec("PIL") is None:  # only checked here: the images are processed by `resize()`
+            raise InputException("pillow", directory)
+        if dpi <= 0:
+            raise InputException("image_dpi", str(dpi))
+        self.directory = directory
+        self.dpi = dpi
+        self.width = width
+        self.jobs = jobs
+        self.assets = {}  # `(path, mtime, size)` of a source image: path of its asset, or None if it can't be read
+
+    @property
+    def pixels(self):
+        """
+        :return: the maximum width of the images, in pixels
+        """
+        return round(self.width / 2.54 * self.dpi)
+
+    @property
+    def signature(self):
+        """
+        :return: the settings the TeX of a document depends on: the paths and the names of its assets
+        """
+        return os.path.abspath(self.directory), self.pixels, jpeg_quality
+
+    def key(self, digest: str, ext: str):
+        """
+        :param digest: the hash of the content of an image
+        :param ext: the extension of the image
+        :return: the path of its asset
+        """
+        settings = json.dumps([fingerprint("assets.py"), self.pixels, jpeg_quality, ext]).encode()
+        return os.path.join(self.directory, hashlib.sha256(settings + digest.encode()).hexdigest()[:32] + ext)
+
+    @staticmethod
+    def paths(tex: str):
+        """
+        find the images of a TeX document, outside of its blocks of code
+        :param tex: the TeX document
+        :return: a list of `(start, end, path)`: the span of the path in the TeX and the path, unescaped
+        """
+        code = list(LineScanner.delimited(tex, listing_open_re, listing_close_re))
+        starts = [start for start, end in code]
+        found = []
+        for match in image_re.finditer(tex):
+            i = bisect_right(starts, match.start()) - 1
+            if i >= 0 and match.start() < code[i][1]:
+                continue
+            found.append((match.start(2), match.end(2), unescape_re.sub(lambda m: unescapes[m[0]], match[2])))
+        return found
+
+    def rewrite(self, tex: str, inpath: str, outpath: str):
+        """
+        process the images of a TeX document that haven't been processed yet, and point the
+        document to their assets. the images that don't exist (urls...) are kept as is.
+        :param tex: the TeX document
+        :param inpath: the path to the markdown file, to which the paths of the images are relative, or `-`
+        :param outpath: the path to the TeX file, to which the paths of the assets are relative, or `-`
+        :return: the TeX document, pointing to the assets
+        """
+        found = self.paths(tex)
+        if not found:
+            return tex
+        base = os.path.dirname(inpath) if inpath != "-" else ""
+        sources = [MDAssets.source(os.path.join(base, path)) for start, end, path in found]
+        self.process([s for s in dict.fromkeys(sources) if s is not None and s not in self.assets])
+
+        outdir = os.path.dirname(os.path.abspath(outpath if outpath != "-" else "stdout"))
+        out, last = [], 0
+        for (start, end, path), source in zip(found, sources):
+            asset = None if source is None else self.assets[source]
+            if asset is not None:
+                try:
+                    asset = os.path.relpath(asset, outdir)
+                except ValueError:
+                    asset = os.path.abspath(asset)  # not on the drive of the TeX file
+                out.append(tex[last:start] + asset.replace(os.sep, "/"))
+                last = end
+        return "".join(out) + tex[last:]
+
+    @staticmethod
+    def source(path: str):
+        """
+        :param path: the path to an image
+        :return: `(path, mtime, size)`, which changes when the image is modified, or None if it doesn't exist
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.normpath(path), stat.st_mtime_ns, stat.st_size) if os.path.isfile(path) else None
+
+    def process(self, sources: list):
+        """
+        find the assets of images, and build the missing ones on a pool of processes
+        :param sources: the `(path, mtime, size)` of the images (see `source()`)
+        """
+        tasks = {}  # asset: the first image with its content
+        for source in sources:
+            try:
+                with open(source[0], mode="rb") as fh:
+                    digest = hashlib.sha256(fh.read()).hexdigest()
+            except OSError:
+                self.assets[source] = None
+                continue
+            asset = self.key(digest, os.path.splitext(source[0])[1].lower())
+            self.assets[source] = asset
+            if not os.path.exists(asset):
+                tasks.setdefault(asset, source[0])
+
+        tasks = [(source, asset, self.pixels) for asset, source in tasks.items()]
+        if tasks:
+            os.makedirs(self.directory, exist_ok=True)  # only created when an image is processed
+        jobs = self.jobs or os.cpu_count()
+        if jobs == 1 or len(tasks) < 2:
+            results = map(MDAssets.resize, tasks)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(min(jobs, len(tasks))) as executor:
+                results = list(executor.map(MDAssets.resize, tasks))
+        failed = {asset for (source, asset, pixels), ok in zip(tasks, results) if not ok}
+        if failed:
+            self.assets.update({k: None for k, v in self.assets.items() if v in failed})
+
+    @staticmethod
+    def resize(task: tuple):
+        """
+        build the asset of an image: a raster image wider than the page is downscaled, and
+        it is recompressed if it makes it smaller. the other images are copied as they are.
+        this function runs in the worker processes.
+        :param task: a tuple `(path to the image, path to the asset, maximum width in pixels)`
+        :return: wether the asset was built. an image that can't be read is kept as is in the TeX
+        """
+        from PIL import Image
+
+        source, asset, pixels = task
+        tmp = f"{asset}.{os.getpid()}.tmp"  # other processes never read a half-written asset
+        fmt = raster.get(os.path.splitext(asset)[1])
+        try:
+            if fmt is None:
+                shutil.copyfile(source, tmp)
+            else:
+                with Image.open(source) as image:
+                    resized = image.width > pixels
+                    if resized:
+                        image = image.resize((pixels, max(1, round(image.height * pixels / image.width))),
+                                             Image.Resampling.LANCZOS)
+                    if fmt == "JPEG":
+                        image.save(tmp, fmt, quality=jpeg_quality, optimize=True)
+                    else:
+                        image.save(tmp, fmt, optimize=True)
+                if not resized and os.path.getsize(tmp) >= os.path.getsize(source):
+                    shutil.copyfile(source, tmp)  # recompressing didn't make it smaller
+            os.replace(tmp, asset)
+            return True
+        except (OSError, ValueError):  # not an image, or a format that Pillow can't write
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
@@ -0,0 +1,118 @@
+import json
+import os
+
+from .cache import ConversionCache
+from .errors_warnings import InputException
+
+
+# ---------------------------------------------------------------
+# book assembly: a book is an ordered list of chapter files, given
+# on the command line or in a manifest. each chapter is converted
+# to its own TeX file, and a master document built from the TeX
+# template `\include`s them.
+#
+# the key of each converted chapter (see `ConversionCache.key()`)
+# is kept in a state file of the output directory: a chapter whose
+# markdown and options haven't changed since it was last converted,
+# and whose TeX file still exists, isn't converted again.
+# ---------------------------------------------------------------
+
+
+state_name = ".md2tex-book.json"  # the state file, in the output directory
+
+
+class Book:
+    """
+    the output directory of a book and the state of its chapters
+
+    :param outdir: the directory to write the chapters and the master document to
+    :param name: the name of the master document, without its extension
+    """
+    def __init__(self, outdir: str, name: str):
+        self.outdir = outdir
+        self.name = name
+        self.path = os.path.join(outdir, state_name)
+        self.state = {}  # path of a chapter TeX file, relative to `outdir`: `{"key": ..., "diagnostics": [...]}`
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as fh:
+                self.state = json.load(fh)
+        except (OSError, ValueError):
+            pass  # first build, or a state file that can't be read: all the chapters are converted
+
+    @staticmethod
+    def manifest(path: str):
+        """
+        read a manifest: a text file listing the chapter files of a book, one per line, in
+        the order of the book. empty lines and lines starting with `#` are ignored.
+        :param path: the path to the manifest
+        :return: the paths to the chapter files, relative to the directory of the manifest
+        """
+        try:
+            with open(path, mode="r") as fh:
+                lines = [line.strip() for line in fh]
+        except FileNotFoundError:
+            raise InputException("not_inpath", path)
+        root = os.path.dirname(path)
+        return [os.path.join(root, line) for line in lines if line and not line.startswith("#")]
+
+    @staticmethod
+    def key(text: str, converter, assets=None):
+        """
+        :param text: the markdown of a chapter
+        :param converter: the converter of the chapters
+        :param assets: the `MDAssets` processing the images of the chapters, or None
+        :return: the key of the chapter, which changes with its markdown and its options
+        """
+        options = converter.signature if assets is None else converter.signature + assets.signature
+        return ConversionCache.key(text, options, ("", ""))
+
+    def relpath(self, outpath: str):
+        """
+        :param outpath: the path to a chapter TeX file
+        :return: the path to the file, relative to the output directory, with `/` separators
+        """
+        return os.path.relpath(outpath, self.outdir).replace(os.sep, "/")
+
+    def fresh(self, outpath: str, key: str):
+        """
+        :param outpath: the path to a chapter TeX file
+        :param key: the key of the chapter
+        :return: the diagnostics of the last conversion of the chapter if it doesn't need to be
+                 converted again, else None
+        """
+        entry = self.state.get(self.relpath(outpath))
+        if entry is None or entry["key"] != key or not os.path.isfile(outpath):
+            return None
+        return [tuple(d) for d in entry["diagnostics"]]
+
+    def record(self, outpath: str, key: str, diagnostics: list):
+        """
+        remember that a chapter has been converted
+        :param outpath: the path to the chapter TeX file
+        :param key: the key of the chapter
+        :param diagnostics: the diagnostics of the conversion
+        """
+        self.state[self.relpath(outpath)] = {"key": key, "diagnostics": [list(d) for d in diagnostics]}
+
+    def save(self, outpaths: list):
+        """
+        write the state file. the chapters that aren't in the book anymore are forgotten
+        :param outpaths: the paths to the chapter TeX files of the book
+        """
+        chapters = {self.relpath(p) for p in outpaths}
+        self.state = {k: v for k, v in self.state.items() if k in chapters}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, mode="w", encoding="utf-8") as fh:
+            json.dump(self.state, fh, indent=2)
+        os.replace(tmp, self.path)
+
+    def master(self, outpaths: list, head: str, foot: str):
+        """
+        build the master document
+        :param outpaths: the paths to the chapter TeX files, in the order of the book
+        :param head: the TeX of the template before the body (see `Converter.template()`)
+        :param foot: the TeX of the template after the body
+        :return: the path to the master document, and its TeX
+        """
+        body = "".join(f"\\include{{{self.relpath(p)[:-len('.tex')]}}}\n" for p in outpaths)
+        return os.path.join(self.outdir, self.name + ".tex"), head + body + foot
@@ -0,0 +1,47 @@
+# ---------------------------------------------------------------
+# a document buffer to splice replacements into a string by
+# offset, instead of replacing tokens in the whole document.
+# ---------------------------------------------------------------
+
+
+class SpanBuffer:
+    """
+    a string and the edits to make to it. an edit replaces the
+    span `[start:end]` of the original string by a new text; the
+    new string is built once, by `join()`.
+
+    the offsets are always those of the original string (those of
+    the matches of `re.finditer()` on it), so edits can be added
+    in any order. if two edits overlap, the first one in the string
+    is kept and the other one is dropped.
+
+    :param string: the string to edit
+    """
+    def __init__(self, string: str):
+        self.string = string
+        self.edits = []
+
+    def splice(self, start: int, end: int, text: str):
+        """
+        replace a span of the original string
+        :param start: the start of the span
+        :param end: the end of the span
+        :param text: the text to replace the span by
+        """
+        self.edits.append((start, end, text))
+
+    def join(self):
+        """
+        apply all the edits and build the new string
+        :return: the edited string
+        """
+        pieces = []
+        pos = 0
+        for start, end, text in sorted(self.edits, key=lambda e: e[0]):
+            if start < pos:
+                continue  # overlaps the previous edit
+            pieces.append(self.string[pos:start])
+            pieces.append(text)
+            pos = end
+        pieces.append(self.string[pos:])
+        return "".join(pieces)
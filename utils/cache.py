@@ -0,0 +1,157 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+from . import fingerprint
+
+
+# ---------------------------------------------------------------
+# conversion cache: the TeX of a document is stored under a hash
+# of everything that it depends on (the markdown, the options, the
+# template and the code of md2tex), so that converting the same
+# document again only costs a lookup.
+# - a memory tier, holding the last documents used (LRU)
+# - an optional disk tier, a directory of json files shared by
+#   several processes and runs, whose oldest files are deleted
+#   when it grows too big.
+# ---------------------------------------------------------------
+
+
+class ConversionCache:
+    """
+    a two-tier cache of converted documents. the entries are
+    `(TeX, diagnostics)` tuples.
+
+    :param size: the maximum number of documents in memory
+    :param directory: the directory of the disk tier. if None, there is no disk tier
+    :param max_bytes: the maximum size of the disk tier
+    """
+    def __init__(self, size=128, directory=None, max_bytes=2 ** 28):
+        self.size = size
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()  # key: entry, from the least to the most recently used
+        self.hits = 0  # documents found in memory
+        self.disk_hits = 0  # documents found on the disk
+        self.misses = 0  # documents that had to be converted
+        self.used = None  # size of the disk tier, computed when it is first written to
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # a cache sent to another process doesn't bring its memory tier with it
+        state = self.__dict__.copy()
+        state["memory"] = OrderedDict()
+        return state
+
+    @staticmethod
+    def key(text: str, options: tuple, template: tuple):
+        """
+        build the key of a document
+        :param text: the markdown document
+        :param options: the options of the conversion, including the engine
+        :param template: the TeX before and after the body
+        :return: the key, a hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([fingerprint(), list(options), list(template)]).encode())
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def path(self, key: str):
+        """
+        :param key: the key of a document
+        :return: the path of its file in the disk tier
+        """
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str):
+        """
+        find a document in the cache
+        :param key: the key of the document
+        :return: the `(TeX, diagnostics)` of the document, or None if it isn't cached
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.directory is not None:
+            try:
+                with open(self.path(key), mode="r", encoding="utf-8") as fh:
+                    tex, diagnostics = json.load(fh)
+                os.utime(self.path(key))  # the oldest files are deleted first
+            except (OSError, ValueError):
+                pass  # not cached, or deleted or written by another process meanwhile
+            else:
+                entry = tex, [tuple(d) for d in diagnostics]
+                self.remember(key, entry)
+                self.disk_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, tex: str, diagnostics: list):
+        """
+        add a converted document to the cache
+        :param key: the key of the document
+        :param tex: its TeX
+        :param diagnostics: its diagnostics (see `pipeline.py`)
+        """
+        entry = tex, list(diagnostics)
+        self.remember(key, entry)
+        if self.directory is not None:
+            tmp = f"{self.path(key)}.{os.getpid()}.tmp"
+            with open(tmp, mode="w", encoding="utf-8") as fh:
+                json.dump(entry, fh)
+            if self.used is None:
+                self.used = self.evict()
+            self.used += os.path.getsize(tmp)
+            os.replace(tmp, self.path(key))  # other processes never read a half-written file
+            if self.used > self.max_bytes:
+                self.used = self.evict()
+
+    def remember(self, key: str, entry: tuple):
+        """
+        add an entry to the memory tier and forget the least recently used entries
+        :param key: the key of the document
+        :param entry: the `(TeX, diagnostics)` of the document
+        """
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        """
+        delete the least recently used files of the disk tier until it is smaller than `max_bytes`.
+        the directory is scanned, since other processes may write to it.
+        :return: the size of the disk tier
+        """
+        files = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        return total
+
+    def stats(self):
+        """
+        :return: the hit and miss counters of the cache
+        """
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
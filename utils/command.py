@@ -0,0 +1,694 @@
+from typing import TYPE_CHECKING
+from ntpath import basename
+import glob
+import time
+import sys
+import re
+import os
+
+import click
+
+from .errors_warnings import InputException, ParsingException, Warnings
+
+if TYPE_CHECKING:  # only for the annotations: the functions import what they use
+    from .api import Converter
+    from .compiler import Compiler
+
+
+# ---------------------------------------------------------------
+# the conversions run by the `md2tex` command: a file, a batch, a
+# book, the chunked modes and `--watch`, and the `serve` command.
+# they are only imported when the command runs, so that loading
+# `md2tex.py` (`--help`, `--version`) doesn't compile them (see
+# `benchmarks/startup.py`).
+# ---------------------------------------------------------------
+
+
+watch_interval = 0.5  # seconds between two checks of the watched files
+
+
+def md2tex_file(inpath: str, outpath, converter: "Converter", stream: bool, watch=False, profile=None,
+                budget=None, jobs=1, assets=None, compiler=None, template=None):
+    """
+    convert a single Markdown file, given on the command line
+    :param inpath: the path to the *.md file to convert to tex, or `-` to read from stdin
+    :param outpath: the path to save the file to, or `-` to write to stdout
+    :param converter: the converter, with the options of the conversion
+    :param stream: wether to read, convert and write the file in chunks
+    :param watch: wether to watch the file (and its template) and convert it each time it changes
+    :param profile: a `Profile` to record the conversion in
+    :param budget: the memory budget of the conversion, in bytes, or None (see `memory_mode()`)
+    :param jobs: the number of processes to convert the sections of the file with (see `md2tex_sections()`)
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :param compiler: the `Compiler` to compile the TeX file to PDF with, or None
+    :param template: the path to the TeX template to watch with the file, or None
+    :return: data, a string representation of the .md file converted to .tex
+    """
+    # ==================== PROCESS THE ARGUMENTS ==================== #
+    if inpath != "-" and not re.search(r"\.md$", inpath):
+        raise InputException("not_md", inpath)
+    if inpath != "-" and not os.path.isfile(inpath):
+        raise InputException("not_inpath", inpath)
+    if outpath is None and inpath == "-":
+        outpath = "-"  # stdin is written to stdout
+    elif outpath is None:
+        outpath = "output/" + re.sub(r'\..+?$', '.tex', basename(inpath))  # build default outpath
+    elif "/" in outpath and "\\" in outpath:
+        raise InputException("outpath_slashes", outpath)  # gnu-linux escapes backslashes so this shouldn't be called
+    elif os.path.isdir(outpath):  # if the output path is a dir and not a file, save the file to that dir
+        outpath = f"{outpath}/{basename(inpath)}"
+    if outpath != "-" and not re.search(r"\.tex$", outpath):
+        # add a .tex extension if it doesn't exist or if a different extension was
+        # provided by the user
+        Warnings("outpath_extension", outpath)
+        outpath = re.sub(r"$", ".tex", outpath)
+
+    # build output directory
+    if outpath != "-" and not os.path.exists("./output"):
+        os.makedirs("./output")
+    # checked before the conversion, so that a failed run doesn't leave images in the assets directory
+    if outpath != "-" and not os.path.isdir(os.path.dirname(outpath) or "."):
+        raise InputException("not_outpath", outpath)
+
+    if watch is True:
+        return md2tex_watch(inpath, outpath, converter, template, assets, compiler)
+
+    # ==================== CONVERT THE FILE ==================== #
+    notes = []  # the warnings about the memory budget
+    if budget is not None and not stream:
+        stream = memory_mode(inpath, converter.engine, budget, notes)
+    data, diagnostics = convert(inpath, outpath, converter, stream, profile, jobs, assets)
+    for key, val in notes + diagnostics:
+        Warnings(key, val)
+
+    cached = converter.cache is not None and not stream and converter.cache.misses == 0
+    cached = " (from the cache)" if cached else ""
+    click.echo(f"FINISHED - file conversion completed and saved to `{outpath}`{cached}", err=outpath == "-")
+    if compiler is not None and md2tex_compile([outpath], compiler, 1):
+        raise InputException("compile_failed", outpath)
+    return data
+
+
+def md2tex_watch(inpath: str, outpath: str, converter: "Converter", template=None, assets=None, compiler=None):
+    """
+    watch a Markdown file and its template, and write the TeX file again each
+    time one of them changes. the file is converted incrementally (see
+    `MDIncremental`). errors are printed and the file is still watched.
+    :param inpath: the path to the *.md file to convert to tex
+    :param outpath: the path to save the file to, or `-` to write to stdout
+    :param converter: the converter, with the options of the conversion
+    :param template: the path to the TeX template, or None
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :param compiler: the `Compiler` to compile the TeX file to PDF with each time it is written, or None
+    """
+    from .api import Converter
+    from .watch import MDIncremental
+
+    incremental = MDIncremental(converter.engine, converter.options, highlighter=converter.highlighter)
+    paths = [inpath] if template is None else [inpath, template]
+    last = None  # modification time and size of the watched files
+    click.echo(f"WATCHING - `{'`, `'.join(paths)}`. stop with Ctrl+C", err=outpath == "-")
+    try:
+        while True:
+            state = []
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                    state.append((stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    state.append(None)  # the file is being saved
+            if state != last and None not in state:
+                start = time.perf_counter()
+                try:
+                    if template is not None and (last is None or state[1] != last[1]):
+                        converter.head, converter.foot = Converter.template(template, converter.document_class,
+                                                                            converter.highlighter)
+                    with open(inpath, mode="r") as fh:
+                        data = fh.read()
+                    diagnostics = []
+                    data = converter.head + incremental.convert(data, diagnostics) + converter.foot
+                    data = data if assets is None else assets.rewrite(data, inpath, outpath)
+                    with click.open_file(outpath, mode="w") as fh:
+                        fh.write(data)
+                except FileNotFoundError:
+                    click.echo(InputException("not_outpath", outpath), err=True)
+                except (InputException, ParsingException, OSError, UnicodeError) as e:
+                    click.echo(e, err=True)
+                else:
+                    for key, val in diagnostics:
+                        Warnings(key, val)
+                    click.echo(f"UPDATED - `{outpath}` written in {(time.perf_counter() - start) * 1000:.0f} ms",
+                               err=outpath == "-")
+                    for texpath in [] if compiler is None else md2tex_compile([outpath], compiler, 1):
+                        click.echo(InputException("compile_failed", texpath), err=True)
+                last = state
+            time.sleep(watch_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def md2tex_batch(inpaths: tuple, outdir, options: tuple, jobs: int, compiler=None):
+    """
+    convert several Markdown files, possibly on several processes, and print a
+    summary. an error in a file doesn't stop the conversion of the other files.
+    :param inpaths: the paths, directories and glob patterns given on the command line
+    :param outdir: the directory to save the files to
+    :param options: the converter, the stream flag, the `Profile` or None, the memory budget or None
+                    and the `MDAssets` or None (see `convert_task()`)
+    :param jobs: the number of processes to use. 0 uses all processors
+    :param compiler: the `Compiler` to compile the converted files to PDF with, or None
+    """
+    if "-" in inpaths:
+        raise InputException("stdin_batch", "-")
+    outdir = "output" if outdir is None else outdir
+    tasks = []  # `(inpath, outpath, options)` for each file to convert
+    failed = []  # `(inpath, error message)` for each file that can't be converted
+    outpaths = set()
+    for inpath, relpath in expand_paths(inpaths, failed):
+        outpath = os.path.join(outdir, re.sub(r"(\.md)?$", ".tex", relpath, count=1))
+        if outpath in outpaths:
+            failed.append((inpath, str(InputException("outpath_duplicate", outpath))))
+            continue
+        outpaths.add(outpath)
+        os.makedirs(os.path.dirname(outpath) or ".", exist_ok=True)
+        tasks.append((inpath, outpath, options))
+
+    # ==================== PRINT THE SUMMARY ==================== #
+    converted = []  # `(inpath, outpath)` for each converted file
+    cached = 0
+    for inpath, outpath, diagnostics, error, hit, profile in run_tasks(tasks, jobs):
+        if profile is not None:
+            options[2].merge(profile)
+        if error is None:
+            converted.append((inpath, outpath))
+            cached += hit
+            click.echo(f"OK - `{inpath}` saved to `{outpath}`")
+            for key, val in diagnostics:
+                Warnings(key, val)
+        else:
+            failed.append((inpath, error))
+    compiled = ""
+    if compiler is not None:
+        errors = set(md2tex_compile([outpath for inpath, outpath in converted], compiler, jobs))
+        failed.extend((i, str(InputException("compile_failed", o))) for i, o in converted if o in errors)
+        compiled = f", {len(converted) - len(errors)} PDF(s) up to date"
+    for inpath, error in failed:
+        click.echo(f"FAILED - `{inpath}`: {error}", err=True)
+    cached = f" ({cached} from the cache)" if options[0].cache is not None and not options[1] else ""
+    click.echo(f"FINISHED - {len(converted)} file(s) converted{cached}{compiled}, {len(failed)} failed")
+    if failed:
+        sys.exit(1)
+
+
+def md2tex_book(inpaths: tuple, outdir, name: str, template: str, options: tuple, jobs: int, compiler=None):
+    """
+    build a book: convert its chapters, possibly on several processes, and write the
+    master document that includes them. the chapters that haven't changed since the
+    last build aren't converted again (see `Book`).
+    :param inpaths: the chapter files, directories and glob patterns, and the manifests, in the order of the book
+    :param outdir: the directory to save the book to
+    :param name: the name of the master document, without its extension
+    :param template: the path to the TeX template of the master document
+    :param options: the converter of the chapters, the stream flag, the `Profile` or None, the memory
+                    budget or None and the `MDAssets` or None (see `convert_task()`)
+    :param jobs: the number of processes to use. 0 uses all processors
+    :param compiler: the `Compiler` to compile the master document to PDF with, or None
+    """
+    from .api import Converter
+    from .book import Book
+
+    if "-" in inpaths:
+        raise InputException("stdin_batch", "-")
+    converter = options[0]
+    head, foot = Converter.template(template, converter.document_class, converter.highlighter)
+    outdir = "output" if outdir is None else outdir
+    os.makedirs(outdir, exist_ok=True)
+    book = Book(outdir, name)
+    chapters = []
+    for inpath in inpaths:
+        if os.path.isdir(inpath) or glob.has_magic(inpath) or re.search(r"\.md$", inpath):
+            chapters.append(inpath)
+        else:
+            chapters.extend(Book.manifest(inpath))
+    tasks = []  # `(inpath, outpath, options)` for each chapter to convert
+    keys = []  # the key of each chapter to convert
+    unchanged = []  # `(inpath, diagnostics)` for each chapter that doesn't need to be converted
+    failed = []
+    outpaths = []  # the chapters, in the order of the book
+    for inpath, relpath in expand_paths(chapters, failed):
+        outpath = os.path.join(outdir, re.sub(r"(\.md)?$", ".tex", relpath, count=1))
+        if outpath in outpaths:
+            failed.append((inpath, str(InputException("outpath_duplicate", outpath))))
+            continue
+        outpaths.append(outpath)
+        try:
+            with open(inpath, mode="r") as fh:
+                key = Book.key(fh.read(), converter, options[4])
+        except (OSError, UnicodeError):
+            key = None  # the error is reported by the conversion
+        diagnostics = None if key is None else book.fresh(outpath, key)
+        if diagnostics is not None:
+            unchanged.append((inpath, diagnostics))
+            continue
+        os.makedirs(os.path.dirname(outpath) or ".", exist_ok=True)
+        tasks.append((inpath, outpath, options))
+        keys.append(key)
+
+    # ==================== CONVERT THE CHAPTERS ==================== #
+    converted = 0
+    for key, (inpath, outpath, diagnostics, error, hit, profile) in zip(keys, run_tasks(tasks, jobs)):
+        if profile is not None:
+            options[2].merge(profile)
+        if error is None:
+            converted += 1
+            book.record(outpath, key, diagnostics)
+            click.echo(f"OK - `{inpath}` saved to `{outpath}`")
+            for warning, val in diagnostics:
+                Warnings(warning, val)
+        else:
+            failed.append((inpath, error))
+            outpaths.remove(outpath)  # the master document doesn't include a missing or stale chapter
+    for inpath, diagnostics in unchanged:
+        for warning, val in diagnostics:
+            Warnings(warning, val)
+
+    # ==================== WRITE THE MASTER DOCUMENT ==================== #
+    book.save(outpaths)
+    master, tex = book.master(outpaths, head, foot)
+    try:
+        with open(master, mode="r") as fh:
+            written = fh.read() == tex
+    except (OSError, UnicodeError):
+        written = False
+    if not written:  # an unchanged master isn't written again, so that its TeX builds aren't started again
+        with open(master, mode="w") as fh:
+            fh.write(tex)
+    if compiler is not None and not failed and md2tex_compile([master], compiler, 1):
+        failed.append((master, str(InputException("compile_failed", master))))
+    for inpath, error in failed:
+        click.echo(f"FAILED - `{inpath}`: {error}", err=True)
+    click.echo(f"FINISHED - book saved to `{master}`: {converted} chapter(s) converted, "
+               + f"{len(unchanged)} unchanged, {len(failed)} failed")
+    if failed:
+        sys.exit(1)
+
+
+def run_tasks(tasks: list, jobs: int):
+    """
+    run `convert_task()` on each task, possibly on several processes
+    :param tasks: the tasks (see `convert_task()`)
+    :param jobs: the number of processes to use. 0 uses all processors
+    :return: a generator of the results, in the order of the tasks
+    """
+    if jobs == 1 or len(tasks) < 2:
+        yield from map(convert_task, tasks)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs or None) as executor:
+        # several files are sent to a process at once: they are small and many
+        yield from executor.map(convert_task, tasks,
+                                chunksize=max(1, len(tasks) // ((jobs or os.cpu_count()) * 4)))
+
+
+def md2tex_compile(texpaths: list, compiler: "Compiler", jobs: int):
+    """
+    compile TeX files to PDF, when they changed since their last compilation, and print the
+    compiled files (see `Compiler.compile()`)
+    :param texpaths: the paths to the TeX files
+    :param compiler: the `Compiler`
+    :param jobs: the number of compilations to run at once. 0 uses all processors
+    :return: the paths to the TeX files that couldn't be compiled
+    """
+    failed = []
+    for texpath, runs, code in compiler.compile(texpaths, jobs):
+        pdf = re.sub(r"\.tex$", ".pdf", texpath)
+        if runs == 0:
+            click.echo(f"UNCHANGED - `{pdf}` is up to date, not compiled again")
+        elif code == 0:
+            click.echo(f"COMPILED - `{texpath}` compiled to `{pdf}` in {runs} run(s)")
+        else:
+            failed.append(texpath)
+    return failed
+
+
+def expand_paths(inpaths: tuple, failed: list):
+    """
+    find the files to convert: a path to a file is kept as is, a directory is
+    replaced by all the `*.md` files it contains and a glob pattern by all
+    the files it matches.
+    :param inpaths: the paths, directories and glob patterns given on the command line
+    :param failed: the list of failed files, to which the paths that match nothing are added
+    :return: a list of `(path to the file, path to the output, relative to the output directory)`
+    """
+    files = {}
+    for inpath in inpaths:
+        if os.path.isdir(inpath):
+            root = inpath
+            matches = glob.glob(os.path.join(glob.escape(inpath), "**", "*.md"), recursive=True)
+        elif glob.has_magic(inpath):
+            # the tree is reproduced from the last directory before the pattern
+            root = ""
+            for part in re.split(r"(?<=[/\\])", inpath):
+                if glob.has_magic(part):
+                    break
+                root += part
+            matches = glob.glob(inpath, recursive=True)
+            matches = [m for m in matches if os.path.isfile(m)]
+        else:
+            root = os.path.dirname(inpath)
+            matches = [inpath]
+        if not matches:
+            failed.append((inpath, str(InputException("no_match", inpath))))
+        for match in sorted(matches):
+            files.setdefault(os.path.normpath(match), os.path.relpath(match, root or "."))
+    return list(files.items())
+
+
+def convert_task(task: tuple):
+    """
+    convert one file of a batch. this function runs in the worker processes,
+    so it returns the errors instead of raising them.
+    :param task: a tuple `(inpath, outpath, (converter, stream, profile, budget, assets))` (see `convert()`
+                 and `memory_mode()`)
+    :return: a tuple `(inpath, outpath, diagnostics, error message or None, found in the cache, Profile or None)`.
+             the profile only contains this file: the profiles are added up by the main process.
+    """
+    from .profile import Profile
+
+    inpath, outpath, (converter, stream, profile, budget, assets) = task
+    profile = None if profile is None else Profile(memory=profile.memory)
+    cache = None
+    misses = 0
+    try:
+        if not re.search(r"\.md$", inpath):
+            raise InputException("not_md", inpath)
+        if not os.path.isfile(inpath):
+            raise InputException("not_inpath", inpath)
+        notes = []  # the warnings about the memory budget
+        if budget is not None and not stream:
+            stream = memory_mode(inpath, converter.engine, budget, notes)
+        cache = None if stream else converter.cache  # `--stream` doesn't use the cache
+        misses = 0 if cache is None else cache.misses
+        data, diagnostics = convert(inpath, outpath, converter, stream, profile, assets=assets)
+        diagnostics = notes + diagnostics
+        return inpath, outpath, diagnostics, None, cache is not None and cache.misses == misses, profile
+    except (InputException, ParsingException, OSError, UnicodeError) as e:
+        return inpath, outpath, [], str(e) or type(e).__name__, False, profile
+
+
+def convert(inpath, outpath, converter: "Converter", stream: bool, profile=None, jobs=1, assets=None):
+    """
+    convert a Markdown file and write it to the output
+    :param inpath: the path to the *.md file to convert to tex, or `-` for stdin
+    :param outpath: the path to save the file to, or `-` for stdout
+    :param converter: the converter, with the options of the conversion
+    :param stream: wether to read, convert and write the file in chunks. `mmap` memory-maps the file,
+                   `sections` converts its chunks on several processes
+    :param profile: a `Profile` to record the conversion in
+    :param jobs: the number of processes to convert the sections with, in `sections` mode
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :return: the TeX (None in `stream` mode) and the loose and duplicate footnotes, to warn about
+    """
+    if stream == "sections" and inpath != "-":
+        return None, md2tex_sections(inpath, outpath, converter, jobs, profile, assets)
+    if stream == "mmap" and inpath != "-":
+        return None, md2tex_mapped(inpath, outpath, converter, profile, assets)
+    if stream:
+        return None, md2tex_stream(inpath, outpath, converter, profile, assets)
+
+    # open file and read contents
+    with click.open_file(inpath, mode="r") as fh:
+        data = fh.read()
+    diagnostics = []
+    data = converter.convert(data, diagnostics, profile, inpath)
+    if assets is not None:
+        data = assets.rewrite(data, inpath, outpath)
+
+    # ==================== WRITE OUTPUT TO FILE ==================== #
+    try:
+        with click.open_file(outpath, mode="w") as fh:
+            fh.write(data)
+    except FileNotFoundError:
+        raise InputException("not_outpath", outpath)
+    return data, diagnostics
+
+
+def rewriter(assets, inpath, outpath):
+    """
+    :param assets: the `MDAssets` to process the images with, or None
+    :param inpath: the path to the *.md file, or `-` for stdin
+    :param outpath: the path to the TeX file, or `-` for stdout
+    :return: a function pointing a part of the TeX of the file to the assets of its images
+             (see `MDAssets.rewrite()`)
+    """
+    if assets is None:
+        return lambda tex: tex
+    return lambda tex: assets.rewrite(tex, inpath, outpath)
+
+
+def memory_mode(inpath, engine: str, budget: int, diagnostics: list):
+    """
+    choose how to convert a file within a memory budget: at once if the estimated
+    peak of its conversion fits in the budget (see `footprint()`), else in chunks.
+    the chunks are converted one by one, so the largest one must fit in the budget:
+    it is only the case if the file can be split (see `MDStream.chunks()`).
+    :param inpath: the path to the *.md file to convert, or `-` for stdin
+    :param engine: the name of the conversion engine
+    :param budget: the memory budget, in bytes
+    :param diagnostics: the list to append the warnings about the budget to
+    :return: False to convert the file at once, `mmap` to convert it in chunks from a memory
+             map (see `convert()`), or True for stdin, whose size isn't known before it is read
+    """
+    from .pipeline import footprint
+    from .mapped import MDMapped
+    import mmap
+
+    if inpath == "-":
+        return True
+    with open(inpath, mode="rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return False  # an empty file can't be mapped
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if footprint(data, engine) <= budget:
+                return False
+            diagnostics.append(("memory_budget", inpath))
+            largest = max(end - start for start, end in MDMapped.chunks(data))
+            if footprint(data, engine, largest) > budget:
+                diagnostics.append(("memory_budget_chunk", inpath))
+            return "mmap"
+
+
+def md2tex_stream(inpath, outpath, converter: "Converter", profile=None, assets=None):
+    """
+    convert a Markdown file to TeX chunk by chunk: each chunk of the file is
+    written to the output as soon as it is converted. if the input can be read
+    twice (a file and not stdin), its footnotes are indexed first, so that
+    the chunks never wait for a footnote.
+
+    :param inpath: the path to the *.md file to convert to tex, or `-` for stdin
+    :param outpath: the path to save the file to, or `-` for stdout
+    :param converter: the converter, with the options of the conversion
+    :param profile: a `Profile` to record the conversion in
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :return: the loose and duplicate footnotes, to warn about
+    """
+    from .stream import MDStream
+
+    start = time.perf_counter()
+    size = 0
+    images = rewriter(assets, inpath, outpath)
+    if profile is not None:
+        profile.start()
+    with click.open_file(inpath, mode="r") as fh:
+        footnotes = None
+        if fh.seekable():
+            footnotes = MDStream.index(fh, converter.engine)
+            fh.seek(0)
+        stream = MDStream(converter.engine, *converter.options, footnotes, profile, converter.highlighter)
+        try:
+            out = click.open_file(outpath, mode="w")
+        except FileNotFoundError:
+            raise InputException("not_outpath", outpath)
+        with out:
+            out.write(converter.head)
+            for chunk in MDStream.chunks(fh):
+                size += len(chunk)
+                out.write(images(stream.feed(chunk)))
+            out.write(images(stream.close()))
+            out.write(converter.foot)
+    if profile is not None:
+        profile.document(inpath, time.perf_counter() - start, size)
+    return stream.diagnose()
+
+
+def md2tex_mapped(inpath: str, outpath, converter: "Converter", profile=None, assets=None):
+    """
+    convert a Markdown file to TeX chunk by chunk, from a memory map of the
+    file: the chunks and the footnotes are found in its bytes (see `MDMapped`),
+    and the TeX of each chunk is encoded and written to a buffered binary output.
+
+    :param inpath: the path to the *.md file to convert to tex
+    :param outpath: the path to save the file to, or `-` for stdout
+    :param converter: the converter, with the options of the conversion
+    :param profile: a `Profile` to record the conversion in
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :return: the loose and duplicate footnotes, to warn about
+    """
+    from .mapped import MDMapped
+    from .stream import MDStream
+    import mmap
+
+    start = time.perf_counter()
+    size = 0
+    images = rewriter(assets, inpath, outpath)
+    if profile is not None:
+        profile.start()
+    with open(inpath, mode="rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            data = b""  # an empty file can't be mapped
+        else:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if data.find(b"\r") >= 0:
+            return md2tex_stream(inpath, outpath, converter, profile, assets)  # line endings to translate
+        spans = list(MDMapped.chunks(data))
+        footnotes, found = MDMapped.index(data, spans, converter.engine)
+        stream = MDStream(converter.engine, *converter.options, footnotes, profile, converter.highlighter)
+        try:
+            out = click.open_file(outpath, mode="wb")
+        except FileNotFoundError:
+            raise InputException("not_outpath", outpath)
+        with out:
+            out.write(converter.head.encode())
+            for (first, last), notes in zip(spans, found):
+                chunk = data[first:last].decode()
+                size += len(chunk)
+                out.write(images(stream.feed(chunk, notes)).encode())
+            out.write(images(stream.close()).encode())
+            out.write(converter.foot.encode())
+    finally:
+        if data:
+            data.close()
+    if profile is not None:
+        profile.document(inpath, time.perf_counter() - start, size)
+    return stream.diagnose()
+
+
+def md2tex_sections(inpath: str, outpath, converter: "Converter", jobs: int, profile=None, assets=None):
+    """
+    convert a Markdown file on several processes: the file is split in sections, as in
+    `--mmap`, that are converted in parallel, and their TeX is written in order as soon
+    as it is ready (see `MDSections`).
+
+    :param inpath: the path to the *.md file to convert to tex
+    :param outpath: the path to save the file to, or `-` for stdout
+    :param converter: the converter, with the options of the conversion
+    :param jobs: the number of processes to use. 0 uses all processors
+    :param profile: a `Profile` to record the conversion in
+    :param assets: the `MDAssets` to process the images of the file with, or None
+    :return: the loose and duplicate footnotes, to warn about
+    """
+    from .sections import MDSections
+    import mmap
+
+    start = time.perf_counter()
+    size = 0
+    images = rewriter(assets, inpath, outpath)
+    if profile is not None:
+        profile.start()
+    with open(inpath, mode="rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            data = b""  # an empty file can't be mapped
+        else:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    executor = None
+    try:
+        if data.find(b"\r") >= 0:
+            return md2tex_stream(inpath, outpath, converter, profile, assets)  # line endings to translate
+        jobs = jobs or os.cpu_count()
+        spans = MDSections.spans(data, jobs)
+        run = map
+        if jobs > 1 and len(spans) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(min(jobs, len(spans)))
+            run = executor.map
+        footnotes, found = MDSections.index(inpath, data, spans, converter.engine, run)
+        tasks = MDSections.tasks(inpath, spans, footnotes, found, converter.engine, converter.options,
+                                 profile if profile is None or executor is None else profile.memory,
+                                 converter.highlighter)
+        sections = MDSections()
+        try:
+            out = click.open_file(outpath, mode="wb")
+        except FileNotFoundError:
+            raise InputException("not_outpath", outpath)
+        with out:
+            out.write(converter.head.encode())
+            for (head, body, tail), length, section in run(MDSections.convert, tasks):
+                size += length
+                if section is not None and section is not profile:
+                    profile.merge(section)  # the profile of a worker process
+                out.write(images(sections.feed(head, body, tail)).encode())
+            out.write(images(sections.close()).encode())
+            out.write(converter.foot.encode())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if data:
+            data.close()
+    if profile is not None:
+        profile.document(inpath, time.perf_counter() - start, size)
+    return MDSections.diagnose(found)
+
+
+@click.command("serve")
+@click.option("-H", "--host", "host", default="127.0.0.1",
+              help="optional. the address to listen on. defaults to `127.0.0.1`.")
+@click.option("-p", "--port", "port", default=8000, type=int,
+              help="optional. the port to listen on. defaults to `8000`.")
+@click.option("-j", "--workers", "workers", default=0, type=int,
+              help="optional. the number of worker processes converting the documents. "
+                   + "0 uses one process per processor. defaults to 0.")
+@click.option("-q", "--queue-size", "queue_size", default=64, type=int,
+              help="optional. the maximum number of requests waiting for a worker. the next "
+                   + "requests are refused with a 503. defaults to 64.")
+@click.option("--timeout", "timeout", default=10.0, type=float,
+              help="optional. the maximum time to answer a request, in seconds. a slower request is "
+                   + "answered with a 504 and its worker is replaced. defaults to 10.")
+@click.option("--templates", "templates", default=None,
+              help="optional. a directory of TeX templates: a request can use the template `name.tex` "
+                   + "with `?template=name`. `?template=default` always uses `utils/template.tex`.")
+@click.option("--max-size", "max_size", default=16, type=int,
+              help="optional. the maximum size of a document, in MB. defaults to 16.")
+def serve(host="127.0.0.1", port=8000, workers=0, queue_size=64, timeout=10.0, templates=None, max_size=16):
+    """
+    run an http server converting Markdown to TeX, on a pool of worker processes.
+
+    \b
+    endpoints:
+    ----------
+    POST /convert   the body is the Markdown; the answer is the TeX. options in the query string:
+                    `french_quote`, `unnumbered`, `document_class`, `engine`, `template`
+                    (e.g. `/convert?unnumbered=1&document_class=book&template=default`)
+    GET /metrics    request counts, latency histogram and queue depth, in the prometheus format
+    """
+    from .server import ConversionServer, WorkerPool
+
+    if workers < 0:
+        click.echo(InputException("jobs", str(workers)), err=True)
+        sys.exit(1)
+    try:
+        templates = ConversionServer.templates_dir(templates)
+    except InputException as e:
+        click.echo(e, err=True)
+        sys.exit(1)
+    pool = WorkerPool(workers, queue_size, timeout)
+    server = ConversionServer((host, port), pool, templates, max_size * 2 ** 20)
+    click.echo(f"SERVING - http://{host}:{server.server_port} with {len(pool.workers)} workers. stop with Ctrl+C",
+               err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
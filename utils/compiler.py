@@ -0,0 +1,228 @@
+import subprocess
+import hashlib
+import shutil
+import json
+import os
+import re
+
+from .errors_warnings import InputException
+from .highlight import minted_re
+
+
+# ---------------------------------------------------------------
+# compilation of the converted documents to PDF with a TeX engine
+# installed on the machine (`xelatex`...). a compilation is only
+# started when the document changed: its fingerprint is a hash of
+# the TeX file, of the files it includes (the template is in the
+# TeX file, the chapters of a book, images...) and of the command,
+# and the fingerprint of the last successful compilation of each
+# document is kept in a state file next to the TeX files.
+#
+# the engine is run again only while the files it writes for the
+# next run (`.aux`, `.toc`...) change, instead of a fixed number
+# of times. the documents of a batch are compiled in parallel: the
+# compilations are separate processes, so they are only waited for
+# by threads.
+# ---------------------------------------------------------------
+
+
+state_name = ".md2tex-compile.json"  # the state file, in the directory of the TeX files
+reference_re = re.compile(r"\\(include|input|includegraphics|bibliography|addbibresource)\*?[ \t]*"
+                          r"(?:\[[^\]\n]*\])?\{([^{}\n]+)\}")
+extensions = {
+    "include": [".tex"],
+    "input": [".tex", ""],
+    "includegraphics": ["", ".pdf", ".png", ".jpg", ".jpeg", ".eps"],
+    "bibliography": [".bib"],
+    "addbibresource": [""]
+}  # the extensions tried by TeX after the name of an included file, in order
+auxiliary = [".aux", ".toc", ".lof", ".lot", ".out", ".idx", ".bbl"]  # the files a run writes for the next one
+max_runs = 5  # a document whose references never settle is compiled at most this many times
+
+
+class Compiler:
+    """
+    compile TeX documents to PDF, when they changed since their last compilation.
+
+    :param engine: the name or path of the TeX engine (`xelatex`, `lualatex`, `pdflatex`...)
+    :param runs: the maximum number of runs of the engine on a document
+    """
+    def __init__(self, engine="xelatex", runs=max_runs):
+        if shutil.which(engine) is None:
+            raise InputException("tex_engine", engine)
+        self.engine = engine
+        self.runs = runs
+        self.states = {}  # directory: the state of its TeX files, `{name of the TeX file: fingerprint}`
+
+    def command(self, tex: str):
+        """
+        :param tex: the TeX of a document
+        :return: the command compiling it, without the path to the TeX file.
+                 `minted` runs pygments, and needs `-shell-escape`
+        """
+        command = [self.engine, "-interaction=nonstopmode", "-synctex=1"]
+        return command + ["-shell-escape"] if minted_re.search(tex) else command
+
+    @staticmethod
+    def resolve(directory: str, kind: str, name: str):
+        """
+        :param directory: the directory the engine is run in
+        :param kind: the command including the file (`input`, `includegraphics`...)
+        :param name: the name of the file, as it is written in the TeX
+        :return: the path to the file, or None if none of the paths TeX would try exists
+        """
+        for ext in extensions[kind]:
+            path = os.path.join(directory, name + ext)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    @staticmethod
+    def dependencies(texpath: str):
+        """
+        find the files a TeX file depends on: the files it includes, and the files they include
+        :param texpath: the path to the TeX file
+        :return: a list of `(name, path or None if it doesn't exist yet)`, in the order they are found,
+                 and the paths to the files included with `\\include`, which have their own `.aux`
+        """
+        directory = os.path.dirname(os.path.abspath(texpath))
+        found, included, seen = [], [], set()
+        queue = [texpath]
+        while queue:
+            with open(queue.pop(0), mode="r", encoding="utf-8", errors="replace") as fh:
+                tex = fh.read()
+            for match in reference_re.finditer(tex):
+                kind = match[1]
+                for name in match[2].split(",") if kind == "bibliography" else [match[2]]:
+                    name = name.strip()
+                    if (kind, name) in seen:
+                        continue
+                    seen.add((kind, name))
+                    path = Compiler.resolve(directory, kind, name)
+                    found.append((name, path))
+                    if path is not None and kind in ("include", "input") and path.endswith(".tex"):
+                        queue.append(path)
+                        if kind == "include":
+                            included.append(path)
+        return found, included
+
+    def fingerprint(self, texpath: str):
+        """
+        :param texpath: the path to a TeX file
+        :return: its fingerprint, which changes with the TeX, the files it includes and the command
+        """
+        with open(texpath, mode="rb") as fh:
+            tex = fh.read()
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.command(tex.decode("utf-8", "replace"))).encode())
+        digest.update(hashlib.sha256(tex).digest())
+        for name, path in Compiler.dependencies(texpath)[0]:
+            digest.update(json.dumps(name).encode())
+            if path is None:
+                digest.update(b"missing")  # the fingerprint changes when the file is created
+                continue
+            with open(path, mode="rb") as fh:
+                digest.update(hashlib.sha256(fh.read()).digest())
+        return digest.hexdigest()
+
+    def state(self, directory: str):
+        """
+        :param directory: a directory of TeX files
+        :return: the state of its TeX files, read from its state file when it is first used
+        """
+        if directory not in self.states:
+            try:
+                with open(os.path.join(directory, state_name), mode="r", encoding="utf-8") as fh:
+                    self.states[directory] = json.load(fh)
+            except (OSError, ValueError):
+                self.states[directory] = {}  # first compilation, or a state file that can't be read
+        return self.states[directory]
+
+    def save(self, directory: str):
+        """
+        write the state file of a directory
+        :param directory: a directory of TeX files
+        """
+        path = os.path.join(directory, state_name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, mode="w", encoding="utf-8") as fh:
+            json.dump(self.state(directory), fh, indent=2)
+        os.replace(tmp, path)
+
+    def fresh(self, texpath: str, fingerprint: str):
+        """
+        :param texpath: the path to a TeX file
+        :param fingerprint: its fingerprint
+        :return: wether it was compiled with the same fingerprint, and its PDF still exists
+        """
+        directory, name = os.path.split(os.path.abspath(texpath))
+        return self.state(directory).get(name) == fingerprint \
+            and os.path.isfile(os.path.splitext(texpath)[0] + ".pdf")
+
+    @staticmethod
+    def snapshot(paths: list):
+        """
+        :param paths: the paths to the auxiliary files of a document
+        :return: the hash of each of them, or None if it doesn't exist
+        """
+        hashes = []
+        for path in paths:
+            try:
+                with open(path, mode="rb") as fh:
+                    hashes.append(hashlib.sha256(fh.read()).digest())
+            except OSError:
+                hashes.append(None)
+        return hashes
+
+    def run(self, texpath: str):
+        """
+        run the engine on a TeX file until its auxiliary files stop changing
+        :param texpath: the path to the TeX file
+        :return: the number of runs, and the exit code of the engine (0 if the compilation succeeded)
+        """
+        directory, name = os.path.split(os.path.abspath(texpath))
+        with open(texpath, mode="r", encoding="utf-8", errors="replace") as fh:
+            command = self.command(fh.read()) + [name]
+        stems = [os.path.splitext(texpath)[0]] + [os.path.splitext(p)[0] for p in Compiler.dependencies(texpath)[1]]
+        paths = [stem + ext for stem in stems for ext in auxiliary]
+        before = Compiler.snapshot(paths)
+        for runs in range(1, self.runs + 1):
+            process = subprocess.run(command, cwd=directory, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+            if process.returncode != 0:
+                return runs, process.returncode
+            after = Compiler.snapshot(paths)
+            if after == before:
+                break
+            before = after
+        return runs, 0
+
+    def compile(self, texpaths: list, jobs=1):
+        """
+        compile the TeX files that changed since their last compilation, possibly in parallel
+        :param texpaths: the paths to the TeX files
+        :param jobs: the number of compilations to run at once. 0 uses all processors
+        :return: a list of `(texpath, number of runs, exit code)`, in the order of the files.
+                 a file that didn't change isn't compiled: it is returned with 0 runs
+        """
+        fingerprints = [self.fingerprint(p) for p in texpaths]
+        stale = [p for p, f in zip(texpaths, fingerprints) if not self.fresh(p, f)]
+        jobs = jobs or os.cpu_count()
+        if jobs == 1 or len(stale) < 2:
+            results = dict(zip(stale, map(self.run, stale)))
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(jobs, len(stale))) as executor:  # the engines are processes: threads wait
+                results = dict(zip(stale, executor.map(self.run, stale)))
+        compiled = []
+        directories = set()
+        for texpath, fingerprint in zip(texpaths, fingerprints):
+            runs, code = results.get(texpath, (0, 0))
+            if runs > 0 and code == 0:  # a failed compilation is started again by the next build
+                directory, name = os.path.split(os.path.abspath(texpath))
+                self.state(directory)[name] = fingerprint
+                directories.add(directory)
+            compiled.append((texpath, runs, code))
+        for directory in directories:
+            self.save(directory)
+        return compiled
@@ -1,7 +1,11 @@
 import re
+from functools import lru_cache
 
+from .plan import SubstitutionPlan, HeaderPlan
+from .buffer import SpanBuffer
 from .minted import languages
-from .helpers import process_list_indentation
+from .helpers import process_list_indentation, ulist_marker_re, olist_marker_re
+from .scanners import LineScanner, ulist_re, olist_re, listing_open_re, listing_close_re
 
 
 # ---------------------------------------------------------------
@@ -17,15 +21,17 @@ class MDSimple:
     simple_sub: a dict mapping to a regular expression its replacement,
                 to use with re.sub. only for simple elements of the markdown
                 syntax, like "*", "`"...
+                all regexes begin with a literal (the lookbehinds come after it),
+                which allows `re` to search for that literal directly.
     """
     simple_sub = {
         # code, bold, italics
-        r"(?<!\*)\*{2}(?!\*)(.+?)(?<!\*)\*{2}(?!\*)": r"\\textbf{\1}",  # bold
-        r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)": r"\\textit{\1}",  # italics
-        r"(?<!`)`(?!`)(.+?)(?<!`)`(?!`)": r"\\texttt{\1}",  # inline code
+        r"\*\*(?<!\*\*\*)(?!\*)(.+?)(?<!\*)\*{2}(?!\*)": r"\\textbf{\1}",  # bold
+        r"\*(?<!\*\*)(?!\*)(.+?)(?<!\*)\*(?!\*)": r"\\textit{\1}",  # italics
+        r"`(?<!``)(?!`)(.+?)(?<!`)`(?!`)": r"\\texttt{\1}",  # inline code
 
         # images and hyperlink
-        r"(?<!!)\[(.*?)\]\((.*?)\)": r"\\href{\2}{\1}",  # hyperlink
+        r"\[(?<!!\[)(.*?)\]\((.*?)\)": r"\\href{\2}{\1}",  # hyperlink
         r"!\[(.*?)\]\((.*?)\)": r"""
 \\begin{figure}[h!]
     \\centering
@@ -34,7 +40,7 @@ class MDSimple:
 \\end{figure}""",  # images
 
         # separators
-        r"-{3,}": r"\\par\\noindent\\rule{\\linewidth}{0.4pt}",  # horizontal line
+        r"---+": r"\\par\\noindent\\rule{\\linewidth}{0.4pt}",  # horizontal line
         r"<br/?>": "\n\n",  # line breaks
     }
 
@@ -45,9 +51,22 @@ class MDSimple:
         :param string: the string rpr of the markdown file to convert
         :return: string with the conversion performed
         """
-        for k, v in MDSimple.simple_sub.items():
-            string = re.sub(k, v, string, flags=re.M)
-        return string
+        return MDSimple.plan().apply(string)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def plan():
+        """
+        compile `simple_sub` once. the rules are run in the same order as
+        in the dict, in separate passes: they can be nested in one another,
+        and an alternation of several regexes can't be searched as quickly
+        as a literal. a pass is skipped if the document doesn't contain the
+        characters it needs.
+        :return: the SubstitutionPlan
+        """
+        triggers = ["**", "*", "`", "](", "![", "---", "<br"]
+        passes = [SubstitutionPlan.rule(k, v, (t,)) for (k, v), t in zip(MDSimple.simple_sub.items(), triggers)]
+        return SubstitutionPlan(passes)
 
 
 class MDHeader:
@@ -97,6 +116,18 @@ class MDHeader:
         :param document_class: the class to convert the document to
         :return: processed string
         """
+        return MDHeader.plan(unnumbered, document_class).apply(string)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def plan(unnumbered: bool, document_class: str):
+        """
+        build the HeaderPlan translating all header levels in a single pass;
+        it is built once per combination of options.
+        :param unnumbered: flag argument indicating that the LaTeX headers should be unnumbered
+        :param document_class: the class to convert the document to
+        :return: the HeaderPlan
+        """
         if unnumbered is True:
             if document_class == "article":
                 substitute = MDHeader.article_unnumbered
@@ -107,9 +138,7 @@ class MDHeader:
                 substitute = MDHeader.article_numbered
             else:
                 substitute = MDHeader.book_numbered
-        for k, v in substitute.items():
-            string = re.sub(k, v, string, flags=re.M)
-        return string
+        return HeaderPlan(substitute)
 
 
 class MDQuote:
@@ -163,6 +192,7 @@ class MDList:
     --------
     unoredered_l(): create latex `itemize` envs from md unnumbered lists
     ordered_l(): create latex `enumerate` envs from md numbered lists
+    environment(): build the `itemize` or `enumerate` env of a single list, for both engines
     """
     @staticmethod
     def unordered_l(string: str):
@@ -171,41 +201,7 @@ class MDList:
         :param string:  the string representation of the markdown file
         :return: the updated string representation of a markdown file
         """
-        lists = re.finditer(r"((^[ \t]*?-(?!-{2,}).*?\n)+(.+\n)*)+", string, flags=re.MULTILINE)
-        for ls in lists:
-            # prepare list building
-            lstext = ls[0]  # extract list text
-            string = string.replace(lstext, "@@LISTTOKEN@@")  # add token to source
-            lstext = re.sub(r"\n(?!\s*-)", " ", lstext, flags=re.M)  # group list item into one line
-
-            lsitems = process_list_indentation(lstext)  # process the visual indentation
-
-            # build the `\itemize{}`
-            items = ""
-            prev = 0  # previous indentation level
-            for li in lsitems:
-                # open/close the good number of envs
-                if li[1] - prev > 0:  # if there are envs to open; shouldn't be > 1 env to open, but just in case
-                    items += "\\begin{itemize} \n \\item " * (li[1] - prev)
-                    items += li[0] + "\n"
-                elif li[1] - prev < 0:  # if there are envs to close
-                    items += "\\end{itemize}\n" * (prev - li[1])
-                    items += "\\item " + li[0] + "\n"
-                else:  # no envs to open/close
-                    items += "\\item " + li[0] + "\n"
-                prev = li[1]
-
-            items += "\\end{itemize}\n" * prev  # close the remaining nested envs
-
-            # once the list of \item and possibly nested `itemize` is built,
-            # build the final itemize, add it to the markdown string and that's it !
-            itemize = r"""
-\begin{itemize}
-@@ITEMTOKEN@@
-\end{itemize}""".replace("@@ITEMTOKEN@@", items)
-            string = string.replace("@@LISTTOKEN@@", itemize)
-
-        return string
+        return MDList.convert(string, ordered=False)
 
     @staticmethod
     def ordered_l(string: str):
@@ -215,41 +211,53 @@ class MDList:
         :param string: the string representation of the markdown file
         :return: the updated string representation of a markdown file
         """
-        lists = re.finditer(r"((^[ \t]*?\d+\..*?\n?)+(.+\n?)*)+", string, flags=re.MULTILINE)
-        for ls in lists:
-            # prepare list building
-            lstext = ls[0]  # extract list text
-            string = string.replace(lstext, "@@LISTTOKEN@@")  # replace source list by token
-            lstext = re.sub(r"\n(?!\s*\d+\.)", " ", lstext, flags=re.M)  # group list items into single line
+        return MDList.convert(string, ordered=True)
 
-            lsitems = process_list_indentation(lstext)  # process the visual indentation
+    @staticmethod
+    def convert(string: str, ordered: bool):
+        """
+        replace the lists of a kind by latex environments
+        :param string: the string representation of the markdown file
+        :param ordered: wether to translate the ordered lists or the unordered ones
+        :return: the updated string representation of a markdown file
+        """
+        buffer = SpanBuffer(string)
+        for start, end in LineScanner.lists(string, olist_re if ordered else ulist_re, ordered):
+            buffer.splice(start, end, MDList.environment(string[start:end], ordered))  # replace the source list
+        return buffer.join()
 
-            # build the `\enumerate{}`
-            items = ""
+    @staticmethod
+    def environment(lstext: str, ordered=False):
+        """
+        build the latex environment of a markdown list: its items and the nested
+        environments opened and closed between them are joined at once
+        :param lstext: the markdown list
+        :param ordered: if True, build an `enumerate`, else an `itemize`
+        :return: the latex environment
+        """
+        env = "enumerate" if ordered else "itemize"
+        lstext = LineScanner.join_items(lstext, ordered)  # group list items into single lines
+        texts, levels = process_list_indentation(lstext, olist_marker_re if ordered else ulist_marker_re)
+
+        out = ["\n\\begin{%s}\n" % env]
+        if not any(levels):  # no nested envs to open/close
+            out.append("\\item ")
+            out.append("\n\\item ".join(texts))
+            out.append("\n")
+        else:
+            opening = "\\begin{%s} \n \\item " % env
+            closing = "\\end{%s}\n" % env
             prev = 0  # previous indentation level
-            for li in lsitems:
-                # open/close the good number of envs
-                if li[1] - prev > 0:  # if there are envs to open; shouldn't be > 1 env to open, but just in case
-                    items += "\\begin{enumerate} \n \\item " * (li[1] - prev)
-                    items += li[0] + "\n"
-                elif li[1] - prev < 0:  # if there are envs to close
-                    items += "\\end{enumerate}\n" * (prev - li[1])
-                    items += "\\item " + li[0] + "\n"
-                else:  # no envs to open/close
-                    items += "\\item " + li[0] + "\n"
-                prev = li[1]
-
-            items += "\\end{itemize}\n" * prev  # close the remaining nested envs
-
-            # once the list of \item and possibly nested `enumerate` is built,
-            # build the final enumerate, add it to the markdown string and that's it !
-            enumerate = r"""
-            \begin{enumerate}
-            @@ITEMTOKEN@@
-            \end{enumerate}""".replace("@@ITEMTOKEN@@", items)
-            string = string.replace("@@LISTTOKEN@@", enumerate)
+            for text, level in zip(texts, levels):
+                # open/close the good number of envs; there shouldn't be > 1 env to open, but just in case
+                out.append(opening * (level - prev) if level > prev else closing * (prev - level) + "\\item ")
+                out.append(text)
+                out.append("\n")
+                prev = level
+            out.append(closing * prev)  # close the remaining nested envs
+        out.append("\n\\end{%s}" % env)
+        return "".join(out)
 
-        return string
 
 class MDCode:
     """
@@ -260,7 +268,7 @@ class MDCode:
     block_code(): create a latex minted or lstlisting env from a md block of code
     """
     @staticmethod
-    def block_code(string: str):
+    def block_code(string: str, highlighter=None):
         """
         translate a markdown block of code into a minted or listing block.
         
@@ -268,16 +276,17 @@ class MDCode:
         block of code is matched, it extracts a code language and checks
         if it is supported by minted/pygments.
         - if it is supported, a `minted` env is created inside a `listing` 
-          env; the code is included in this env and will be coloured in latex
+          env; the code is included in this env and will be coloured in latex.
+          with a `highlighter`, the code is coloured now, in a `Verbatim` env
         - if no language is supplied in the markdown file, then the whole block
           is included as is in a `lstlisting` env.
         :param string: the string representation of the markdown file
+        :param highlighter: a `Highlighter` to colour the code with, or None to use `minted`
         :return: the updated string representation of a markdown file
         """
-        matches = re.finditer(r"```((.|\n)*?)```", string, flags=re.M)
-        for m in matches:
-            code = m[0]  # isolate the block of code
-            string = string.replace(code, "@@MINTEDTOKEN@@")  # to reinject code to string later
+        buffer = SpanBuffer(string)
+        for start, end in LineScanner.delimited(string):
+            code = string[start:end]  # isolate the block of code
 
             # extract the code language; try...except to avoid errors if no language is matched
             try:
@@ -287,6 +296,7 @@ class MDCode:
 
             # if the used language is supported by minted, create a minted inside
             # a listing environment to hold the code
+            highlighted = None
             if lang in languages:
                 env = r"""
 \begin{listing}[h!]
@@ -294,13 +304,19 @@ class MDCode:
 @@CODETOKEN@@
     \end{minted}
 \end{listing}"""  # env to add the code to; ugly indentation to avoid messing up the .tex file
-                code = re.sub(r"```.*?\n((.|\n)+?)```", r"\1", code, flags=re.M)  # extract code body
-                code = env.replace("@@LANGTOKEN@@", lang).replace("@@CODETOKEN@@", code)  # add code to the latex env
+                head = code.find("\n")  # extract code body: the lines after the opening "```"
+                body = code[head + 1:-3] if 0 <= head < len(code) - 4 else code  # a code block without body
+                #                                                                   is kept as is
+                if highlighter is not None:
+                    highlighted = highlighter.highlight(body, lang)  # None if pygments doesn't know the language
+                    env = "\n\\begin{listing}[h!]\n@@CODETOKEN@@\n\\end{listing}"
+                if highlighter is None or highlighted is not None:
+                    code = env.replace("@@LANGTOKEN@@", lang).replace("@@CODETOKEN@@", highlighted or body)
 
             # if the langage is not supported (or if the characters after the opening ```
             # aren't a language), only create a lstlisting environment and reinject the code
             # in it
-            else:
+            if lang not in languages or highlighter is not None and highlighted is None:
                 env = r"""
 \begin{lstlisting}
 @@CODETOKEN@@
@@ -308,9 +324,9 @@ class MDCode:
                 """  # env to add the code to
                 code = env.replace("@@CODETOKEN@@", re.sub(r"```", "", code, flags=re.M))  # reinject code block to env
 
-            string = string.replace("@@MINTEDTOKEN@@", code)  # reinject latex code to string
+            buffer.splice(start, end, code)  # reinject latex code to string
 
-        return string
+        return buffer.join()
 
 
 class MDReference:
@@ -321,9 +337,10 @@ class MDReference:
     contains
     --------
     footnote(): replace markdown footnotes (`[\^\d+]`) into latex `\footnote{}`
+    diagnose(): list the loose and duplicate footnotes of a document
     """
     @staticmethod
-    def footnote(string: str):
+    def footnote(string: str, diagnostics: list = None):
         r"""
         translate a markdown footnode `[^\d+]` to a latex footnote (`\footnote{}`)
 
@@ -335,38 +352,98 @@ class MDReference:
         in turn, what we need to do is remove the pointers, match the body of the
         footnote and add it to a `\footnote{}`
 
+        this is done in two passes: the first one indexes the footnotes (only
+        the first footnote with a given key is used) and the second one replaces
+        the pointers. loose footnote parts are deleted.
+
         :param string: the string representation of a markdown file
+        :param diagnostics: if a list is provided, the loose or duplicate footnotes are
+                            appended to it as `(warning key, footnote key)` tuples (see `Warnings`)
+        :return: the updated string representation of a markdown file
         """
-        footnotes = re.finditer(r"\[\\\^\d+\](?![ \t]*:)", string, flags=re.M)
-        for match in footnotes:
-            try:
-                pointer = match[0]  # extract the footnote pointer (the pointer to the actual footnote)
-                key = re.search(r"\d+", pointer)[0]  # extract the footnote n°
-                fnote = re.search(
-                    fr"(\[\\\^%s\]:)(.+\n?)*" % key,
-                    string, flags=re.M
-                )  # match the proper footnote (with the good key)
-                texnote = re.sub(r"\s+", " ", fnote[0].replace(fnote[1], ""))  # remove the pointer + normalize space
-
-                if not re.search("^\s*$", texnote):  # if the note isn't empty; else, delete it
-                    texnote = r"\footnote{" + texnote + "}"
-                    string = string.replace(fnote[0], "")  # delete the markdown footnote
-                    string = string.replace(pointer, texnote)  # add the \footnote to string
-                else:
-                    # delete the footnote body and pointers
-                    string = string.replace(pointer, "")
-                    string = string.replace(fnote[0], "")
-
-            except TypeError:
-                # a footnote pointer may point to nothing; conversely, a footnote
-                # may to have a ref in the body. in that case, pass now and delete every loose
-                # footnote part right after
-                pass
-        # delete all loose footnote strings
-        string = re.sub(r"\[\\\^\d+\](?![ \t]*:)", "", string, flags=re.M)
-        string = re.sub(r"(\[\\\^\d+\]:)(.+\n?)*", "", string, flags=re.M)
+        buffer = SpanBuffer(string)
+
+        # index and delete the footnotes. a footnote ends at the next footnote
+        notes = {}
+        spans = []  # (start, end) of all footnotes
+        definitions = []  # the keys of all footnotes
+        for fnote, end in LineScanner.footnotes(string):
+            key = fnote[1]
+            definitions.append(key)
+            spans.append((fnote.start(), end))
+            buffer.splice(fnote.start(), end, "")
+            if key not in notes:
+                texnote = string[fnote.start():end].replace(fnote[0], "")  # remove the pointer
+                texnote = re.sub(r"\s+", " ", texnote)  # normalize space
+                texnote = re.sub(r"\[\\\^\d+\](?![ \t]*:)", "", texnote)  # no nested footnotes
+                notes[key] = r"\footnote{" + texnote + "}" if texnote.strip() else ""  # empty notes are deleted
+
+        # replace the pointers that aren't inside a footnote
+        pointers = []  # the keys of all pointers
+        n = 0  # index of the first footnote that doesn't end before the current pointer
+        for match in re.finditer(r"\[\\\^(\d+)\](?![ \t]*:)", string, flags=re.M):
+            while n < len(spans) and spans[n][1] <= match.start():
+                n += 1
+            if n < len(spans) and spans[n][0] <= match.start():
+                continue
+            pointers.append(match[1])
+            buffer.splice(match.start(), match.end(), notes.get(match[1], ""))
+
+        if diagnostics is not None:
+            diagnostics.extend(MDReference.diagnose(pointers, definitions))
+        return buffer.join()
 
-        return string
+    @staticmethod
+    def diagnose(pointers: list, definitions: list):
+        """
+        find the loose and duplicate footnotes of a document
+        :param pointers: the keys of the footnote pointers, in the order of the document
+        :param definitions: the keys of the footnotes, in the order of the document
+        :return: a list of `(warning key, footnote key)` tuples (see `Warnings`)
+        """
+        diagnostics = []
+        seen = set()
+        referenced = set(pointers)
+        for key in definitions:
+            if key in seen:
+                diagnostics.append(("footnote_duplicate", key))
+            elif key not in referenced:
+                diagnostics.append(("footnote_orphan", key))
+            seen.add(key)
+        for key in dict.fromkeys(pointers):  # unique keys, in order
+            if key not in seen:
+                diagnostics.append(("footnote_unresolved", key))
+        return diagnostics
+
+
+# the escaping of latex special characters, in a single pass (see `MDCleaner.escape()`).
+# the table is equivalent to the sequence of replacements that `prepare_markdown()`
+# used to run; that sequence replaced `$` twice, and its output is kept.
+escapes = {
+    "{": r"\{",
+    "}": r"\}",
+    "\\": r"\textbackslash{}",
+    ">": r"\textgreater{}",
+    "#": r"\#",
+    "$": r"\\&",
+    "%": r"\%",
+    "~": r"\~",
+    "_": r"\_",
+    "^": r"\^",
+}
+escape_re = re.compile(r"[{}\\>#$%~_^]")
+
+# the spaces cleaned by `clean_spaces()`, in two passes:
+# - `spaces_re`: the spaces after a `{` and before a `}`, and runs of spaces (a run
+#   only matches if it has 2 spaces or more, since a single space is kept as is).
+#   the code blocks set aside by `prepare_markdown()` are put back in the same pass.
+#   `\s+}` only matches from the first character of a run of whitespace, as in the
+#   original passes: otherwise, it is tried again from every character of a run that
+#   isn't followed by a `}`, which takes a quadratic time.
+# - `newlines_re`: runs of empty lines, which are kept as one empty line, or
+#   removed after a line opening a latex environment and before an `\end{`.
+spaces_re = re.compile(r"@@CODETOKEN\d+@@|\{\s+|(?<!\s)\s+}|  +")
+newlines_re = re.compile(r"(\\begin\{[^\n]*)\n{2,}|\n{2,}(\\end\{)|\n{3,}")
 
 
 class MDCleaner:
@@ -378,6 +455,7 @@ class MDCleaner:
     prepare_markdown(): replace markdown document by escaping special tex characters and
                         removing code blocks from the rest of the pipeline
     clean_tex(): clean the tex created and reinsert blocks of code at the end of the pipeline
+    clean_spaces(): clean the spaces of the tex created; used by `clean_tex()`
     """
     @staticmethod
     def prepare_markdown(string: str):
@@ -404,52 +482,93 @@ class MDCleaner:
         # for that, store all code blocks in a dict, replace them in `string`
         # with a special token. this token uses `+` because they aren't LaTeX
         # special characters
-        codematch = re.finditer(r"\\begin\{(listing|lstlisting)}(.|\n)*?\\end\{(listing|lstlisting)}", string, flags=re.M)
+        buffer = SpanBuffer(string)
         n = 0
         codedict = {}
-        for match in codematch:
-            block = match[0]  # extract text
-            string = string.replace(block, f"@@CODETOKEN{n}@@")
+        for start, end in LineScanner.delimited(string, listing_open_re, listing_close_re):
+            block = string[start:end]  # extract text
+            buffer.splice(start, end, f"@@CODETOKEN{n}@@")
             codedict[f"@@CODETOKEN{n}@@"] = block
             n += 1
+        string = buffer.join()
 
-        string = string.replace(r"{", r"\{")
-        string = string.replace(r"}", r"\}")
-        # string = re.sub("(?<![^\]]\[)\^", r"\^", string, flags=re.M)
-        string = re.sub(r"\\(?![\{\}])", r"\\textbackslash{}", string, flags=re.M)
-        string = string.replace(r">", r"\textgreater{}")
-        string = string.replace(r"#", r"\#")
-        string = string.replace("$", r"\$")
-        string = string.replace("%", r"\%")
-        string = string.replace(r"$", r"\&")
-        string = string.replace(r"~", r"\~")
-        string = string.replace("_", r"\_")
-        string = re.sub("\^", r"\\^", string, flags=re.M)
-        # print(string)
-
-        return string, codedict
+        return MDCleaner.escape(string), codedict
 
     @staticmethod
-    def clean_tex(string: str, codedict: dict):
+    def escape(string: str):
+        """
+        escape the latex special characters of a string, in one pass: the text between two
+        special characters is copied as is, which is faster than one pass per character
+        (and than `str.translate()`, which is slow when the string isn't ascii)
+        :param string: the string to escape
+        :return: the escaped string
+        """
+        return escape_re.sub(lambda m: escapes[m[0]], string)
+
+    @staticmethod
+    def clean_tex(string: str, codedict: dict, spaces=True):
         """
         clean spaces around latex commands + uneccessary spaces created during
         transformation
         :param string: the string representation of the markdown file
         :param codedict: the dictionnary containing escaped code blocks
+        :param spaces: wether to clean the spaces. if False, only the code blocks
+                       and the `@@` are reinjected
         :return: the updated string representation of a markdown file
         """
         # rebuild the string by reinjecting the code blocks
-        for k, v in codedict.items():
-            string = string.replace(k, v)
-
-        # clean spaces
-        string = re.sub(r"((?<!^ ) )+", " ", string, flags=re.M)
-        string = re.sub(r"{\s+", r"{", string, flags=re.M)
-        string = re.sub(r"\s+}", r"}", string, flags=re.M)
-        string = re.sub(r"\n{2,}", r"\n\n", string, flags=re.M)
-        string = re.sub(r"(\\begin\{.*?)\n{2,}", r"\1\n", string, flags=re.M)
-        string = re.sub(r"\n{2,}(\\end\{)", r"\n\1", string, flags=re.M)
+        if spaces:
+            string = MDCleaner.clean_spaces(string, codedict)
+        elif codedict:
+            string = re.sub(r"@@CODETOKEN\d+@@", lambda m: codedict.get(m[0], m[0]), string)
 
         string = string.replace("USERRESERVEDTOKEN", "@@")
 
         return string
+
+    @staticmethod
+    def clean_spaces(string: str, codedict=None):
+        """
+        clean spaces around latex commands + uneccessary spaces created during
+        transformation
+        :param string: the string representation of the tex file
+        :param codedict: the dictionnary containing escaped code blocks, to reinject
+        :return: the cleaned string
+        """
+        string = spaces_re.sub(lambda m: MDCleaner.space(m, codedict), string)
+        # the code blocks are cleaned on their own: they begin with `\begin{` and end with
+        # a `}`, so no match of `spaces_re` can overlap their beginning or their end
+        return newlines_re.sub(MDCleaner.newline, string)
+
+    @staticmethod
+    def space(match: re.Match, codedict=None):
+        """
+        :param match: a match of `spaces_re`
+        :param codedict: the dictionnary containing escaped code blocks
+        :return: the cleaned text
+        """
+        text = match[0]
+        if text[0] == "@":
+            if not codedict or text not in codedict:
+                return text
+            return spaces_re.sub(MDCleaner.space, codedict[text])
+        elif text[0] == "{":
+            return "{"
+        elif text[-1] == "}":
+            return "}"
+        start = match.start()
+        if start == 0 or match.string[start - 1] == "\n":
+            return text[:3]  # the original passes kept up to 3 spaces at the beginning of a line
+        return " "
+
+    @staticmethod
+    def newline(match: re.Match):
+        """
+        :param match: a match of `newlines_re`
+        :return: the cleaned text
+        """
+        if match[1] is not None:
+            return match[1] + "\n"
+        elif match[2] is not None:
+            return "\n" + match[2]
+        return "\n\n"
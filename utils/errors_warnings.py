@@ -1,10 +1,11 @@
 import click
-import sys
 
 
 # -------------------------------------------------------
 # custom error and warnings classes to display custom
-# messages
+# messages. errors are not printed when they are raised:
+# the CLI prints them, and exits or goes on with the next
+# file.
 # ------------------------------------------------------
 
 
@@ -30,11 +31,16 @@ class IndentationException(ParsingException):
 
     def __init__(self, key, lstext):
         """
-        launch an IndentationException: return an error log and exit
+        build an IndentationException from its error log
         :param msg: the error key to print the proper log
         :param lstext: the text representation of the markdown list on which this error happened
         """
-        click.echo(IndentationException.logs[key].replace("@@TOKEN@@", lstext))
+        super().__init__(IndentationException.logs[key].replace("@@TOKEN@@", lstext))
+        self.key, self.lstext = key, lstext
+
+    def __reduce__(self):
+        # rebuilt from its key when sent back by a worker process
+        return IndentationException, (self.key, self.lstext)
 
 
 class InputException(Exception):
@@ -54,17 +60,47 @@ class InputException(Exception):
                            + "please remove slashes or backslashes to continue."
                            + "exiting...",
         "document_class": "ERROR - invalid value provided for argument `--document-class`: `@@TOKEN@@`. "
-                          + "allowed values are `article` or `book`. exiting..."
+                          + "allowed values are `article` or `book`. exiting...",
+        "engine": "ERROR - invalid value provided for argument `--engine`: `@@TOKEN@@`. "
+                  + "allowed values are `regex` or `tree`. exiting...",
+        "jobs": "ERROR - invalid value provided for argument `--jobs`: `@@TOKEN@@`. "
+                + "it must be a positive number, or 0 to use all processors. exiting...",
+        "stdin_batch": "ERROR - `@@TOKEN@@` (stdin) can only be converted on its own, "
+                       + "not with other input paths. exiting...",
+        "no_match": "ERROR - input path `@@TOKEN@@` doesn't match any markdown file.",
+        "outpath_duplicate": "ERROR - output file `@@TOKEN@@` is also the output of another input file.",
+        "watch": "ERROR - `--watch` needs a single markdown file as input, not `@@TOKEN@@`. exiting...",
+        "max_memory": "ERROR - invalid value provided for argument `--max-memory`: `@@TOKEN@@`. "
+                      + "it must be a positive number of MB. exiting...",
+        "pygments": "ERROR - highlighting the code with the style `@@TOKEN@@` needs pygments: "
+                    + "install it with `pip install pygments`. exiting...",
+        "highlight_style": "ERROR - invalid value provided for argument `--highlight-style`: `@@TOKEN@@`. "
+                           + "it must be the name of a pygments style (`emacs`, `friendly`...). exiting...",
+        "pillow": "ERROR - processing the images in `@@TOKEN@@` needs Pillow: "
+                  + "install it with `pip install pillow`. exiting...",
+        "image_dpi": "ERROR - invalid value provided for argument `--image-dpi`: `@@TOKEN@@`. "
+                     + "it must be a positive number. exiting...",
+        "tex_engine": "ERROR - the TeX engine `@@TOKEN@@` of `--compile` was not found: install it, "
+                      + "or give the name or path of another engine with `--tex-engine`. exiting...",
+        "compile_partial": "ERROR - `--compile` needs complete TeX files (`-c` or `-b`), not the bodies "
+                           + "converted from `@@TOKEN@@`. exiting...",
+        "compile_stdout": "ERROR - `--compile` can't compile a TeX file written to `@@TOKEN@@` (stdout). exiting...",
+        "compile_failed": "ERROR - the TeX engine failed to compile `@@TOKEN@@`: see its `.log` file.",
+        "book_option": "ERROR - `@@TOKEN@@` can't be used to build a book (`-b`). exiting..."
     }  # all possible error logs
 
     def __init__(self, key, val=None):
         """
-        launch an OSInpytException: return an error log and exit
+        build an InputException from its error log
         :param key: the error key to print the proper log
         :param val: the user inputted value which caused the error
         """
-        click.echo(InputException.logs[key].replace("@@TOKEN@@", val))
-        sys.exit(1)
+        super().__init__(InputException.logs[key].replace("@@TOKEN@@", val))
+        self.key, self.val = key, val
+
+    def __reduce__(self):
+        # rebuilt from its key when sent back by a worker process
+        return InputException, (self.key, self.val)
 
 
 class Warnings:
@@ -73,7 +109,16 @@ class Warnings:
     """
     logs = {
         "outpath_extension": "WARNING - file extension of output file `@@TOKEN@@` changed to `.tex`",
-        "list_deep_nesting": "WARNING - deep list nesting. you may need to change base tex options in the header."
+        "list_deep_nesting": "WARNING - deep list nesting. you may need to change base tex options in the header.",
+        "footnote_unresolved": "WARNING - footnote pointer `[^@@TOKEN@@]` points to no footnote. it has been deleted.",
+        "footnote_orphan": "WARNING - footnote `[^@@TOKEN@@]` has no pointer in the text. it has been deleted.",
+        "footnote_duplicate": "WARNING - footnote `[^@@TOKEN@@]` is defined several times. "
+                              + "only the first definition is used.",
+        "memory_budget": "WARNING - converting `@@TOKEN@@` at once would need more memory than the budget "
+                         + "of `--max-memory`: it has been converted in chunks.",
+        "memory_budget_chunk": "WARNING - `@@TOKEN@@` has a part that can't be split in smaller chunks (a long "
+                               + "code block, list or run of headers) and may still need more memory than the "
+                               + "budget of `--max-memory`."
     }
 
     def __init__(self, key, val=None):
@@ -82,4 +127,4 @@ class Warnings:
         :param key: the key pointing to the message from Warnings.log to print
         :param val: a possible value for a custom warning message.
         """
-        click.echo(Warnings.logs[key].replace("@@TOKEN@@", val))
+        click.echo(Warnings.logs[key].replace("@@TOKEN@@", val), err=True)
@@ -7,7 +7,11 @@ from .errors_warnings import IndentationException
 # -----------------------------------------------
 
 
-def process_list_indentation(lstext):
+ulist_marker_re = re.compile(r"\s*-\s*")  # the token of an unordered list item
+olist_marker_re = re.compile(r"\s*\d+\.\s*")  # the token of an ordered list item
+
+
+def process_list_indentation(lstext, marker=ulist_marker_re):
     """
     process the indentation levels to build nested LaTeX `itemize` or `enumerate` environments:
     check that the indentation is valid and replace absolute number of spaces by integers representing
@@ -15,7 +19,8 @@ def process_list_indentation(lstext):
 
     process
     -------
-    - represent the markdown list as a list of lists: `[markdown list item, its indentation level]`
+    - represent the markdown list as two parallel lists: the text of the items (without
+      their list token) and their indentation levels, computed in a single pass on the items
     - check that the indentation is valid:
       - if all items are indented (no `^-`), then the shared leading spaces are removed
       - if the list items have different indentation levels, all indentation
@@ -33,45 +38,32 @@ def process_list_indentation(lstext):
       - in short: if n[current] - n[prev] > 1, then n[current] is redifined as n[prev] += 1
         (with n[current] the current indentation level and n[prev] the previous one
 
-    :param lstext: the string representation of a markdown list (ordered or not), to process it
-    :return: lsitems, a list with this structure:
-             [
-                ["markdown list item 1", indentation_level_1],
-                ["markdown list item 2", indentation_level_2],
-                ...
-            ]
+    :param lstext: the string representation of a markdown list (ordered or not), with one item per line
+    :param marker: a regex matching the list token of an item and the spaces around it
+                   (`ulist_marker_re`, `olist_marker_re`)
+    :return: texts, levels: the markdown list items and their indentation levels
     """
-    lsitems = []  # list of lists : [item content, indentation level]
-    firstindent = len(re.search(r"^\s*", lstext)[0])  # base indentation level
-    for item in re.split(r"\n", lstext):
-        indent = len(re.search(r"^\s*", item)[0]) - firstindent
+    texts = []
+    levels = []
+    mult = 0  # the indentation of the first indented item
+    invalid = False  # an item isn't indented by a multiple of `mult`
+    prev = 0  # previous indentation level
+    lines = lstext.split("\n")
+    firstindent = len(lines[0]) - len(lines[0].lstrip())  # base indentation level
+    for item in lines:
+        indent = len(item) - len(item.lstrip()) - firstindent
         if indent < 0:
             raise IndentationException(key="firstindent", lstext=lstext)  # raise an error, print error msg, exit
+        match = marker.match(item)
+        texts.append(item if match is None else item[match.end():])  # item content
+        if indent:
+            mult = mult or indent
+            invalid = invalid or indent % mult != 0
+            prev = min(indent // mult, prev + 1)  # if one or several indent levels are skipped, reset them
         else:
-            lsitems.append([
-                re.sub(r"^\s*-\s*", "", item),  # item content
-                indent  # indentation (n° of spaces)
-            ])
-
-    # if there are different indentation levels,
-    # - check that all levels have a common multiplier
-    # - replace absolute number of spaces (li[1]) by indentation level (li[1] / mult)
-    # - if an item jumps indentation level (e.g., goes from level 1 to level3), correct it
-    if len(set([li[1] for li in lsitems])) > 1:  # if there are different indentation levels
-        mult = next((li[1] for li in lsitems if li[1] != 0), 0)  # the first indented item is the multiplier
-
-        for li in lsitems:
-            # check that all list items have same multiplier;
-            # `int(li[1] / mult) == li[1]` / mult checks that the division returns a round number
-            if int(li[1] / mult) == li[1] / mult:
-                li[1] = int(li[1] / mult)  # replace number of spaces by indentation level;
-            else:
-                raise IndentationException(key="multiplier", lstext=lstext)  # raise an error, print error msg, exit
-
-        prev = 0  # previous indentation level
-        for li in lsitems:
-            if li[1] > prev + 1:  # if one or several indent levels are skipped, reset them
-                li[1] = prev + 1
-            prev = li[1]
-
-    return lsitems
+            prev = 0
+        levels.append(prev)
+    if invalid:
+        # the indentation of all the items is checked first
+        raise IndentationException(key="multiplier", lstext=lstext)  # raise an error, print error msg, exit
+    return texts, levels
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import re
+
+from . import fingerprint
+from .cache import ConversionCache
+from .errors_warnings import InputException
+
+
+# ---------------------------------------------------------------
+# syntax highlighting at conversion time: the blocks of code whose
+# language is known to pygments are highlighted in python, instead
+# of being highlighted by `minted` each time the TeX is compiled
+# (which needs `-shell-escape` and runs pygments once per block).
+# a block is written as a `fancyvrb` `Verbatim` environment whose
+# `commandchars` only use `\textcolor`, `\textbf` and `\textit`:
+# the TeX doesn't depend on macros defined by pygments, and only
+# needs the `fancyvrb` and `xcolor` packages (see `preamble()`).
+#
+# the highlighted blocks are cached under a hash of their code,
+# language and style: the blocks that haven't changed since the
+# last conversion are only looked up (see `ConversionCache`).
+# ---------------------------------------------------------------
+
+
+verbatim = "\\begin{Verbatim}[commandchars=\\\\\\{\\},numbers=left,tabsize=4]\n%s\\end{Verbatim}"
+escapes = {"\\": "\\textbackslash{}", "{": "\\{", "}": "\\}"}  # the `commandchars` of the `Verbatim`
+escape_re = re.compile(r"[\\{}]")
+minted_re = re.compile(r"^[ \t]*\\(?:usepackage(?:\[[^\]\n]*\])?\{minted\}|usemintedstyle|setminted)(?![a-zA-Z])"
+                       r".*\n?", flags=re.M)  # the lines of a template loading and setting up `minted`
+packages = r"""\usepackage{fancyvrb}
+\usepackage{xcolor}
+\usepackage{newfloat}
+\ifdefined\listing\else\DeclareFloatingEnvironment{listing}\fi
+"""  # what the highlighted blocks need, instead of `minted`
+
+
+class Highlighter:
+    """
+    highlight blocks of code with pygments, and cache them.
+
+    :param style: the name of the pygments style (`emacs`, `friendly`...)
+    :param directory: the directory of the disk tier of the cache. if None,
+                      the blocks are only cached in memory
+    :param max_bytes: the maximum size of the disk tier
+    """
+    def __init__(self, style="emacs", directory=None, max_bytes=2 ** 28):
+        try:
+            from pygments.styles import get_style_by_name
+            from pygments.util import ClassNotFound
+        except ImportError:
+            raise InputException("pygments", style)
+        try:
+            get_style_by_name(style)
+        except ClassNotFound:
+            raise InputException("highlight_style", style)
+        self.style = style
+        self.cache = ConversionCache(size=1024, directory=directory, max_bytes=max_bytes)
+        self.formats = None  # token type: `(opening, closing)` TeX around its text, built when first used
+        self.lexers = {}  # language: pygments lexer, or None if pygments doesn't know the language
+
+    def __getstate__(self):
+        # a highlighter sent to another process builds its lexers and formats again
+        state = self.__dict__.copy()
+        state["formats"], state["lexers"] = None, {}
+        return state
+
+    def key(self, code: str, lang: str):
+        """
+        build the key of a highlighted block
+        :param code: the code of the block
+        :param lang: its language
+        :return: the key, a hex digest
+        """
+        from pygments import __version__ as pygments_version
+        digest = hashlib.sha256()
+        digest.update(json.dumps([fingerprint("highlight.py"), pygments_version, verbatim, self.style, lang]).encode())
+        digest.update(code.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def lexer(self, lang: str):
+        """
+        :param lang: the language of a block of code
+        :return: the pygments lexer of the language, or None if pygments doesn't know it
+        """
+        if lang not in self.lexers:
+            from pygments.lexers import get_lexer_by_name
+            from pygments.util import ClassNotFound
+            try:
+                # the blank lines around the code are kept, as with `minted`
+                self.lexers[lang] = get_lexer_by_name(lang, stripnl=False, ensurenl=False)
+            except ClassNotFound:
+                self.lexers[lang] = None
+        return self.lexers[lang]
+
+    def format(self, ttype):
+        """
+        :param ttype: a pygments token type
+        :return: the TeX to write before and after the text of a token of this type
+        """
+        if self.formats is None:
+            from pygments.styles import get_style_by_name
+            self.formats = {"style": get_style_by_name(self.style)}
+        if ttype not in self.formats:
+            style = self.formats["style"].style_for_token(ttype)
+            opening, closing = "", ""
+            if style["color"]:
+                opening, closing = opening + "\\textcolor[HTML]{%s}{" % style["color"].upper(), "}" + closing
+            if style["bold"]:
+                opening, closing = opening + "\\textbf{", "}" + closing
+            if style["italic"]:
+                opening, closing = opening + "\\textit{", "}" + closing
+            self.formats[ttype] = opening, closing
+        return self.formats[ttype]
+
+    def highlight(self, code: str, lang: str):
+        """
+        highlight a block of code, or find it in the cache
+        :param code: the code of the block
+        :param lang: its language
+        :return: the TeX `Verbatim` environment, or None if pygments doesn't know the language
+        """
+        key = self.key(code, lang)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry[0]
+        lexer = self.lexer(lang)
+        if lexer is None:
+            return None
+        out = []
+        for ttype, text in lexer.get_tokens(code):
+            opening, closing = self.format(ttype)
+            # a command can't span several lines of a `Verbatim`: each line of the token is formatted
+            for i, line in enumerate(text.split("\n")):
+                if i > 0:
+                    out.append("\n")
+                line = escape_re.sub(lambda m: escapes[m[0]], line)
+                core = line.strip()
+                if not core or not opening:
+                    out.append(line)
+                    continue
+                # the spaces stay outside of the braces: `MDCleaner.clean_spaces()` would remove them inside
+                lead, trail = line[:len(line) - len(line.lstrip())], line[len(line.rstrip()):]
+                out.append(lead + opening + core + closing + trail)
+        tex = "".join(out)
+        tex = verbatim % (tex if tex.endswith("\n") else tex + "\n")
+        self.cache.put(key, tex, [])
+        return tex
+
+    @staticmethod
+    def preamble(head: str):
+        """
+        adapt the TeX of a template before the body to the highlighted blocks: the lines loading and
+        setting up `minted` are removed, and the packages used by the blocks are loaded instead
+        :param head: the TeX of the template before the body (see `Converter.template()`)
+        :return: the adapted TeX
+        """
+        match = minted_re.search(head)
+        pos = match.start() if match is not None else head.find("\\begin{document}")
+        pos = len(head) if pos < 0 else pos
+        return minted_re.sub("", head[:pos]) + packages + minted_re.sub("", head[pos:])
@@ -0,0 +1,143 @@
+import re
+
+from .stream import MDStream, chunk_size, pointer_re
+from .tree import MDParser
+
+
+# ---------------------------------------------------------------
+# conversion of memory-mapped files: the chunks of the streaming
+# mode (see `stream.py`) are found by scanning the bytes of the
+# file, without decoding it, and each chunk is decoded once, when
+# it is converted. the scan only decodes the lines it must read
+# as text (lines after an empty line, code fences, footnotes), so
+# that it sees them as `MDStream.chunks()` does: the chunks are
+# cut at the same kind of boundaries and the TeX is the same as
+# the TeX of the whole file.
+#
+# the sizes are counted in bytes and the file must be UTF-8,
+# with `\n` line endings (text files with `\r` are translated
+# when they are read, not when they are mapped).
+# ---------------------------------------------------------------
+
+
+event_re = re.compile(rb"^[ \t]*(?:\n|\Z)|```|\[\^", flags=re.M)  # the lines that can end a chunk or a code block
+spaces = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"  # the ascii characters of `str.isspace()`
+
+
+class MDMapped:
+    """
+    find the chunks and the footnotes of a markdown file in its bytes
+    """
+    @staticmethod
+    def chunks(data, size=chunk_size, offset=0, backticks=0, fenced=False):
+        """
+        split a markdown file in chunks that can be converted separately (see `MDStream.chunks()`).
+        the scan can start at any line, with the state of the code blocks at that line (see
+        `fences()`): the state of the footnotes is reset at the first empty line, before a chunk
+        can end, so the chunks found from there end where they could end in a scan of the whole file.
+        :param data: the bytes of the markdown file (a `mmap`...)
+        :param size: the minimum size of a chunk, in bytes
+        :param offset: the beginning of the line to start the scan at
+        :param backticks: the number of "```" before that line
+        :param fenced: wether that line is inside a code block opened at the beginning of a line
+        :return: a generator of `(start, end)` offsets of the chunks
+        """
+        length = len(data)
+        first = offset  # start of the current chunk
+        previous = None  # start of the line before the current line
+        start = offset  # start of the current line
+        footnote = False
+        cuts = []  # offset of the first line of each empty line run where a chunk could end
+        while start < length:
+            if not cuts and not footnote:
+                # the lines of text can't change the state of the scan: they are skipped up to the
+                # next empty line, code fence or footnote
+                match = event_re.search(data, start)
+                skip = length if match is None else data.rfind(b"\n", 0, match.start()) + 1
+                if skip > start:
+                    previous = data.rfind(b"\n", 0, skip - 1) + 1
+                    start = skip
+                    continue
+            end = data.find(b"\n", start) + 1 or length
+            line = data[start:end]
+            if line.strip(b" \t") in (b"\n", b""):
+                footnote = False
+                if previous is not None and backticks % 2 == 0 and not fenced \
+                        and MDMapped.strip(data[previous:start]):
+                    cuts.append(start)
+            else:
+                if not footnote and b"[^" in line:
+                    footnote = MDParser.kind(line.decode()) == "footnote"  # until the next empty line
+                if cuts and not footnote:
+                    text = MDMapped.strip(line, pointers=True)
+                    if text:
+                        if start - first >= size and not text.startswith(b"#"):
+                            # this line decides every cut before it (see `MDStream.chunks()`)
+                            for cut in cuts:
+                                if start - first < size:
+                                    break
+                                yield first, cut
+                                first = cut
+                        cuts = []
+                if b"```" in line:
+                    backticks, fenced = MDStream.fence(line.decode(), backticks, fenced)
+            previous = start
+            start = end
+        if previous is not None:
+            yield first, length
+
+    @staticmethod
+    def fences(data, start: int, end: int, backticks=0, fenced=False):
+        """
+        update the state of the code blocks (see `MDStream.fence()`) from one line of a file to
+        another. only the lines with a "```" are read.
+        :param data: the bytes of the markdown file
+        :param start: the beginning of the first line
+        :param end: the beginning of the line to find the state at
+        :param backticks: the number of "```" before the first line
+        :param fenced: wether the first line is inside a code block opened at the beginning of a line
+        :return: the `(backticks, fenced)` of the line at `end`
+        """
+        pos = data.find(b"```", start, end)
+        while pos >= 0:
+            first = data.rfind(b"\n", 0, pos) + 1
+            last = data.find(b"\n", pos) + 1 or len(data)
+            backticks, fenced = MDStream.fence(data[first:last].decode(), backticks, fenced)
+            pos = data.find(b"```", last, end)
+        return backticks, fenced
+
+    @staticmethod
+    def strip(line: bytes, pointers=False):
+        """
+        strip a line of its spaces (those of `str.isspace()`), as `MDStream.chunks()` does.
+        the line is only decoded if it isn't ascii or if its pointers must be removed.
+        :param line: a line of the file
+        :param pointers: wether to remove the footnote pointers of the line too
+        :return: the stripped line, as bytes
+        """
+        if line.isascii() and not (pointers and b"[^" in line):
+            return line.strip(spaces)
+        text = line.decode()
+        return (pointer_re.sub("", text) if pointers else text).strip().encode()
+
+    @staticmethod
+    def index(data, spans: list, engine="regex"):
+        """
+        index the footnotes of a file (see `MDStream.index()`). only the chunks
+        that may contain a footnote or a pointer are decoded.
+        :param data: the bytes of the markdown file
+        :param spans: the `(start, end)` offsets of the chunks of the file
+        :param engine: the name of the conversion engine
+        :return: a dict mapping footnote keys to the markdown footnote, and the footnotes
+                 of each chunk, to feed to `MDStream` with the chunk (see `MDStream.footnotes()`)
+        """
+        footnotes = {}
+        found = []
+        for start, end in spans:
+            if data.find(b"[^", start, end) < 0:
+                found.append(([], []))
+                continue
+            found.append(MDStream.footnotes(data[start:end].decode(), engine))
+            for key, text in found[-1][1]:
+                footnotes.setdefault(key, text)
+        return footnotes, found
@@ -2,9 +2,10 @@
 # --------------------------------------------------------------------------
 # list of languages supported by minted (04.08.22)
 # source: https://www.overleaf.com/learn/latex/Code_Highlighting_with_minted
+# a frozen set, built once at import: the languages are only looked up
 # --------------------------------------------------------------------------
 
-languages = [
+languages = frozenset([
     "cucumber",
     "abap",
     "ada",
@@ -133,4 +134,4 @@ languages = [
     "xml",
     "xquery",
     "yaml",
-]
+])
@@ -0,0 +1,203 @@
+import re
+
+from .converters import MDSimple, MDQuote, MDList, MDCode, MDCleaner, MDReference, MDHeader
+
+
+# ---------------------------------------------------------------
+# conversion engines: functions that take the string representation
+# of a markdown file and return its TeX translation.
+# - `regex`: the reference backend, a sequence of regex passes over
+#   the whole document (see `converters.py`)
+# - `tree`: a single scan building a block tree, then a LaTeX
+#   emitter walking this tree (see `tree.py`)
+# ---------------------------------------------------------------
+
+
+# ---------------------------------------------------------------
+# profiling: each stage of an engine is run through `step()`,
+# which records it if a `Profile` is given. the functions below
+# count the elements that each stage translated, from the
+# arguments and the output of the stage.
+# ---------------------------------------------------------------
+
+
+def delta(*markers):
+    """
+    :param markers: strings written by a stage
+    :return: a function counting how many markers a stage added to the text
+    """
+    return lambda args, out: sum(out.count(m) - args[0].count(m) for m in markers)
+
+
+header_re = re.compile(r"\\(?:chapter|(?:sub)*section)\*?\{|\\textbf\{")
+matches = {
+    "block_code": delta("\\end{minted}", "\\end{Verbatim}", "\\end{lstlisting}"),
+    "prepare_markdown": lambda args, out: len(out[1]),  # code blocks and inline code set aside
+    "inline_quote": delta("``", "\\enquote{"),
+    "block_quote": delta("\\begin{quotation}"),
+    "unordered_l": delta("\\begin{itemize}"),
+    "ordered_l": delta("\\begin{enumerate}"),
+    "footnote": delta("\\footnote{"),
+    "MDHeader.convert": lambda args, out: len(header_re.findall(out)) - len(header_re.findall(args[0])),
+    "MDSimple.convert": lambda args, out: sum(len(p.findall(args[0])) for t, p, r in MDSimple.plan().passes),
+    "clean_tex": lambda args, out: len(args[1]),  # code reinjected
+    "MDParser.parse": lambda args, out: len(out.blocks),
+    "TexEmitter.emit": lambda args, out: len(args[0].blocks),
+}
+
+
+def step(profile, name: str, fn, *args, run=True):
+    """
+    run a stage of an engine
+    :param profile: a `Profile` to record the stage in, or None
+    :param name: the name of the stage
+    :param fn: the function running the stage
+    :param args: the arguments of the function
+    :param run: if False, the stage is skipped (see `prescan()`) and the text is returned as is
+    :return: the output of the function
+    """
+    if not run:
+        if profile is not None:
+            profile.skip(name)
+        return args[0]
+    if profile is None:
+        return fn(*args)
+    return profile.stage(name, fn, args, matches.get(name))
+
+
+# ---------------------------------------------------------------
+# prescan: most documents only use a few markdown constructs, and
+# the stages of the regex engine translating a construct that the
+# document doesn't contain are skipped. the constructs are looked
+# for once, in the escaped text returned by `prepare_markdown()`:
+# the code is set aside, and the stages only move the text of the
+# constructs they translate, so that none of them adds a construct
+# that a later stage translates. `MDSimple.convert()` isn't in the
+# prescan: the quotes translated by `inline_quote()` can add a
+# backtick, and its plan already skips the passes that can't match.
+# the blocks of code are found before the text is escaped, and
+# `block_code()` is skipped if there isn't any fence.
+# ---------------------------------------------------------------
+
+
+ulist_line_re = re.compile(r"^[ \t]*-(?!-{2,})", flags=re.M)  # see `LineScanner.lists()`
+olist_line_re = re.compile(r"^[ \t]*\d+\.", flags=re.M)
+constructs = {
+    "inline_quote": lambda s: '"' in s or "'" in s,
+    "block_quote": lambda s: ">" in s,  # never found in the escaped text (see `tree.py`)
+    "unordered_l": lambda s: "-" in s and ulist_line_re.search(s) is not None,
+    "ordered_l": lambda s: "." in s and olist_line_re.search(s) is not None,
+    "footnote": lambda s: "[\\^" in s,
+    "MDHeader.convert": lambda s: "\\#" in s,
+}
+
+
+def prescan(data: str):
+    """
+    find the stages of the regex engine that can change a document
+    :param data: the escaped markdown (see `MDCleaner.prepare_markdown()`)
+    :return: the set of the names of these stages
+    """
+    return {name for name, found in constructs.items() if found(data)}
+
+
+def regex_engine(data: str, french_quote=False, unnumbered=False, document_class="article", diagnostics=None,
+                 clean=True, profile=None, highlighter=None):
+    """
+    convert a markdown string to TeX using the regex passes of `converters.py`
+    :param data: the string representation of the markdown file
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param diagnostics: if a list is provided, the problems found in the markdown are appended to it
+                        as `(warning key, value)` tuples (see `Warnings`)
+    :param clean: wether to clean the spaces of the TeX (see `MDCleaner.clean_spaces()`)
+    :param profile: a `Profile` to record the stages in
+    :param highlighter: a `Highlighter` to colour the code with (see `highlight.py`), or None to use `minted`
+    :return: the string representation of the TeX file
+    """
+    # complex replacements
+    data = step(profile, "block_code", MDCode.block_code, data, highlighter,
+                run="```" in data)  # the contents of code blocks must be interpreted verbatim; this function
+    #                                 comes first so that they won't be changed by `prepare_markdown()`
+    data, codedict = step(profile, "prepare_markdown", MDCleaner.prepare_markdown, data)  # escape special chars
+    #                                                                                       + remove code envs
+    #                                                                                       from the pipeline
+    found = prescan(data)  # the stages that can change the document
+    data = step(profile, "inline_quote", MDQuote.inline_quote, data, french_quote, run="inline_quote" in found)
+    data = step(profile, "block_quote", MDQuote.block_quote, data, run="block_quote" in found)
+    data = step(profile, "unordered_l", MDList.unordered_l, data, run="unordered_l" in found)
+    data = step(profile, "ordered_l", MDList.ordered_l, data, run="ordered_l" in found)
+    data = step(profile, "footnote", MDReference.footnote, data, diagnostics, run="footnote" in found)
+    data = step(profile, "MDHeader.convert", MDHeader.convert, data, unnumbered, document_class,
+                run="MDHeader.convert" in found)
+
+    # "simple" replacements. simple_sub contains regexes as keys
+    # and values, facilitating the regex replacement
+    data = step(profile, "MDSimple.convert", MDSimple.convert, data)
+    data = step(profile, "clean_tex", MDCleaner.clean_tex, data, codedict, clean)  # clean the tex file + reinject
+    #                                                                                the escaped code blocks
+    return data
+
+
+def tree_engine(data: str, french_quote=False, unnumbered=False, document_class="article", diagnostics=None,
+                clean=True, profile=None, highlighter=None):
+    """
+    convert a markdown string to TeX by building a block tree and emitting it
+    :param data: the string representation of the markdown file
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param diagnostics: if a list is provided, the problems found in the markdown are appended to it
+                        as `(warning key, value)` tuples (see `Warnings`)
+    :param clean: wether to clean the spaces of the TeX (see `MDCleaner.clean_spaces()`)
+    :param profile: a `Profile` to record the stages in
+    :param highlighter: a `Highlighter` to colour the code with (see `highlight.py`), or None to use `minted`
+    :return: the string representation of the TeX file
+    """
+    from .tree import MDParser, TexEmitter  # only loaded when the engine is used
+
+    doc = step(profile, "MDParser.parse", MDParser.parse, data)
+    emitter = TexEmitter(french_quote, unnumbered, document_class, highlighter)
+    data = step(profile, "TexEmitter.emit", emitter.emit, doc, clean)
+    if diagnostics is not None:
+        diagnostics.extend(MDReference.diagnose(emitter.pointers, doc.definitions))
+    return data
+
+
+engines = {
+    "regex": regex_engine,
+    "tree": tree_engine,
+}
+
+
+# ---------------------------------------------------------------
+# memory: converting a whole document allocates several copies
+# of it (one per stage, plus the matches of the regexes). the peak
+# grows linearly with the size of the document, and the factors
+# below are the highest peaks measured with `--memory-report` on
+# the documents of `benchmarks/generators.py`, in bytes allocated
+# per character of markdown, rounded up (see `benchmarks/memory.py`).
+# ---------------------------------------------------------------
+
+
+footprints = {
+    "regex": 8,
+    "tree": 20,
+}
+wide_re = re.compile(rb"[\xf0-\xf4]")  # utf-8 lead bytes of the characters above U+FFFF
+ucs2_re = re.compile(rb"[\xc4-\xef]")  # utf-8 lead bytes of the characters from U+0100 to U+FFFF
+
+
+def footprint(data, engine="regex", size=None):
+    """
+    estimate the memory needed to convert a document at once. python stores a string
+    with 1, 2 or 4 bytes per character, depending on its widest character, so a single
+    emoji in a document makes all its copies 4 times bigger.
+    :param data: the bytes of the markdown file (a `mmap`...)
+    :param engine: the name of the conversion engine
+    :param size: the number of bytes of the file converted at once (a chunk). defaults to the whole file
+    :return: the estimated peak of the memory allocated by the conversion, in bytes
+    """
+    width = 4 if wide_re.search(data) else 2 if ucs2_re.search(data) else 1
+    return (len(data) if size is None else size) * width * footprints[engine]
@@ -0,0 +1,93 @@
+import re
+
+
+# ---------------------------------------------------------------
+# compiled substitution plans: the regexes of a conversion step,
+# compiled once, reused for every document and run in as few
+# passes over the document as their semantics allow.
+# ---------------------------------------------------------------
+
+
+class SubstitutionPlan:
+    """
+    an ordered list of regex passes. each pass is a tuple:
+    `(triggers, compiled pattern, replacement)`. a pass is only run
+    if one of its trigger strings is found in the document; a pass
+    without triggers is always run.
+    """
+    def __init__(self, passes):
+        self.passes = passes
+
+    @staticmethod
+    def rule(pattern: str, repl: str, triggers=()):
+        """
+        build a pass from a single regex
+        :param pattern: the regex
+        :param repl: its replacement, to use with `re.sub`
+        :param triggers: strings that must be found in the document for the pass to run
+        :return: the pass
+        """
+        return triggers, re.compile(pattern, flags=re.M), repl
+
+    def apply(self, string: str):
+        """
+        run all the passes on a string
+        :param string: the string to process
+        :return: the processed string
+        """
+        for triggers, pattern, repl in self.passes:
+            if not triggers or any(t in string for t in triggers):
+                string = pattern.sub(repl, string)
+        return string
+
+
+class HeaderPlan:
+    """
+    all header levels merged into a single regex.
+
+    the header substitution dicts of `MDHeader` are meant to be run one
+    level after the other, and the result of one level changes what the
+    next ones match: the replacements end with a newline, so a header
+    that directly follows a header translated in an earlier pass also
+    absorbs the newline of that header. this plan reproduces that in
+    a single pass.
+
+    :param substitute: one of the `MDHeader` dicts, mapping header regexes to their replacement
+    """
+    pattern = re.compile(r"((?:\\#)+)(?!\\)(.*?)$", flags=re.M)
+
+    def __init__(self, substitute: dict):
+        # the replacement for each level, expanded once around a placeholder for the
+        # title, so that translating a header only needs a `str.join()`
+        self.templates = [HeaderPlan.pattern.sub(v, "\\#\0").split("\0") for v in substitute.values()]
+
+    def apply(self, string: str):
+        """
+        translate all the headers of a string. `re` can only search quickly for
+        a regex that begins with a literal, so the headers are found with their
+        `\\#` and the `^\\s*` of the `MDHeader` regexes is checked afterwards:
+        a header starts at the first line start of the whitespace before it.
+        :param string: the string to process
+        :return: the processed string
+        """
+        out = []
+        pos = 0
+        end, last = -2, None  # end of the previous header and the pass that translated it
+        for m in HeaderPlan.pattern.finditer(string):
+            start = m.start()
+            while start > pos and string[start - 1].isspace():
+                start -= 1
+            if start > 0 and string[start - 1] != "\n":
+                start = string.find("\n", start, m.start()) + 1
+                if start == 0:
+                    continue  # not at the beginning of a line
+            level = min(len(m[1]) // 2, len(self.templates))
+            if start == end + 1 and last < level:
+                out.append(string[pos:end])  # absorb the newline of the previous header
+            else:
+                out.append(string[pos:start])
+            out.append(m[2].join(self.templates[level - 1]))
+            pos = end = m.end()
+            last = level
+        out.append(string[pos:])
+        return "".join(out)
@@ -0,0 +1,183 @@
+import tracemalloc
+import time
+
+
+# ---------------------------------------------------------------
+# profiling of the conversion: the engines of `pipeline.py` can
+# record, for each of their stages, the time spent, the size of
+# the text before and after the stage, the number of elements
+# translated, and the number of documents for which it was skipped
+# because they don't contain what it translates (see `prescan()`).
+# the records of several documents are added together, and the
+# slowest documents are kept, to find the documents and stages that
+# take the most time in a batch.
+#
+# the memory can be recorded too, with `tracemalloc`: the peak of
+# the memory allocated during each stage, and the memory that it
+# leaves allocated (its output, mostly). only the allocations of
+# python are traced, and tracing slows the conversion down: the
+# times of a memory profile are not those of a normal run.
+# ---------------------------------------------------------------
+
+
+class Profile:
+    """
+    the stage and document records of one or several conversions.
+
+    :param keep: the number of slowest documents to keep
+    :param memory: wether to record the memory allocated by the stages and the documents.
+                   `tracemalloc` is started if it isn't already
+    """
+    def __init__(self, keep=10, memory=False):
+        self.keep = keep
+        self.memory = memory
+        self.stages = {}  # stage name: {"calls", "skipped", "time", "input", "output", "matches"}
+        #                   (+ {"peak", "net"})
+        self.documents = []  # the slowest documents: [(time, name, size, peak)], the slowest first
+        self.time = 0  # the time spent converting all documents
+        self.count = 0  # the number of documents
+        self.peak = 0  # the highest peak of memory of a document, in bytes
+        self.base = None  # the memory allocated when the current document started (see `start()`)
+        self.high = 0  # the highest memory allocated during the current document
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self):
+        """
+        mark the start of the conversion of a document: its peak of memory is measured
+        from there to `document()`. without it, it is measured from its first stage
+        """
+        if self.memory:
+            tracemalloc.reset_peak()
+            self.base = self.high = tracemalloc.get_traced_memory()[0]
+
+    def stage(self, name: str, fn, args: tuple, matches=None):
+        """
+        run a stage of an engine and record it
+        :param name: the name of the stage
+        :param fn: the function running the stage
+        :param args: the arguments of the function; the first one is the text before the stage
+        :param matches: a function `(args, output) -> int`, counting the elements translated by the stage
+        :return: the output of the function
+        """
+        if self.memory:
+            before, peak = tracemalloc.get_traced_memory()
+            self.base = before if self.base is None else self.base
+            self.high = max(self.high, peak)  # the peak since the last stage, before it is reset
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        out = fn(*args)
+        elapsed = time.perf_counter() - start
+        record = self.record(name)
+        if self.memory:
+            # the memory is read before the matches are counted, which allocates too
+            current, peak = tracemalloc.get_traced_memory()
+            self.high = max(self.high, peak)
+            record["peak"] = max(record.get("peak", 0), peak - before)
+            record["net"] = record.get("net", 0) + current - before
+        record["calls"] += 1
+        record["time"] += elapsed
+        record["input"] += Profile.size(args[0])
+        record["output"] += Profile.size(out)
+        if matches is not None:
+            record["matches"] += matches(args, out)
+        return out
+
+    def skip(self, name: str):
+        """
+        record that a stage wasn't run
+        :param name: the name of the stage
+        """
+        self.record(name)["skipped"] += 1
+
+    def record(self, name: str):
+        """
+        :param name: the name of a stage
+        :return: the record of the stage, created if it doesn't exist
+        """
+        return self.stages.setdefault(name, {"calls": 0, "skipped": 0, "time": 0, "input": 0, "output": 0,
+                                             "matches": 0})
+
+    @staticmethod
+    def size(value):
+        """
+        :param value: the input or the output of a stage
+        :return: its size, in characters: the size of the text, or of the first element of a tuple.
+                 0 if it isn't a text (a document tree...)
+        """
+        if isinstance(value, tuple):
+            value = value[0]
+        return len(value) if isinstance(value, str) else 0
+
+    def document(self, name: str, elapsed: float, size: int):
+        """
+        record the conversion of a whole document
+        :param name: the name of the document (its path...)
+        :param elapsed: the time spent converting it, in seconds
+        :param size: its size, in characters
+        """
+        peak = 0
+        if self.base is not None:
+            self.high = max(self.high, tracemalloc.get_traced_memory()[1])
+            peak = self.high - self.base  # the peak above the memory allocated before the document
+            self.peak = max(self.peak, peak)
+            self.base, self.high = None, 0
+        self.time += elapsed
+        self.count += 1
+        self.documents.append((elapsed, name, size, peak))
+        self.documents = sorted(self.documents, reverse=True)[:self.keep]
+
+    def merge(self, other):
+        """
+        add the records of another profile to this one
+        :param other: a `Profile`
+        """
+        for name, record in other.stages.items():
+            total = self.stages.setdefault(name, dict.fromkeys(record, 0))
+            for k, v in record.items():
+                total[k] = max(total.get(k, 0), v) if k == "peak" else total.get(k, 0) + v
+        self.time += other.time
+        self.count += other.count
+        self.peak = max(self.peak, other.peak)
+        self.documents = sorted(self.documents + other.documents, reverse=True)[:self.keep]
+
+    def json(self):
+        """
+        :return: the records, as a json-serializable dict
+        """
+        records = {
+            "documents": self.count,
+            "time": self.time,
+            "stages": self.stages,
+            "slowest": [{"document": name, "time": elapsed, "size": size} for elapsed, name, size, _ in self.documents],
+        }
+        if self.memory:
+            records["peak"] = self.peak
+            for document, (elapsed, name, size, peak) in zip(records["slowest"], self.documents):
+                document["peak"] = peak
+        return records
+
+    def table(self):
+        """
+        :return: the records, as a table of the stages sorted by time, followed by the slowest documents
+        """
+        total = sum(r["time"] for r in self.stages.values()) or 1
+        lines = [f"{'stage':<28}{'calls':>8}{'skipped':>9}{'time (s)':>12}{'%':>7}{'in (KB)':>12}{'out (KB)':>12}"
+                 + f"{'matches':>10}"
+                 + (f"{'peak (KB)':>12}{'net (KB)':>12}" if self.memory else "")]
+        order = "peak" if self.memory else "time"  # the stages that use the most memory first
+        for name, r in sorted(self.stages.items(), key=lambda s: s[1].get(order, 0), reverse=True):
+            lines.append(f"{name:<28}{r['calls']:>8}{r['skipped']:>9}{r['time']:>12.4f}"
+                         + f"{r['time'] / total * 100:>7.1f}"
+                         + f"{r['input'] / 1024:>12.1f}{r['output'] / 1024:>12.1f}{r['matches']:>10}"
+                         + (f"{r.get('peak', 0) / 1024:>12.1f}{r.get('net', 0) / 1024:>12.1f}" if self.memory else ""))
+        if self.documents:
+            lines.append("")
+            lines.append(f"{self.count} document(s) converted in {self.time:.4f}s. slowest documents:")
+            for elapsed, name, size, peak in self.documents:
+                memory = f"  {peak / 1024:>10.1f} KB peak" if self.memory else ""
+                lines.append(f"{elapsed:>10.4f}s  {size / 1024:>10.1f} KB{memory}  {name}")
+            if self.memory:
+                lines.append(f"highest peak of memory of a document: {self.peak / 2 ** 20:.1f} MB, "
+                             + "not counting its markdown")
+        return "\n".join(lines)
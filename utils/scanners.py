@@ -0,0 +1,133 @@
+import re
+
+
+# ---------------------------------------------------------------
+# line scanners, to replace the regexes of `converters.py` whose
+# nested or lazy quantifiers can backtrack on unusual input (an
+# opening delimiter without its closing one, long runs of blank
+# lines...). a scanner only moves forward in the text, and the
+# regexes it still uses are anchored on a single line, so its cost
+# is linear in the size of the text whatever the text.
+#
+# each scanner finds exactly the spans that the regex it replaces
+# finds with `re.finditer()`; the regex is given in its docstring.
+# ---------------------------------------------------------------
+
+
+ulist_re = re.compile(r"[ \t]*-(?!-{2,})")  # the beginning of an unordered list item
+olist_re = re.compile(r"[ \t]*\d+\.")  # the beginning of an ordered list item
+fndef_re = re.compile(r"\[\\\^(\d+)\]:")  # a footnote definition, once escaped
+mdfndef_re = re.compile(r"\[\^(\d+)\]:")  # a footnote definition, before the escaping
+fence_re = re.compile(r"```")  # the delimiter of a markdown block of code
+listing_open_re = re.compile(r"\\begin\{(?:listing|lstlisting)}")  # the latex code envs built by `MDCode`
+listing_close_re = re.compile(r"\\end\{(?:listing|lstlisting)}")
+
+
+class LineScanner:
+    """
+    linear time scanners, returning the spans of markdown constructs.
+
+    contains
+    --------
+    lists(): find the markdown lists, for `MDList`
+    delimited(): find the text between an opening and a closing delimiter, for `MDCode`
+    footnotes(): find the footnote definitions, for `MDReference`
+    join_items(): group the lines of each list item into a single line
+    """
+    @staticmethod
+    def lists(string: str, item=ulist_re, ordered=False):
+        r"""
+        find the lists of a text: a line beginning with a list item and
+        all the non-empty lines after it. equivalent to the regexes
+        `((^[ \t]*?-(?!-{2,}).*?\n)+(.+\n)*)+` (unordered lists) and
+        `((^[ \t]*?\d+\..*?\n?)+(.+\n?)*)+` (ordered lists)
+        :param string: the string representation of the markdown file
+        :param item: a regex matching the beginning of a list item (`ulist_re`, `olist_re`)
+        :param ordered: if True, the last line of the text can be part of a list without ending
+                        with a newline, as with the ordered lists regex.
+        :return: a generator of the `(start, end)` of the lists
+        """
+        pos = 0
+        while pos < len(string):
+            end = string.find("\n", pos)
+            end = len(string) if end < 0 else end  # the end of the line, without its newline
+            if not item.match(string, pos, end) or (end == len(string) and not ordered):
+                pos = end + 1
+                continue
+            start = pos
+            pos = end + 1
+            while pos < len(string):
+                end = string.find("\n", pos)
+                if end == pos:  # an empty line ends the list
+                    break
+                if end < 0:  # the last line, without a newline
+                    pos = len(string) if ordered else pos
+                    break
+                pos = end + 1
+            yield start, min(pos, len(string))
+
+    @staticmethod
+    def delimited(string: str, opening=fence_re, closing=fence_re):
+        """
+        find the spans going from an opening delimiter to the first closing
+        delimiter after it. equivalent to `opening(.|\\n)*?closing`, without
+        trying every opening again when a delimiter isn't closed: if an
+        opening has no closing after it, no opening after it has one either.
+        :param string: the string to search
+        :param opening: a regex matching the opening delimiter (`fence_re`, `listing_open_re`)
+        :param closing: a regex matching the closing delimiter
+        :return: a generator of the `(start, end)` of the spans, delimiters included
+        """
+        pos = 0
+        while True:
+            start = opening.search(string, pos)
+            if start is None:
+                return
+            end = closing.search(string, start.end())
+            if end is None:
+                return
+            yield start.start(), end.end()
+            pos = end.end()
+
+    @staticmethod
+    def footnotes(string: str, definition=fndef_re):
+        r"""
+        find the footnote definitions of an escaped markdown text: a footnote
+        runs from its pointer until an empty line or the next footnote.
+        equivalent to `(\[\\\^(\d+)\]:)(?:(?!\[\\\^\d+\]:).+\n?)*`
+        :param string: the string representation of the markdown file
+        :param definition: a regex matching the pointer of a footnote (`fndef_re`, or
+                           `mdfndef_re` for a text that isn't escaped yet)
+        :return: a generator of `(match of the pointer, end of the footnote)`;
+                 the group 1 of the match is the key of the footnote
+        """
+        pos = 0
+        for match in definition.finditer(string):
+            if match.start() < pos:  # inside the previous footnote
+                continue
+            pos = match.end()
+            while pos < len(string) and not definition.match(string, pos):
+                end = string.find("\n", pos)
+                if end == pos:  # an empty line ends the footnote
+                    break
+                pos = len(string) if end < 0 else end + 1
+            yield match, pos
+
+    @staticmethod
+    def join_items(lstext: str, ordered=False):
+        r"""
+        group the lines of each list item into a single line: replace the
+        newlines that aren't followed by a list item by spaces. equivalent
+        to `re.sub(r"\n(?!\s*-)", " ", lstext)`, whose lookahead reads all
+        the blank lines after each newline; here, all the newlines of a run
+        of whitespace are replaced at once, since they are all followed by
+        the same text.
+        :param lstext: the markdown list
+        :param ordered: if True, the items are those of an ordered list
+        :return: the list, with one line per item
+        """
+        item = re.compile(r"\d+\.") if ordered else re.compile(r"-")
+
+        def join(m):
+            return m[0] if item.match(lstext, m.end()) else m[0].replace("\n", " ")
+        return re.sub(r"\n\s*", join, lstext)
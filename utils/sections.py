@@ -0,0 +1,224 @@
+import mmap
+
+from .converters import MDCleaner, MDReference
+from .mapped import MDMapped
+from .pipeline import engines
+from .profile import Profile
+from .stream import MDStream, chunk_size
+
+
+# ---------------------------------------------------------------
+# parallel conversion of a single file: the file is split in
+# sections at the boundaries of the streaming mode, found in a
+# memory map of the file (see `MDMapped.chunks()`), and the
+# sections are converted on a pool of processes. each process
+# maps the file and decodes its own sections, so that only the
+# offsets of the sections and their TeX are sent between the
+# processes.
+#
+# the footnotes are the only thing that links sections together,
+# as in the streaming mode: they are indexed first, in parallel
+# too, and each section is converted with the footnotes it points
+# to (see `MDStream.inject()`). the TeX of a section is cleaned
+# by its process, except before its first line and after its last
+# line where the cleaning regexes can't overlap: these parts are
+# cleaned when the sections are joined back in order.
+# ---------------------------------------------------------------
+
+
+sections_per_job = 4  # more sections than processes, so that a slow section doesn't hold the others back
+
+
+class MDSections:
+    """
+    split a file in sections, convert them, and join their TeX back in order.
+    the static methods run in the worker processes, and an instance joins the sections.
+    """
+    def __init__(self):
+        self.tail = ""  # converted TeX that can't be cleaned yet
+
+    @staticmethod
+    def spans(data, jobs: int, size=None):
+        """
+        split a markdown file in sections that can be converted separately: a section ends at
+        the first chunk boundary (see `MDMapped.chunks()`) after its minimum size. the file
+        isn't scanned line by line: the state of the code blocks is carried from one section
+        to the next by reading the code fences only, and the scan starts again at the line
+        where the section reaches its minimum size.
+        :param data: the bytes of the markdown file (a `mmap`...)
+        :param jobs: the number of processes converting the sections
+        :param size: the minimum size of a section, in bytes. defaults to a size giving
+                     `sections_per_job` sections per process
+        :return: the `(start, end)` offsets of the sections
+        """
+        size = max(chunk_size, len(data) // (jobs * sections_per_job)) if size is None else size
+        spans = []
+        first = 0  # start of the current section
+        state = (0, False)  # `(backticks, fenced)` at the start of the current section
+        while len(data) - first > size:
+            line = max(first, data.rfind(b"\n", 0, first + size) + 1)  # the line where the section reaches its size
+            state = MDMapped.fences(data, first, line, *state)
+            end = next(MDMapped.chunks(data, 1, line, *state))[1]
+            if end == len(data):
+                break  # no boundary after the line
+            state = MDMapped.fences(data, line, end, *state)
+            spans.append((first, end))
+            first = end
+        if first < len(data):
+            spans.append((first, len(data)))
+        return spans
+
+    @staticmethod
+    def read(path: str, start: int, end: int):
+        """
+        :param path: the path to the markdown file
+        :param start: the offset of the section
+        :param end: the offset of the end of the section
+        :return: the section, decoded
+        """
+        with open(path, mode="rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return data[start:end].decode()
+
+    @staticmethod
+    def index(path: str, data, spans: list, engine="regex", run=map):
+        """
+        index the footnotes of a file (see `MDMapped.index()`). only the sections that
+        may contain a footnote or a pointer are read, by `MDSections.footnotes()`.
+        :param path: the path to the markdown file
+        :param data: the bytes of the markdown file
+        :param spans: the `(start, end)` offsets of the sections
+        :param engine: the name of the conversion engine
+        :param run: the `map()` function running `MDSections.footnotes()` (`Executor.map()`...)
+        :return: a dict mapping footnote keys to the markdown footnote, and the footnotes of each section
+        """
+        noted = [i for i, (start, end) in enumerate(spans) if data.find(b"[^", start, end) >= 0]
+        found = [([], [])] * len(spans)
+        for i, notes in zip(noted, run(MDSections.footnotes, [(path, *spans[i], engine) for i in noted])):
+            found[i] = notes
+        footnotes = {}
+        for pointers, definitions in found:
+            for key, text in definitions:
+                footnotes.setdefault(key, text)
+        return footnotes, found
+
+    @staticmethod
+    def footnotes(task: tuple):
+        """
+        find the footnotes of a section (see `MDStream.footnotes()`)
+        :param task: a tuple `(path, start, end, engine)`
+        :return: the pointer keys and a list of `(key, markdown footnote)`
+        """
+        path, start, end, engine = task
+        return MDStream.footnotes(MDSections.read(path, start, end), engine)
+
+    @staticmethod
+    def tasks(path: str, spans: list, footnotes: dict, found: list, engine: str, options: tuple, profile=None,
+              highlighter=None):
+        """
+        :param path: the path to the markdown file
+        :param spans: the `(start, end)` offsets of the sections
+        :param footnotes: the footnotes of the file (see `index()`)
+        :param found: the footnotes of each section
+        :param engine: the name of the conversion engine
+        :param options: the options of the engine: `(french_quote, unnumbered, document_class)`
+        :param profile: the `Profile` to record the sections in, if they are converted by this process.
+                        in worker processes, wether the profile of each section records the memory.
+                        None to convert the sections without a profile
+        :param highlighter: a `Highlighter` to colour the code with (see `highlight.py`), or None to use `minted`
+        :return: the tasks converting the sections (see `convert()`), in order
+        """
+        tasks = []
+        for i, ((start, end), (pointers, definitions)) in enumerate(zip(spans, found)):
+            notes = {k: footnotes[k] for k in pointers if k in footnotes}  # only send the footnotes it points to
+            tasks.append((path, start, end, engine, options, notes, pointers, definitions, i == 0, profile,
+                          highlighter))
+        return tasks
+
+    @staticmethod
+    def convert(task: tuple):
+        """
+        convert a section and clean its TeX, except around its ends
+        :param task: a tuple built by `tasks()`
+        :return: the TeX of the section split by `split()`, the size of the section,
+                 in characters, and the `Profile` it was recorded in, or None
+        """
+        path, start, end, engine, options, notes, pointers, definitions, first, profile, highlighter = task
+        if isinstance(profile, bool):  # in a worker process: the profile of the section is sent back
+            profile = Profile(memory=profile)
+        chunk = MDSections.read(path, start, end)
+        size = len(chunk)
+        chunk = MDStream.inject(chunk, pointers, definitions, notes, first, engine)
+        tex = engines[engine](chunk, *options, clean=False, profile=profile, highlighter=highlighter)
+        return MDSections.split(tex), size, profile
+
+    @staticmethod
+    def boundary(tex: str, start: int):
+        """
+        check that the cleaning regexes of `MDCleaner.clean_spaces()` can't overlap the beginning
+        of a line (see `MDStream.clean()`). the text before the line must be in `tex`: a line that
+        only follows spaces could follow an opening `{` of the previous section.
+        :param tex: the TeX of a section
+        :param start: the beginning of a line of `tex`, after its first line
+        :return: wether the TeX can be cleaned separately before and after `start`
+        """
+        if tex[start].isspace() or tex[start] == "}" or tex.startswith("\\end{", start):
+            return False
+        end = start - 1
+        while end > 0 and tex[end - 1].isspace():
+            end -= 1
+        return end > 0 and tex[end - 1] != "{"
+
+    @staticmethod
+    def split(tex: str):
+        """
+        clean the TeX of a section between its first and its last boundary (see `boundary()`)
+        :param tex: the TeX of a section, before the cleaning
+        :return: `(head, body, tail)`: the TeX before the first boundary, the cleaned TeX between
+                 the boundaries and the TeX after the last one. if there is no boundary, the body is None
+        """
+        last = len(tex) - 6  # the end of the last line can be followed by the beginning of the next section
+        first = tex.find("\n")
+        while 0 <= first < last and not MDSections.boundary(tex, first + 1):
+            first = tex.find("\n", first + 1)
+        if not 0 <= first < last:
+            return tex, None, ""
+        pos = last
+        while True:
+            pos = tex.rfind("\n", first, pos)
+            if pos == first or MDSections.boundary(tex, pos + 1):
+                break
+        return tex[:first + 1], MDCleaner.clean_spaces(tex[first + 1:pos + 1]), tex[pos + 1:]
+
+    def feed(self, head: str, body, tail: str):
+        """
+        add the TeX of the next section
+        :param head: the TeX before the first boundary of the section (see `split()`)
+        :param body: its cleaned TeX, or None
+        :param tail: the TeX after its last boundary
+        :return: the cleaned TeX that is ready to be written
+        """
+        if body is None:
+            self.tail += head
+            return ""
+        tex = MDCleaner.clean_spaces(self.tail + head) + body
+        self.tail = tail
+        return tex
+
+    def close(self):
+        """
+        :return: the end of the TeX, cleaned
+        """
+        tex = MDCleaner.clean_spaces(self.tail)
+        self.tail = ""
+        return tex
+
+    @staticmethod
+    def diagnose(found: list):
+        """
+        :param found: the footnotes of each section (see `index()`)
+        :return: the loose and duplicate footnotes of the file (see `MDReference.diagnose()`)
+        """
+        pointers = [key for p, d in found for key in p]
+        definitions = [key for p, d in found for key, text in d]
+        return MDReference.diagnose(pointers, definitions)
@@ -0,0 +1,392 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import multiprocessing
+import threading
+import time
+import os
+
+from .api import Converter, default_template
+from .errors_warnings import InputException, ParsingException, Warnings
+
+
+# ---------------------------------------------------------------
+# conversion server: a stdlib http server converting the markdown
+# posted to `/convert` and answering with TeX. the conversions run
+# in a pool of worker processes, started and warmed up (imports,
+# compiled regexes) before the server accepts requests, so that a
+# request only costs the conversion itself.
+#
+# - a request waits for a free worker in a queue of limited size.
+#   when the queue is full, the request is refused (503).
+# - a request that takes more than the timeout, waiting included,
+#   is answered with a 504. its worker is killed and replaced, so a
+#   document that is too slow to convert doesn't keep a worker busy.
+# - `/metrics` serves the request counts, the latency histogram and
+#   the state of the pool in the prometheus text format.
+# ---------------------------------------------------------------
+
+
+context = multiprocessing.get_context("spawn")  # the server has threads: the workers aren't forked from it
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # latency histogram, in seconds
+sample = "# warm up\n\n- a *list* `item`\n\n1. with a footnote[^1]\n\n[^1]: note\n\n```python\nx = 1\n```\n"
+
+
+def work(conn):
+    """
+    the loop of a worker process: convert the requests received on a pipe
+    and send back the TeX. a converter is built once for each set of options.
+    :param conn: the worker end of the pipe. a request is a tuple `(options, markdown)`,
+                 with options `(french_quote, unnumbered, document_class, engine, template path)`.
+                 the answer is `(http status, TeX or error message, diagnostics)`.
+    """
+    converters = {}
+    for engine in ("regex", "tree"):  # import the engines and compile their regexes
+        Converter(engine=engine).convert(sample)
+    conn.send("ready")
+    while True:
+        try:
+            options, text = conn.recv()
+        except (EOFError, OSError):  # the server has stopped
+            return
+        try:
+            if options not in converters:
+                converters[options] = Converter(*options)
+            diagnostics = []
+            answer = 200, converters[options].convert(text, diagnostics), diagnostics
+        except InputException as e:
+            answer = 400, str(e), []
+        except ParsingException as e:
+            answer = 422, str(e), []
+        except Exception as e:
+            answer = 500, f"ERROR - {type(e).__name__}: {e}", []
+        conn.send(answer)
+
+
+class Worker:
+    """
+    a worker process and the pipe to send it requests
+    """
+    def __init__(self):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=work, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False  # wether the worker has sent its `ready` message
+
+    def wait(self, timeout=None):
+        """
+        wait for the worker to be warmed up
+        :param timeout: the maximum time to wait, in seconds. None waits forever
+        :return: True if the worker is ready
+        """
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == "ready"
+        return self.ready
+
+    def convert(self, request: tuple, timeout: float):
+        """
+        send a request to the worker and wait for its answer
+        :param request: a tuple `(options, markdown)` (see `work()`)
+        :param timeout: the maximum time to wait, in seconds
+        :return: the answer of the worker (see `work()`)
+        """
+        deadline = time.monotonic() + timeout
+        if not self.wait(timeout):
+            raise TimeoutError
+        self.conn.send(request)
+        if not self.conn.poll(max(deadline - time.monotonic(), 0)):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def stop(self):
+        """
+        kill the worker process
+        """
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Overloaded(Exception):
+    """
+    raised when the request queue of a `WorkerPool` is full
+    """
+
+
+class WorkerPool:
+    """
+    a pool of warmed up worker processes, with a queue of limited size
+    for the requests waiting for a free worker.
+
+    :param workers: the number of worker processes. 0 uses one process per processor
+    :param queue_size: the maximum number of requests waiting for a worker
+    :param timeout: the maximum time to answer a request, waiting included, in seconds
+    """
+    def __init__(self, workers=0, queue_size=64, timeout=10.0):
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.workers = [Worker() for _ in range(workers or os.cpu_count() or 1)]
+        for worker in self.workers:
+            worker.wait()
+        self.idle = list(self.workers)
+        self.waiting = 0  # the number of requests waiting for a worker
+        self.restarts = 0  # the number of workers killed and replaced
+        self.condition = threading.Condition()
+
+    def convert(self, options: tuple, text: str):
+        """
+        convert a markdown string on a worker
+        :param options: the options of the conversion (see `work()`)
+        :param text: the markdown
+        :return: the answer of the worker (see `work()`)
+        :raises Overloaded: if the queue is full
+        :raises TimeoutError: if the request takes more than the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            if not self.idle and self.waiting >= self.queue_size:
+                raise Overloaded
+            self.waiting += 1
+            try:
+                while not self.idle:
+                    if not self.condition.wait(deadline - time.monotonic()) and not self.idle:
+                        raise TimeoutError
+                worker = self.idle.pop()
+            finally:
+                self.waiting -= 1
+        try:
+            return worker.convert((options, text), max(deadline - time.monotonic(), 0))
+        except TimeoutError:
+            if worker.ready:  # else, the worker was still warming up and the request wasn't sent
+                worker = self.restart(worker)
+            raise
+        except (EOFError, OSError):
+            worker = self.restart(worker)
+            return 500, "ERROR - the worker converting the document has stopped", []
+        finally:
+            with self.condition:
+                self.idle.append(worker)
+                self.condition.notify()
+
+    def restart(self, worker: Worker):
+        """
+        kill a worker that is stuck or dead and replace it. the new worker
+        warms up while the next request is sent to it.
+        :param worker: the worker to replace
+        :return: the new worker
+        """
+        worker.stop()
+        new = Worker()
+        with self.condition:
+            self.workers[self.workers.index(worker)] = new
+            self.restarts += 1
+        return new
+
+    @property
+    def busy(self):
+        """
+        :return: the number of workers converting a request
+        """
+        return len(self.workers) - len(self.idle)
+
+    def close(self):
+        """
+        stop all the workers
+        """
+        for worker in self.workers:
+            worker.stop()
+
+
+class Metrics:
+    """
+    the request counts and the latency histogram of the conversions
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # (endpoint, http status): count
+        self.buckets = [0] * len(buckets)  # the number of conversions faster than each bucket
+        self.total = 0  # the total time of the conversions, in seconds
+        self.count = 0  # the number of conversions
+
+    def observe(self, endpoint: str, status: int, elapsed=None):
+        """
+        record a request
+        :param endpoint: the path of the request
+        :param status: the http status of the answer
+        :param elapsed: the time to answer a conversion, in seconds
+        """
+        with self.lock:
+            self.requests[endpoint, status] = self.requests.get((endpoint, status), 0) + 1
+            if elapsed is not None:
+                self.total += elapsed
+                self.count += 1
+                for i, bound in enumerate(buckets):
+                    if elapsed <= bound:
+                        self.buckets[i] += 1
+
+    def render(self, pool: WorkerPool):
+        """
+        :param pool: the worker pool, to report its state
+        :return: the metrics, in the prometheus text format
+        """
+        with self.lock:
+            lines = ["# HELP md2tex_requests_total the number of requests, by endpoint and http status",
+                     "# TYPE md2tex_requests_total counter"]
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'md2tex_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines += ["# HELP md2tex_request_duration_seconds the time to answer a conversion request",
+                      "# TYPE md2tex_request_duration_seconds histogram"]
+            for bound, count in zip(buckets, self.buckets):
+                lines.append(f'md2tex_request_duration_seconds_bucket{{le="{bound}"}} {count}')
+            lines += [f'md2tex_request_duration_seconds_bucket{{le="+Inf"}} {self.count}',
+                      f"md2tex_request_duration_seconds_sum {self.total}",
+                      f"md2tex_request_duration_seconds_count {self.count}"]
+        lines += ["# HELP md2tex_queue_depth the number of requests waiting for a worker",
+                  "# TYPE md2tex_queue_depth gauge",
+                  f"md2tex_queue_depth {pool.waiting}",
+                  "# HELP md2tex_workers the number of worker processes",
+                  "# TYPE md2tex_workers gauge",
+                  f"md2tex_workers {len(pool.workers)}",
+                  "# HELP md2tex_workers_busy the number of workers converting a request",
+                  "# TYPE md2tex_workers_busy gauge",
+                  f"md2tex_workers_busy {pool.busy}",
+                  "# HELP md2tex_worker_restarts_total the number of workers killed after a timeout",
+                  "# TYPE md2tex_worker_restarts_total counter",
+                  f"md2tex_worker_restarts_total {pool.restarts}"]
+        return "\n".join(lines) + "\n"
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    the http server: each request is read in a thread and converted by the worker pool.
+
+    :param address: the `(host, port)` to listen on
+    :param pool: the `WorkerPool`
+    :param templates: a dict mapping the name of each TeX template to its path
+    :param max_size: the maximum size of a markdown document, in bytes
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, pool: WorkerPool, templates: dict, max_size=2 ** 24):
+        super().__init__(address, ConversionHandler)
+        self.pool = pool
+        self.templates = templates
+        self.max_size = max_size
+        self.metrics = Metrics()
+
+    @staticmethod
+    def templates_dir(directory=None):
+        """
+        find the TeX templates that requests can use: `default` is the default
+        template, and the `.tex` files of a directory are used by their name
+        without extension. all templates are read once, to check them.
+        :param directory: the directory of the templates, or None
+        :return: a dict mapping the name of each template to its path
+        """
+        templates = {"default": default_template}
+        if directory is not None:
+            if not os.path.isdir(directory):
+                raise InputException("not_template", directory)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".tex"):
+                    templates[name[:-len(".tex")]] = os.path.join(directory, name)
+        for path in templates.values():
+            Converter.template(path)
+        return templates
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """
+    the requests of the server:
+    - `POST /convert`: the body is the markdown, in utf-8. the options are given in the
+      query string: `french_quote`, `unnumbered` (`1` or `true`), `document_class`, `engine`
+      and `template` (the name of a template, to build a complete TeX document). the answer
+      is the TeX, with a `X-MD2TeX-Warning` header for each warning.
+    - `GET /metrics`: the metrics of the server (see `Metrics`)
+    """
+    protocol_version = "HTTP/1.1"  # keep the connections alive
+    disable_nagle_algorithm = True  # the headers and the body are written separately: don't delay the body
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path != "/metrics":
+            self.answer(404, f"ERROR - unknown endpoint `{path}`")
+            self.server.metrics.observe("other", 404)
+            return
+        self.answer(200, self.server.metrics.render(self.server.pool), "text/plain; version=0.0.4")
+        self.server.metrics.observe(path, 200)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path != "/convert":
+            self.answer(404, f"ERROR - unknown endpoint `{url.path}`")
+            self.server.metrics.observe("other", 404)
+            return
+        status, body, diagnostics = self.convert(url.query)
+        self.answer(status, body, "application/x-tex" if status == 200 else "text/plain", diagnostics)
+        self.server.metrics.observe("/convert", status, time.perf_counter() - start)
+
+    def convert(self, query: str):
+        """
+        read the markdown and the options of a conversion request and convert it
+        :param query: the query string of the request
+        :return: `(http status, TeX or error message, diagnostics)`
+        """
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.close_connection = True  # the end of the body isn't known
+            return 411, "ERROR - the request has no `Content-Length` header", []
+        try:
+            size = int(length)
+        except ValueError:
+            size = -1
+        if size < 0:
+            self.close_connection = True
+            return 400, f"ERROR - invalid `Content-Length` header: `{length}`", []
+        if size > self.server.max_size:
+            self.close_connection = True  # the body isn't read
+            return 413, f"ERROR - the document is larger than {self.server.max_size} bytes", []
+        try:
+            text = self.rfile.read(size).decode("utf-8")
+        except UnicodeDecodeError:
+            return 400, "ERROR - the document is not encoded in utf-8", []
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        template = params.get("template")
+        if template is not None and template not in self.server.templates:
+            return 400, f"ERROR - unknown template `{template}`", []
+        options = (
+            params.get("french_quote", "").lower() in ("1", "true"),
+            params.get("unnumbered", "").lower() in ("1", "true"),
+            params.get("document_class", "article"),
+            params.get("engine", "regex"),
+            None if template is None else self.server.templates[template],
+        )
+        try:
+            return self.server.pool.convert(options, text)
+        except Overloaded:
+            return 503, "ERROR - too many requests are waiting. try again later", []
+        except TimeoutError:
+            return 504, f"ERROR - the conversion took more than {self.server.pool.timeout}s", []
+
+    def answer(self, status: int, body: str, content_type="text/plain", diagnostics=()):
+        """
+        send an answer
+        :param status: the http status
+        :param body: the body of the answer
+        :param content_type: its content type, without the charset
+        :param diagnostics: `(warning key, value)` tuples to send as warnings (see `Warnings`)
+        """
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, val in diagnostics:
+            self.send_header("X-MD2TeX-Warning", Warnings.logs[key].replace("@@TOKEN@@", val))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """
+        the requests aren't logged: they are counted in `/metrics`
+        """
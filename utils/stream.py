@@ -0,0 +1,375 @@
+import re
+from bisect import bisect_right
+
+from .converters import MDReference, MDCleaner, MDCode
+from .buffer import SpanBuffer
+from .scanners import LineScanner, ulist_re, olist_re, mdfndef_re, listing_open_re, listing_close_re
+from .pipeline import engines
+from .tree import MDParser, Fence, FootnoteDef, fence_re
+
+
+# ---------------------------------------------------------------
+# streaming conversion: the markdown is read line by line, split
+# in chunks at block boundaries, and each chunk is converted and
+# written as soon as it is complete, so that the memory used
+# depends on the size of a chunk and not on the size of the file.
+#
+# a chunk ends before an empty line that is outside of a code
+# block (lists and footnotes end at empty lines), and never before
+# a header: header regexes eat the empty lines before them, and
+# the footnotes between them, which are deleted.
+# footnotes are the only thing that links chunks together: the
+# footnotes of a file can be indexed before the conversion
+# (`MDStream.index()`); if they aren't (stdin), the chunks with
+# pointers to a footnote that hasn't been read yet are kept in
+# memory until that footnote is found.
+#
+# the TeX is the same as the TeX of the whole document, except
+# for the footnotes that the regex engine finds in a list item
+# other than the last one (see `mask_lists()`): their TeX contains
+# the TeX of the list, and the pointers from other chunks are
+# deleted.
+# ---------------------------------------------------------------
+
+
+chunk_size = 2 ** 16  # minimum size of a chunk, in characters
+pointer_re = re.compile(r"\[\^(\d+)\](?![ \t]*:)")
+blank_re = re.compile(r"^[ \t]+(?=\n)", flags=re.M)  # a line of spaces, which the regex engine empties
+ulist_item_re = re.compile(r"[ \t]*-")  # an unordered list item, after the first one (see `LineScanner.join_items()`)
+
+
+class MDStream:
+    """
+    convert markdown chunks and clean the TeX across chunk boundaries.
+
+    :param engine: the name of the conversion engine (see `pipeline.py`)
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+    :param unnumbered: translate headers as unnumbered LaTeX headers
+    :param document_class: the class of the tex document: `article` or `book`
+    :param footnotes: the footnotes of the document, indexed by `MDStream.index()`.
+                      if None, they are indexed while the document is read.
+    :param profile: a `Profile` to record the stages of the conversion of each chunk in
+    :param highlighter: a `Highlighter` to colour the code with (see `highlight.py`), or None to use `minted`
+    """
+    def __init__(self, engine, french_quote=False, unnumbered=False, document_class="article",
+                 footnotes=None, profile=None, highlighter=None):
+        self.engine = engine
+        self.options = (french_quote, unnumbered, document_class)
+        self.footnotes = {} if footnotes is None else footnotes  # footnote key: markdown footnote
+        self.indexed = footnotes is not None  # all the footnotes are known: the chunks never wait
+        self.pointers = []  # keys of all pointers read
+        self.definitions = []  # keys of all footnotes read
+        self.pending = []  # chunks waiting for a footnote
+        self.missing = set()  # keys of the footnotes that the pending chunks wait for
+        self.first = True  # no chunk has been converted yet
+        self.tail = ""  # converted TeX that can't be cleaned yet
+        self.profile = profile
+        self.highlighter = highlighter
+
+    @staticmethod
+    def chunks(lines, size=chunk_size):
+        """
+        split a markdown document in chunks that can be converted separately.
+        :param lines: an iterable of lines (a file handle...)
+        :param size: the minimum size of a chunk
+        :return: a generator of chunks
+        """
+        buffer = []
+        length = 0
+        backticks = 0  # number of "```" read: code blocks are closed when it is even
+        fenced = False  # inside a code block opened at the beginning of a line
+        footnote = False  # inside a footnote
+        cuts = []  # index of the first line of each empty line run where a chunk could end
+        for line in lines:
+            if line.strip(" \t") in ("\n", ""):
+                footnote = False
+                if buffer and not buffer[-1].isspace() and backticks % 2 == 0 and not fenced:
+                    cuts.append(len(buffer))
+            else:
+                # footnotes and footnote pointers are deleted if they point to nothing:
+                # the chunk can only end before the next line that will remain. a footnote
+                # runs until an empty line, as in the regex engine; the tree engine ends it
+                # at the next block, which only makes some chunks longer
+                footnote = footnote or MDParser.kind(line) == "footnote"
+                if cuts and not footnote and pointer_re.sub("", line).strip():
+                    if length >= size and not pointer_re.sub("", line).lstrip().startswith("#"):
+                        # this line decides every cut before it: a chunk ends at a cut if it is long
+                        # enough once this line is read, and the next chunk is decided from that cut
+                        # in the same way, so that the chunks are those of a scan that starts at any
+                        # chunk (see `MDIncremental.split()`)
+                        first = 0
+                        for cut in cuts:
+                            if length < size:
+                                break
+                            chunk = "".join(buffer[first:cut])
+                            yield chunk
+                            length -= len(chunk)
+                            first = cut
+                        buffer = buffer[first:]
+                    cuts = []
+                backticks, fenced = MDStream.fence(line, backticks, fenced)
+            buffer.append(line)
+            length += len(line)
+        if buffer:
+            yield "".join(buffer)
+
+    @staticmethod
+    def decision(lines):
+        """
+        find the lines that `chunks()` reads to decide wether a chunk ends before an empty line:
+        the empty lines, footnotes and footnote pointers up to the next line that will remain.
+        :param lines: an iterable of lines, beginning with the empty line
+        :return: the length of these lines, the deciding line included
+        """
+        length = 0
+        footnote = False
+        for line in lines:
+            length += len(line)
+            if line.strip(" \t") in ("\n", ""):
+                footnote = False
+            else:
+                footnote = footnote or MDParser.kind(line) == "footnote"
+                if not footnote and pointer_re.sub("", line).strip():
+                    break
+        return length
+
+    @staticmethod
+    def fence(line: str, backticks: int, fenced: bool):
+        """
+        update the state of the code blocks after a line. the regex engine opens
+        and closes code blocks at any "```"; the tree engine only opens them at
+        the beginning of a line. a line is outside of a code block if it is for
+        both engines.
+        :param line: a line of the markdown file
+        :param backticks: the number of "```" read before this line
+        :param fenced: wether the line is inside a code block opened at the beginning of a line
+        :return: the updated `(backticks, fenced)`
+        """
+        if "```" in line:
+            backticks += line.count("```")
+            if fenced:
+                fenced = False
+            elif fence_re.match(line):
+                fenced = "```" not in line[line.index("```") + 3:]
+        return backticks, fenced
+
+    @staticmethod
+    def footnotes(chunk: str, engine="regex"):
+        """
+        find the footnotes of a chunk and the pointers outside of these footnotes,
+        as the conversion engine sees them: code blocks are ignored, and a footnote
+        runs until the next line that opens another block (see `MDParser`), or, for
+        the regex engine, until an empty line once the code and the lists are
+        translated (see `MDReference.footnote()` and `mask()`).
+        :param chunk: a markdown chunk
+        :param engine: the name of the conversion engine
+        :return: the pointer keys and a list of `(key, markdown footnote)`
+        """
+        if "[^" not in chunk:
+            return [], []
+        pointers = []
+        definitions = []
+        if engine == "tree":
+            for block in MDParser.parse(chunk).blocks:
+                if isinstance(block, FootnoteDef):
+                    definitions.append((block.key, "".join(block.lines)))
+                elif not isinstance(block, Fence):
+                    pointers.extend(pointer_re.findall("".join(block.lines)))
+            return pointers, definitions
+        text = MDStream.mask(chunk)
+        blocks, items = MDStream.mask_lists(text)
+        pos = 0
+        ends = [0] + [end for start, end in items] + [len(blocks)]  # the items are followed by an empty line
+        for first, last in zip(ends, ends[1:]):
+            for match, end in LineScanner.footnotes(blocks[first:last], mdfndef_re):
+                start, end = first + match.start(), first + end
+                pointers.extend(pointer_re.findall(text, pos, start))
+                note = chunk[start:end]
+                i = bisect_right(items, (start, len(chunk))) - 1
+                if i >= 0 and start < items[i][1]:  # in the last item of a list, whose lines are joined
+                    note = "".join(" " if c == "\n" and b == " " else c for b, c in zip(blocks[start:end], note))
+                definitions.append((match[1], note))
+                pos = end
+        pointers.extend(pointer_re.findall(text, pos))
+        return pointers, definitions
+
+    @staticmethod
+    def mask(chunk: str):
+        """
+        rebuild the lines of a chunk as the regex engine sees them when it translates the
+        footnotes, with the same length, so that the offsets are those of the chunk:
+        - a block of code becomes a single line (`@@CODETOKEN@@`) beginning on a new line,
+          followed by an empty line for a `lstlisting` (see `MDCode.block_code()`)
+        - the `listing` and `lstlisting` envs written in the markdown become a single line
+        - the lines of spaces become empty lines (see `MDCleaner.prepare_markdown()`)
+        :param chunk: a markdown chunk
+        :return: the masked chunk
+        """
+        buffer = SpanBuffer(chunk)
+        for start, end in LineScanner.delimited(chunk):
+            code = MDCode.block_code(chunk[start:end])
+            if code != chunk[start:end]:  # an empty block of code is kept as is
+                after = "\n" if code[code.rfind("\n") + 1:].isspace() else "@"
+                buffer.splice(start, end, "\n" + "@" * (end - start - 2) + after)
+        chunk = buffer.join()
+        buffer = SpanBuffer(chunk)
+        for start, end in LineScanner.delimited(chunk, listing_open_re, listing_close_re):
+            buffer.splice(start, end, "@" * (end - start))
+        return blank_re.sub(lambda m: "\n" * len(m[0]), buffer.join())
+
+    @staticmethod
+    def mask_lists(text: str):
+        """
+        mask the lists of a chunk masked by `mask()` as `MDList.environment()` translates them:
+        a list begins after an empty line and its items are joined in lines. a footnote in the
+        last item of a list ends with the item, which is followed by an empty line if it isn't
+        nested; a footnote in another item runs over the TeX of the items after it, which can't
+        be written in markdown: these items are masked, and their footnotes are lost for the
+        other chunks (see `inject()`).
+        :param text: a chunk masked by `mask()`
+        :return: the masked chunk, with the same length, and the `(start, end)` of the last
+                 items that are kept, on a single line
+        """
+        items = []
+        for item, ordered in ((ulist_item_re, False), (olist_re, True)):
+            buffer = SpanBuffer(text)
+            for start, end in LineScanner.lists(text, ulist_re if item is ulist_item_re else item, ordered):
+                last = start  # the beginning of the last item
+                for match in re.finditer(r"\n[ \t]*", text[start:end]):
+                    if match.end() < end - start and item.match(text, start + match.start() + 1):
+                        last = start + match.start() + 1
+                stop = end - text.endswith("\n", start, end)
+                if re.match(r"[ \t]*", text[last:stop]).end() != re.match(r"[ \t]*", text[start:stop]).end() \
+                        or mdfndef_re.search(text, start, last):  # the last item is nested, or in a footnote
+                    buffer.splice(start, end, "\n" + "@" * (end - start - 1))
+                    continue
+                lines = text[last:stop].replace("\n", " ")  # see `LineScanner.join_items()`
+                head = "\n" + "@" * (last - start - 2) + "\n" if last > start else "\n"
+                buffer.splice(start, end, head + lines[len(head) - last + start:] + text[stop:end])
+                items.append((max(last, start + 1), end))
+            text = buffer.join()
+        return text, sorted(items)
+
+    @staticmethod
+    def index(lines, engine="regex", size=chunk_size):
+        """
+        index the footnotes of a document; the first footnote with a key is kept.
+        :param lines: an iterable of lines (a file handle...)
+        :param engine: the name of the conversion engine
+        :param size: the minimum size of a chunk
+        :return: a dict mapping footnote keys to the markdown footnote
+        """
+        footnotes = {}
+        for chunk in MDStream.chunks(lines, size):
+            for key, text in MDStream.footnotes(chunk, engine)[1]:
+                footnotes.setdefault(key, text)
+        return footnotes
+
+    def feed(self, chunk: str, found=None):
+        """
+        add a chunk to the conversion
+        :param chunk: a markdown chunk built by `chunks()`
+        :param found: the footnotes of the chunk, if they are already known (see `footnotes()`)
+        :return: the TeX that is ready to be written
+        """
+        pointers, definitions = MDStream.footnotes(chunk, self.engine) if found is None else found
+        self.pointers.extend(pointers)
+        for key, text in definitions:
+            self.definitions.append(key)
+            self.footnotes.setdefault(key, text)
+        self.pending.append((chunk, pointers, definitions))
+        if not self.indexed:
+            self.missing.update(pointers)
+            self.missing.difference_update(self.footnotes)
+        if self.missing:
+            return ""  # wait for the footnotes
+        return self.flush()
+
+    def close(self):
+        """
+        convert the remaining chunks and clean the end of the TeX
+        :return: the last TeX to write
+        """
+        tex = self.flush() if self.pending else ""
+        tex += MDCleaner.clean_spaces(self.tail)
+        self.tail = ""
+        return tex
+
+    def diagnose(self):
+        """
+        :return: the loose and duplicate footnotes of the document (see `MDReference.diagnose()`)
+        """
+        return MDReference.diagnose(self.pointers, self.definitions)
+
+    def flush(self):
+        """
+        convert the pending chunks. the footnotes that these chunks point to
+        but that are in other chunks are added to the markdown; they must be
+        separated from the chunks by an empty line.
+        :return: the TeX that is ready to be written
+        """
+        chunk = MDStream.inject(
+            "".join(c for c, p, d in self.pending),
+            [k for c, p, d in self.pending for k in p],
+            [f for c, p, d in self.pending for f in d],
+            self.footnotes,
+            self.first,
+            self.engine
+        )
+        self.pending = []
+        self.first = False
+        return self.clean(engines[self.engine](chunk, *self.options, clean=False, profile=self.profile,
+                                               highlighter=self.highlighter))
+
+    @staticmethod
+    def inject(chunk: str, pointers: list, definitions: list, footnotes: dict, first: bool, engine="regex"):
+        """
+        add to a chunk the footnotes that it points to but that are in other chunks
+        :param chunk: a markdown chunk
+        :param pointers: the pointer keys of the chunk (see `footnotes()`)
+        :param definitions: the `(key, markdown footnote)` of the chunk
+        :param footnotes: the footnotes of the document (first footnote of each key)
+        :param first: wether the chunk is the first of the document
+        :param engine: the name of the conversion engine
+        :return: the chunk, with the footnotes
+        """
+        local = {}  # first footnote of each key in the chunk
+        for key, text in definitions:
+            local.setdefault(key, text)
+        pointers = dict.fromkeys(pointers)
+        notes = [footnotes[k] for k in pointers if k in footnotes and local.get(k) != footnotes[k]]
+        notes = "".join(n if n.endswith("\n") else n + "\n" for n in notes)
+        if notes and (first or engine == "regex" and notes.count("```") % 2):
+            # the next chunk begins with an empty line. in the regex engine, a footnote with an unclosed
+            # "```" is at the end of the document: it is added after the chunk, which isn't the last one,
+            # so that it doesn't close a block of the chunk
+            chunk = chunk + "\n" + notes
+        elif notes:
+            chunk = notes + chunk  # this chunk begins with an empty line
+        return chunk
+
+    def clean(self, tex: str):
+        """
+        clean the spaces of the TeX up to the last position where the cleaning
+        regexes of `MDCleaner.clean_spaces()` can't overlap: the beginning of
+        a line that doesn't start with a space, a `}` or an `\\end{`, and that
+        doesn't follow an opening `{`.
+        :param tex: the TeX of a chunk, before the cleaning
+        :return: the cleaned TeX
+        """
+        tex = self.tail + tex
+        pos = len(tex) - 6
+        while pos > 0:
+            pos = tex.rfind("\n", 0, pos)
+            if pos < 0:
+                break
+            start = pos + 1
+            if not tex[start].isspace() and tex[start] != "}" and not tex.startswith("\\end{", start):
+                end = pos
+                while end > 0 and tex[end - 1].isspace():
+                    end -= 1
+                if tex[end - 1:end] != "{":
+                    self.tail = tex[start:]
+                    return MDCleaner.clean_spaces(tex[:start])
+        self.tail = tex
+        return ""
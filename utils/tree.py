@@ -0,0 +1,385 @@
+import re
+
+from .minted import languages
+from .converters import MDSimple, MDHeader, MDQuote, MDCleaner, MDList
+
+
+# ---------------------------------------------------------------
+# tree based conversion from markdown to latex.
+#
+# `MDParser` scans the markdown once, line by line, and builds a
+# small block-level tree; `TexEmitter` walks that tree and writes
+# the LaTeX for each block. inline syntax is handled on each block
+# with the same rules as `converters.py`, so that both engines
+# produce the same TeX for the same document.
+#
+# known differences with the regex backend (`converters.py`):
+# - fences are only opened by a line beginning with "```"; the
+#   regex backend also opens them in the middle of a line.
+# - block quotes are rendered as `quotation` envs. in the regex
+#   backend, `>` is escaped before `MDQuote.block_quote()` runs,
+#   so quotes end up as `\textgreater{}`.
+# - a footnote definition always starts a new block, even when it
+#   directly follows another definition or a list item.
+# ---------------------------------------------------------------
+
+
+line_re = re.compile(r"[^\n]*\n|[^\n]+")
+blank_re = re.compile(r"^[ \t]*\n", flags=re.M)
+fence_re = re.compile(r"^[ \t]*```")
+header_re = re.compile(r"^\s*#+(?![{}\\>#$%~_^])")
+fndef_re = re.compile(r"^[ \t]*\[\^(\d+)\]:")
+ulist_re = re.compile(r"^[ \t]*-(?!-{2,})")
+olist_re = re.compile(r"^[ \t]*\d+\.")
+pointer_re = re.compile(r"\[\\\^(\d+)\](?![ \t]*:)")
+
+
+class Block:
+    """
+    base class for all the nodes of the document tree.
+    a block holds the markdown lines it was built from.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+
+
+class Blank(Block):
+    """
+    one or several empty lines
+    """
+
+
+class Paragraph(Block):
+    """
+    a run of text lines
+    """
+
+
+class Header(Block):
+    """
+    a single header line
+    """
+
+
+class Quote(Block):
+    """
+    consecutive lines beginning with `>`
+    """
+
+
+class ListBlock(Block):
+    """
+    a markdown list and its continuation lines
+    :param ordered: True for a numbered list, False for a `-` list
+    """
+    def __init__(self, lines, ordered):
+        super().__init__(lines)
+        self.ordered = ordered
+
+
+class Fence(Block):
+    """
+    a block of code delimited by "```"
+    :param lang: the language given after the opening "```"
+    :param body: the code, with the line that opens the fence removed
+    :param trailer: the characters after the closing "```"
+    :param prefix: the characters before the opening "```"
+    """
+    def __init__(self, lines, lang, body, trailer, prefix=""):
+        super().__init__(lines)
+        self.lang = lang
+        self.body = body
+        self.trailer = trailer
+        self.prefix = prefix
+
+
+class FootnoteDef(Block):
+    """
+    a footnote definition (`[^1]: ...`) and its continuation lines
+    """
+    def __init__(self, lines, key):
+        super().__init__(lines)
+        self.key = key
+
+
+class Document:
+    """
+    the root of the tree: the top-level blocks, in order, an index of the
+    footnote definitions (the first definition of a key is kept) and the
+    keys of all footnote definitions, in order
+    """
+    def __init__(self):
+        self.blocks = []
+        self.footnotes = {}
+        self.definitions = []
+
+
+class MDParser:
+    """
+    build a `Document` from markdown in a single scan over its lines.
+
+    contains
+    --------
+    parse(): split the markdown into a tree of blocks
+    """
+    @staticmethod
+    def kind(line: str):
+        """
+        find the kind of block that a line opens.
+        :param line: a single line of the markdown file
+        :return: the name of the block kind
+        """
+        if fence_re.match(line):
+            return "fence"
+        elif line.strip(" \t") in ("\n", ""):
+            return "blank"
+        elif header_re.match(line):
+            return "header"
+        elif fndef_re.match(line):
+            return "footnote"
+        elif line.startswith(">"):
+            return "quote"
+        elif ulist_re.match(line) and line.endswith("\n"):
+            return "ulist"
+        elif olist_re.match(line):
+            return "olist"
+        return "text"
+
+    @staticmethod
+    def parse(string: str):
+        """
+        scan the markdown once and build the document tree.
+        :param string: the string representation of the markdown file
+        :return: a `Document`
+        """
+        doc = Document()
+        lines = line_re.findall(string)
+        kinds = [MDParser.kind(line) for line in lines]
+        i = 0
+        while i < len(lines):
+            kind = kinds[i]
+            start = i
+            i += 1
+            if kind == "fence":
+                # the fence is closed by the next "```", possibly on the opening line
+                opening = lines[start]
+                head = opening[opening.index("```") + 3:]
+                if "```" in head:
+                    close, j = head.index("```"), start
+                    code = head[:close]
+                    trailer = head[close + 3:]
+                else:
+                    j = start + 1
+                    while j < len(lines) and "```" not in lines[j]:
+                        j += 1
+                    if j == len(lines):  # unclosed fence: the lines are plain text
+                        doc.blocks.append(Paragraph([opening]))
+                        continue
+                    close = lines[j].index("```")
+                    code = head + "".join(lines[start + 1:j]) + lines[j][:close]
+                    trailer = lines[j][close + 3:]
+                    i = j + 1
+                lang = code.split("\n")[0].strip()
+                body = code.split("\n", 1)[1] if "\n" in code else ""
+                body = body or "```" + code + "```"  # an empty code block is kept as is
+                doc.blocks.append(Fence(lines[start:i], lang, body, trailer, opening[:opening.index("```")]))
+            elif kind == "blank":
+                while i < len(lines) and kinds[i] == "blank":
+                    i += 1
+                doc.blocks.append(Blank(lines[start:i]))
+            elif kind == "header":
+                doc.blocks.append(Header(lines[start:i]))
+            elif kind == "footnote":
+                while i < len(lines) and kinds[i] in ("text", "header", "quote"):
+                    i += 1
+                key = fndef_re.match(lines[start])[1]
+                block = FootnoteDef(lines[start:i], key)
+                doc.footnotes.setdefault(key, block)
+                doc.definitions.append(key)
+                doc.blocks.append(block)
+            elif kind == "quote":
+                while i < len(lines) and kinds[i] == "quote":
+                    i += 1
+                doc.blocks.append(Quote(lines[start:i]))
+            elif kind in ("ulist", "olist"):
+                # a list runs until the next empty line; unordered lists
+                # take precedence over ordered ones
+                stop = ("blank", "fence", "footnote") if kind == "ulist" else ("blank", "fence", "footnote", "ulist")
+                while i < len(lines) and kinds[i] not in stop and (kind == "olist" or lines[i].endswith("\n")):
+                    i += 1
+                doc.blocks.append(ListBlock(lines[start:i], ordered=kind == "olist"))
+            else:
+                while i < len(lines) and kinds[i] == "text":
+                    i += 1
+                doc.blocks.append(Paragraph(lines[start:i]))
+        return doc
+
+
+class TexEmitter:
+    """
+    walk a `Document` and write its LaTeX representation.
+
+    :param french_quote: translate the quotes as french quotes (\\enquote{})
+                         or anglo-saxon quotes (``'')
+    :param unnumbered: flag argument indicating that the LaTeX headers should be unnumbered
+    :param document_class: the class to convert the document to
+    :param highlighter: a `Highlighter` to colour the code with, or None to use `minted`
+    """
+    def __init__(self, french_quote=False, unnumbered=False, document_class="article", highlighter=None):
+        self.french_quote = french_quote
+        self.unnumbered = unnumbered
+        self.document_class = document_class
+        self.highlighter = highlighter
+        self.notes = {}
+        self.pointers = []  # the keys of the footnote pointers found in the text
+
+    def emit(self, doc: Document, clean=True):
+        """
+        build the TeX document.
+        :param doc: the document tree built by `MDParser.parse()`
+        :param clean: wether to clean the spaces of the TeX (see `MDCleaner.clean_spaces()`)
+        :return: the string representation of the TeX document
+        """
+        self.notes = {k: self.footnote(v) for k, v in doc.footnotes.items()}
+        self.pointers = []
+        out = []
+        prev = None  # the pass of the previous block, if it is a header
+        for block in doc.blocks:
+            if isinstance(block, Blank):
+                out.append("".join("\n\n" if line.endswith("\n") else line for line in block.lines))
+                continue
+            elif isinstance(block, Fence):
+                out.append(self.fence(block))
+            elif isinstance(block, Header):
+                escaped = MDQuote.inline_quote(MDCleaner.escape(block.lines[0]), self.french_quote)
+                line = self.header(escaped)
+                if line is None:  # the header syntax was broken by quotes or footnotes
+                    out.append(MDSimple.convert(pointer_re.sub(self.pointer, escaped)))
+                else:
+                    level = len(re.match(r"\s*(#+)", block.lines[0])[1])
+                    current = min(level, 4 if self.document_class == "article" else 5)
+                    self.trim(out, prev is not None and prev >= current)
+                    out.append(line)
+                    prev = current
+                    continue
+            elif isinstance(block, ListBlock):
+                out.append(self.inline(self.lists(block), escape=False))
+            elif isinstance(block, Quote):
+                out.append(self.quote(block))
+            elif isinstance(block, Paragraph):
+                out.append(self.inline("".join(block.lines)))
+            elif isinstance(block, FootnoteDef):
+                continue  # footnote definitions are moved to their pointers
+            prev = None
+        return MDCleaner.clean_tex("".join(out), {}, clean)
+
+    def inline(self, string: str, escape=True):
+        """
+        convert the inline syntax of a block: escape special characters,
+        translate quotes, replace footnote pointers and translate bold, links...
+        :param string: the markdown text of a block
+        :param escape: wether the text still needs to be escaped
+        :return: the TeX text of the block
+        """
+        if escape:
+            string = MDQuote.inline_quote(MDCleaner.escape(string), self.french_quote)
+        string = pointer_re.sub(self.pointer, string)
+        return MDSimple.convert(string)
+
+    def pointer(self, match: re.Match):
+        """
+        replace a footnote pointer by its `\\footnote{}`
+        :param match: the match of `pointer_re`
+        :return: the footnote, or an empty string if the pointer points to nothing
+        """
+        self.pointers.append(match[1])
+        return self.notes.get(match[1], "")
+
+    def footnote(self, block: FootnoteDef):
+        """
+        build the `\\footnote{}` for a footnote definition
+        :param block: the footnote definition
+        :return: the `\\footnote{}`, or an empty string if the note is empty
+        """
+        text = MDQuote.inline_quote(MDCleaner.escape("".join(block.lines)), self.french_quote)
+        text = re.sub(r"\s+", " ", text.replace(r"[\^%s]:" % block.key, ""))
+        text = pointer_re.sub("", text)  # no nested footnotes
+        return r"\footnote{" + text + "}" if text.strip() else ""
+
+    def header(self, escaped: str):
+        """
+        translate a header line
+        :param escaped: the line of the header, escaped and with its quotes translated
+        :return: the TeX header, or None if the line is not a header once
+                 its quotes and footnotes are translated
+        """
+        line = pointer_re.sub(self.pointer, escaped)
+        if not re.match(r"\s*(\\#)+(?!\\)", line):
+            return None
+        return MDSimple.convert(MDHeader.convert(line, self.unnumbered, self.document_class))
+
+    @staticmethod
+    def trim(out: list, blank_only: bool):
+        """
+        a header absorbs the empty lines above it: strip the whitespace
+        at the end of `out`, except for the first newline.
+
+        `MDHeader.convert()` translates one header level after the other;
+        a header that follows another header translated in the same pass or
+        in a later pass can only absorb the empty lines between them.
+        :param out: the list of TeX strings written so far
+        :param blank_only: only remove the empty lines
+        """
+        tail = ""
+        while out and not out[-1].strip():
+            tail = out.pop() + tail
+        if out and not blank_only:
+            last = out.pop()
+            body = last.rstrip()
+            tail = last[len(body):] + tail
+            out.append(body)
+            if "\n" in tail:
+                out.append(tail[:tail.index("\n") + 1])
+
+    def lists(self, block: ListBlock):
+        """
+        translate a list into a latex `itemize` or `enumerate` environment,
+        in the same way as `MDList.unordered_l()` and `MDList.ordered_l()`
+        :param block: the markdown list
+        :return: the TeX list, with its inline syntax escaped but not yet converted
+        """
+        lstext = MDQuote.inline_quote(MDCleaner.escape("".join(block.lines)), self.french_quote)
+        return MDList.environment(lstext, block.ordered)
+
+    def quote(self, block: Quote):
+        """
+        translate a block quote into a latex `quotation` environment
+        :param block: the markdown quote
+        :return: the TeX quote
+        """
+        body = "".join(re.sub(r"^>[ \t]?", "", line) for line in block.lines)
+        if not body.endswith("\n"):
+            body += "\n"
+        return "\\begin{quotation}\n" + self.inline(body) + "\\end{quotation}\n"
+
+    def fence(self, block: Fence):
+        """
+        translate a block of code into a minted or listing block,
+        in the same way as `MDCode.block_code()`
+        :param block: the fenced block of code
+        :return: the TeX code environment
+        """
+        highlighted = None
+        if block.lang in languages and self.highlighter is not None:
+            highlighted = self.highlighter.highlight(block.body, block.lang)
+        if highlighted is not None:
+            env = "\n\\begin{listing}[h!]\n%s\n\\end{listing}" % highlighted
+        elif block.lang in languages and self.highlighter is None:
+            env = "\n\\begin{listing}[h!]\n    \\begin{minted}{%s}\n%s\n    \\end{minted}\n\\end{listing}" \
+                  % (block.lang, block.body)
+        else:
+            code = "".join(block.lines)
+            code = code[code.index("```") + 3:]
+            code = code[:len(code) - len(block.trailer) - 3]
+            env = "\n\\begin{lstlisting}\n%s\n\\end{lstlisting}\n                " % code
+        return blank_re.sub("\n\n", block.prefix + env + block.trailer)
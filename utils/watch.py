@@ -0,0 +1,165 @@
+from bisect import bisect_right
+
+from .converters import MDCleaner, MDReference
+from .pipeline import engines
+from .stream import MDStream
+
+
+# ---------------------------------------------------------------
+# incremental conversion, for the watch mode: a document is split
+# in chunks like in the streaming mode (see `stream.py`), and the
+# TeX of each chunk is kept. when the document changes, only the
+# chunks around the change are split and converted again.
+#
+# the chunks don't depend on the text before them: a chunk always
+# begins in the same state (outside of a code block, a list or a
+# footnote), so splitting the text from the beginning of any chunk
+# gives the same chunks as splitting the whole text. a boundary is
+# decided by the lines after it (see `MDStream.decision()`): the
+# text is split again from the last boundary decided before the
+# change. once a chunk boundary of the new text after the change
+# is also a boundary of the old text, the following chunks are
+# those of the old text.
+# the footnotes are the only thing shared by the chunks: they are
+# indexed again at each change, and a chunk is converted again if
+# the footnotes that it points to have changed.
+# ---------------------------------------------------------------
+
+
+class MDIncremental:
+    """
+    convert the successive versions of a markdown document, converting
+    only the parts that changed since the last version.
+
+    :param engine: the name of the conversion engine (see `pipeline.py`)
+    :param options: the options of the engine: `(french_quote, unnumbered, document_class)`
+    :param size: the minimum size of a chunk, in characters
+    :param highlighter: a `Highlighter` to colour the code with (see `highlight.py`), or None to use `minted`
+    """
+    def __init__(self, engine="regex", options=(False, False, "article"), size=2 ** 12, highlighter=None):
+        self.engine = engine
+        self.options = options
+        self.size = size
+        self.highlighter = highlighter
+        self.text = ""  # the last version of the document
+        self.chunks = []  # the chunks of the last version
+        self.offsets = []  # the position of each chunk in the last version
+        self.notes = []  # the `MDStream.footnotes()` of each chunk
+        self.fragments = {}  # chunk, with its footnotes: TeX of the chunk, before the cleaning
+        self.cleaned = {}  # (uncleaned TeX before the chunk, TeX of the chunk): (clean TeX, TeX left uncleaned)
+
+    @staticmethod
+    def lines(text: str, start: int):
+        """
+        :param text: a markdown document
+        :param start: the position to read from
+        :return: a generator of the lines of the text after `start`
+        """
+        while start < len(text):
+            end = text.find("\n", start) + 1 or len(text)
+            yield text[start:end]
+            start = end
+
+    @staticmethod
+    def common(old: str, new: str):
+        """
+        find the part of two strings that has changed, by bisection:
+        comparing slices is much faster than comparing characters one by one.
+        :param old: the old string
+        :param new: the new string
+        :return: the length of the common prefix and of the common suffix of the strings
+        """
+        lo, hi = 0, min(len(old), len(new))
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old[lo:mid] == new[lo:mid]:
+                lo = mid
+            else:
+                hi = mid - 1
+        prefix = lo
+        lo, hi = 0, min(len(old), len(new)) - prefix  # the suffix doesn't overlap the prefix
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old[len(old) - mid:len(old) - lo] == new[len(new) - mid:len(new) - lo]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return prefix, lo
+
+    def split(self, text: str):
+        """
+        split a new version of the document in chunks, reusing the chunks
+        of the last version that aren't affected by the change
+        :param text: the new version of the document
+        """
+        if not self.chunks:
+            start, k = 0, 0
+        else:
+            prefix, suffix = MDIncremental.common(self.text, text)
+            if prefix == len(self.text) == len(text):
+                return
+            # the beginning of a chunk is decided by the lines after it, up to the next line
+            # that remains (see `MDStream.decision()`), which can be in the following chunks:
+            # the text is split again from the last chunk decided before the change
+            k = bisect_right(self.offsets, prefix) - 1
+            while k > 0 and self.offsets[k] + MDStream.decision(MDIncremental.lines(self.text, self.offsets[k])) \
+                    > prefix:
+                k -= 1
+            start = self.offsets[k]
+            end = len(text) - suffix  # the end of the change in the new text
+            delta = len(text) - len(self.text)
+        chunks, offsets, notes = self.chunks[:k], self.offsets[:k], self.notes[:k]
+        pos = start
+        for chunk in MDStream.chunks(MDIncremental.lines(text, start), self.size):
+            chunks.append(chunk)
+            offsets.append(pos)
+            notes.append(MDStream.footnotes(chunk, self.engine))
+            pos += len(chunk)
+            if self.chunks and pos >= end and pos < len(text):
+                j = bisect_right(self.offsets, pos - delta) - 1
+                if self.offsets[j] == pos - delta:
+                    chunks.extend(self.chunks[j:])
+                    offsets.extend(o + delta for o in self.offsets[j:])
+                    notes.extend(self.notes[j:])
+                    break
+        self.text, self.chunks, self.offsets, self.notes = text, chunks, offsets, notes
+
+    def convert(self, text: str, diagnostics=None):
+        """
+        convert a new version of the document
+        :param text: the string representation of the markdown file
+        :param diagnostics: if a list is provided, the loose and duplicate footnotes
+                            are appended to it (see `MDReference.diagnose()`)
+        :return: the string representation of the TeX file
+        """
+        self.split(text)
+        footnotes = {}
+        for pointers, definitions in self.notes:
+            for key, note in definitions:
+                footnotes.setdefault(key, note)
+
+        # convert the chunks that aren't known, and clean the TeX at their boundaries
+        fragments, cleaned = {}, {}
+        stream = MDStream(self.engine, *self.options, footnotes, highlighter=self.highlighter)
+        out = []
+        for i, (chunk, (pointers, definitions)) in enumerate(zip(self.chunks, self.notes)):
+            chunk = MDStream.inject(chunk, pointers, definitions, footnotes, i == 0, self.engine)
+            tex = self.fragments.get(chunk)
+            if tex is None:
+                tex = engines[self.engine](chunk, *self.options, clean=False, highlighter=self.highlighter)
+            fragments[chunk] = tex
+            key = (stream.tail, tex)
+            if key not in self.cleaned:
+                self.cleaned[key] = stream.clean(tex), stream.tail
+            cleaned[key] = self.cleaned[key]
+            out.append(cleaned[key][0])
+            stream.tail = cleaned[key][1]
+        out.append(MDCleaner.clean_spaces(stream.tail))
+        self.fragments, self.cleaned = fragments, cleaned  # only keep the TeX of the last version
+
+        if diagnostics is not None:
+            diagnostics.extend(MDReference.diagnose(
+                [k for pointers, definitions in self.notes for k in pointers],
+                [k for pointers, definitions in self.notes for k, note in definitions]
+            ))
+        return "".join(out)